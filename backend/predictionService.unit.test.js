@@ -3,10 +3,30 @@
  */
 jest.mock('child_process');
 
+const { EventEmitter } = require('events');
 const { spawn } = require('child_process');
-const { scentToEmitterControl, processSensorData, getPrediction } = require('./services/predictionService');
+const {
+  scentToEmitterControl,
+  processSensorData,
+  getPrediction,
+  stopPredictionDaemon,
+} = require('./services/predictionService');
 const { sensorDataStore, predictionStore } = require('./services/dataStore');
 
+// Fake serve.py --daemon process: answers every request line with `reply(request)`
+function mockDaemon(reply) {
+  const proc = new EventEmitter();
+  proc.stdout = new EventEmitter();
+  proc.stderr = new EventEmitter();
+  proc.stdin = new EventEmitter();
+  proc.stdin.write = jest.fn((line) => {
+    const request = JSON.parse(line);
+    setImmediate(() => proc.stdout.emit('data', Buffer.from(`${JSON.stringify(reply(request))}\n`)));
+  });
+  proc.kill = jest.fn(() => proc.emit('close', null));
+  return proc;
+}
+
 // Helper to reset in-memory stores
 function resetStores() {
   Object.keys(sensorDataStore).forEach((k) => delete sensorDataStore[k]);
@@ -16,6 +36,7 @@ function resetStores() {
 describe('predictionService utils', () => {
   beforeEach(() => {
     resetStores();
+    stopPredictionDaemon();
     jest.clearAllMocks();
   });
 
@@ -36,7 +57,7 @@ describe('predictionService utils', () => {
     const stdoutListeners = [];
     const stderrListeners = [];
     spawn.mockReturnValue({
-      stdin: { write: jest.fn(), end: jest.fn() },
+      stdin: { write: jest.fn(), end: jest.fn(), on: jest.fn() },
       stdout: { on: (evt, cb) => stdoutListeners.push({ evt, cb }) },
       stderr: { on: (evt, cb) => stderrListeners.push({ evt, cb }) },
       on: (evt, cb) => {
@@ -51,6 +72,82 @@ describe('predictionService utils', () => {
     expect(result.confidence).toBe(0);
   });
 
+  test('getPrediction reuses a single daemon process across calls', async () => {
+    const proc = mockDaemon(({ id, reading }) => ({
+      id,
+      result: { predicted_scent: reading.gas > 100 ? 'peppermint' : 'no_scent', confidence: 0.9 },
+    }));
+    spawn.mockReturnValue(proc);
+
+    const [a, b] = await Promise.all([getPrediction({ gas: 10 }), getPrediction({ gas: 500 })]);
+
+    expect(spawn).toHaveBeenCalledTimes(1);
+    expect(spawn.mock.calls[0][1]).toContain('--daemon');
+    expect(a.predicted_scent).toBe('no_scent');
+    expect(b.predicted_scent).toBe('peppermint');
+  });
+
+  test('getPrediction restarts the daemon after it crashes', async () => {
+    const crashed = mockDaemon(() => null);
+    crashed.stdin.write = jest.fn(() => setImmediate(() => crashed.emit('close', 1)));
+    const healthy = mockDaemon(({ id }) => ({ id, result: { predicted_scent: 'no_scent', confidence: 1 } }));
+    spawn.mockReturnValueOnce(crashed).mockReturnValueOnce(healthy);
+
+    const failed = await getPrediction({ gas: 1 });
+    expect(failed.predicted_scent).toBe('error');
+
+    const now = Date.now();
+    const clock = jest.spyOn(Date, 'now').mockReturnValue(now + 60000);
+    const recovered = await getPrediction({ gas: 1 });
+    clock.mockRestore();
+
+    expect(spawn).toHaveBeenCalledTimes(2);
+    expect(recovered.predicted_scent).toBe('no_scent');
+  });
+
+  test('processSensorData sends one batched request for all fresh devices', async () => {
+    const proc = mockDaemon(({ id, readings }) => ({
+      id,
+      results: readings.map((r) => ({ predicted_scent: r.voc > 100 ? 'peppermint' : 'no_scent', confidence: 0.8 })),
+    }));
+    spawn.mockReturnValue(proc);
+    sensorDataStore['dev1'] = [{ deviceId: 'dev1', receivedAt: '2024-01-01T00:00:00Z', voc: 10 }];
+    sensorDataStore['dev2'] = [{ deviceId: 'dev2', receivedAt: '2024-01-01T00:00:01Z', voc: 500 }];
+
+    await processSensorData();
+
+    expect(proc.stdin.write).toHaveBeenCalledTimes(1);
+    expect(predictionStore['dev1'].scent).toBe('no_scent');
+    expect(predictionStore['dev2'].scent).toBe('peppermint');
+  });
+
+  test('getPrediction asks for top-k fields and reads length-prefixed frames', async () => {
+    process.env.PREDICTION_FRAMING = 'length';
+    const proc = mockDaemon(() => null);
+    proc.stdin.write = jest.fn((line) => {
+      const request = JSON.parse(line);
+      const payload = Buffer.from(JSON.stringify({
+        id: request.id,
+        result: { predicted_scent: request.fields, confidence: 0.7 },
+      }));
+      const frame = Buffer.concat([Buffer.alloc(4), payload]);
+      frame.writeUInt32BE(payload.length, 0);
+      // Split mid-frame: the reader must wait for the rest.
+      setImmediate(() => {
+        proc.stdout.emit('data', frame.subarray(0, 6));
+        proc.stdout.emit('data', frame.subarray(6));
+      });
+    });
+    spawn.mockReturnValue(proc);
+
+    const result = await getPrediction({ gas: 1 });
+    delete process.env.PREDICTION_FRAMING;
+
+    const args = spawn.mock.calls[0][1];
+    expect(args[args.indexOf('--framing') + 1]).toBe('length');
+    expect(result.predicted_scent).toBe('topk');
+  });
+
   test('processSensorData skips already processed reading', async () => {
     // Prepare store with one device and a processed reading marker
     sensorDataStore['dev1'] = [
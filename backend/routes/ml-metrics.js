@@ -0,0 +1,17 @@
+const express = require('express');
+const { getDaemonMetrics } = require('../services/predictionService');
+
+const router = express.Router();
+
+// Prometheus scrape target for the prediction daemon's latency histograms
+// and counters (serve.py's {"cmd": "metrics"}).
+router.get('/', async (req, res) => {
+  const { metrics, error } = await getDaemonMetrics();
+  if (!metrics) {
+    res.status(503).json({ error });
+    return;
+  }
+  res.type('text/plain; version=0.0.4').send(metrics);
+});
+
+module.exports = router;
@@ -34,6 +34,7 @@ app.use('/api/sensor-data', require('./routes/sensor-data'));
 app.use('/api/stats', require('./routes/stats'));
 app.use('/api/predictions', require('./routes/predictions'));
 app.use('/api/ml/info', require('./routes/ml-info'));
+app.use('/api/ml/metrics', require('./routes/ml-metrics'));
 
 const buildPath = path.join(__dirname, '../frontend/build');
 if (fs.existsSync(buildPath)) {
@@ -35,6 +35,23 @@ function scentToEmitterControl(scent, confidence) {
   return emitterControl;
 }
 
+const SERVE_SCRIPT = path.join(__dirname, '../../ml/serve.py');
+
+// serve.py is kept alive as a daemon so the interpreter start and model load
+// are paid once, not per reading. PREDICTION_DAEMON=false restores the old
+// one-process-per-prediction behaviour.
+const DAEMON_REQUEST_TIMEOUT_MS = 10000;
+const DAEMON_RESTART_DELAY_MS = 1000;
+
+const daemonState = {
+  proc: null,
+  framing: 'ndjson',
+  buffer: Buffer.alloc(0),
+  nextId: 1,
+  pending: new Map(),
+  retryAt: 0,
+};
+
 function resolvePythonPath() {
   if (process.env.PYTHON_PATH) return process.env.PYTHON_PATH;
   return process.env.DOCKER_ENV === 'true'
@@ -42,15 +59,148 @@ function resolvePythonPath() {
     : '/home/klaus/venv/bin/python3';
 }
 
-async function getPrediction(sensorReading) {
+function predictionError(error) {
+  return { predicted_scent: 'error', confidence: 0.0, error };
+}
+
+function useDaemon() {
+  return process.env.PREDICTION_DAEMON !== 'false';
+}
+
+// Only predicted_scent, confidence and top_predictions are used downstream, so
+// by default serve.py leaves out all_probabilities and the rest
+// (PREDICTION_FIELDS=full restores them).
+function responseFields() {
+  return { fields: process.env.PREDICTION_FIELDS || 'topk' };
+}
+
+function failPendingRequests(error) {
+  for (const { resolve, timer } of daemonState.pending.values()) {
+    clearTimeout(timer);
+    resolve({ error });
+  }
+  daemonState.pending.clear();
+}
+
+function handleDaemonLine(line) {
+  let message;
+  try {
+    message = JSON.parse(line);
+  } catch (e) {
+    console.error('Failed to parse prediction daemon output:', line.toString());
+    return;
+  }
+  const request = daemonState.pending.get(message.id);
+  if (!request) return;
+  daemonState.pending.delete(message.id);
+  clearTimeout(request.timer);
+  request.resolve(message);
+}
+
+// serve.py coalesces requests that arrive close together into one model
+// call; PREDICTION_MAX_BATCH / PREDICTION_MAX_WAIT_MS tune that window.
+function daemonArgs() {
+  const args = [SERVE_SCRIPT, '--daemon'];
+  if (process.env.PREDICTION_MAX_BATCH) args.push('--max-batch', process.env.PREDICTION_MAX_BATCH);
+  if (process.env.PREDICTION_MAX_WAIT_MS) args.push('--max-wait-ms', process.env.PREDICTION_MAX_WAIT_MS);
+  if (process.env.PREDICTION_CACHE_SIZE) args.push('--cache-size', process.env.PREDICTION_CACHE_SIZE);
+  if (process.env.PREDICTION_CACHE_TTL_S) args.push('--cache-ttl', process.env.PREDICTION_CACHE_TTL_S);
+  if (process.env.PREDICTION_CACHE_DECIMALS) args.push('--cache-decimals', process.env.PREDICTION_CACHE_DECIMALS);
+  if (daemonState.framing === 'length') args.push('--framing', 'length');
+  return args;
+}
+
+// Splits daemon stdout into responses: newline-delimited, or with
+// PREDICTION_FRAMING=length a 4-byte big-endian length before each one.
+function handleDaemonData(data) {
+  let buffer = Buffer.concat([daemonState.buffer, data]);
+  if (daemonState.framing === 'length') {
+    while (buffer.length >= 4 && buffer.length >= 4 + buffer.readUInt32BE(0)) {
+      const end = 4 + buffer.readUInt32BE(0);
+      handleDaemonLine(buffer.subarray(4, end));
+      buffer = buffer.subarray(end);
+    }
+  } else {
+    let newline;
+    while ((newline = buffer.indexOf(10)) !== -1) {
+      const line = buffer.subarray(0, newline).toString().trim();
+      buffer = buffer.subarray(newline + 1);
+      if (line) handleDaemonLine(line);
+    }
+  }
+  daemonState.buffer = buffer;
+}
+
+function startDaemon() {
+  daemonState.framing = process.env.PREDICTION_FRAMING === 'length' ? 'length' : 'ndjson';
+  daemonState.buffer = Buffer.alloc(0);
+  const proc = spawn(resolvePythonPath(), daemonArgs());
+  daemonState.proc = proc;
+
+  proc.stdout.on('data', handleDaemonData);
+  proc.stderr.on('data', (data) => {
+    const text = data.toString().trim();
+    if (text) console.log(`[serve.py] ${text}`);
+  });
+  proc.stdin.on('error', (error) => { console.error('Prediction daemon stdin error:', error.message); });
+  proc.on('error', (error) => { console.error('Failed to start prediction daemon:', error.message); });
+  proc.on('close', (code) => {
+    if (daemonState.proc !== proc) return;
+    console.error(`Prediction daemon exited (code ${code}); restarting on next request`);
+    daemonState.proc = null;
+    daemonState.retryAt = Date.now() + DAEMON_RESTART_DELAY_MS;
+    failPendingRequests('Prediction service unavailable');
+  });
+
+  return daemonState.proc;
+}
+
+function ensureDaemon() {
+  if (daemonState.proc) return daemonState.proc;
+  if (Date.now() < daemonState.retryAt) return null;
+  return startDaemon();
+}
+
+function stopPredictionDaemon() {
+  const { proc } = daemonState;
+  daemonState.proc = null;
+  daemonState.retryAt = 0;
+  failPendingRequests('Prediction service stopped');
+  if (proc) proc.kill();
+}
+
+// Resolves with the daemon's response message, or `{ error }` if the daemon
+// is unavailable, crashed or timed out.
+function requestDaemon(payload) {
   return new Promise((resolve) => {
-    const pythonScript = path.join(__dirname, '../../ml/serve.py');
-    const python = spawn(resolvePythonPath(), [pythonScript]);
+    const proc = ensureDaemon();
+    if (!proc) {
+      resolve({ error: 'Prediction service unavailable' });
+      return;
+    }
+
+    const id = daemonState.nextId++;
+    const timer = setTimeout(() => {
+      daemonState.pending.delete(id);
+      console.error(`Prediction request ${id} timed out; restarting daemon`);
+      resolve({ error: 'Prediction timed out' });
+      if (daemonState.proc === proc) stopPredictionDaemon();
+    }, DAEMON_REQUEST_TIMEOUT_MS);
+
+    daemonState.pending.set(id, { resolve, timer });
+    proc.stdin.write(`${JSON.stringify({ id, ...payload })}\n`);
+  });
+}
+
+// Resolves with serve.py's parsed stdout, or `{ error }` on failure.
+function runServeOnce(input) {
+  return new Promise((resolve) => {
+    const python = spawn(resolvePythonPath(), [SERVE_SCRIPT]);
 
     let outputData = '';
     let errorData = '';
 
-    python.stdin.write(JSON.stringify(sensorReading));
+    python.stdin.write(JSON.stringify(input));
     python.stdin.end();
 
     python.stdout.on('data', (data) => { outputData += data.toString(); });
@@ -59,21 +209,55 @@ async function getPrediction(sensorReading) {
     python.on('close', (code) => {
       if (code !== 0) {
         console.error(`Python prediction error (exit ${code}): ${errorData}`);
-        resolve({ predicted_scent: 'error', confidence: 0.0, error: 'Prediction service unavailable' });
+        resolve({ error: 'Prediction service unavailable' });
         return;
       }
       try {
-        resolve(JSON.parse(outputData));
+        resolve({ output: JSON.parse(outputData) });
       } catch (e) {
         console.error('Failed to parse prediction:', e, 'Output:', outputData);
-        resolve({ predicted_scent: 'error', confidence: 0.0, error: 'Invalid prediction response' });
+        resolve({ error: 'Invalid prediction response' });
       }
     });
   });
 }
 
+async function getPrediction(sensorReading) {
+  if (!useDaemon()) {
+    const { output, error } = await runServeOnce(sensorReading);
+    return output || predictionError(error);
+  }
+  const message = await requestDaemon({ reading: sensorReading, ...responseFields() });
+  return message.result || predictionError(message.error || 'Invalid prediction response');
+}
+
+// One serve.py call for many readings; results come back in input order.
+async function getPredictions(sensorReadings) {
+  if (sensorReadings.length === 0) return [];
+
+  let results;
+  let error;
+  if (useDaemon()) {
+    const message = await requestDaemon({ readings: sensorReadings, ...responseFields() });
+    ({ results, error } = message);
+  } else {
+    ({ output: results, error } = await runServeOnce(sensorReadings));
+  }
+
+  if (Array.isArray(results) && results.length === sensorReadings.length) return results;
+  return sensorReadings.map(() => predictionError(error || 'Invalid prediction response'));
+}
+
+// serve.py's Prometheus text; only the daemon keeps counters across requests.
+async function getDaemonMetrics() {
+  if (!useDaemon()) return { error: 'Metrics need PREDICTION_DAEMON enabled' };
+  const message = await requestDaemon({ cmd: 'metrics' });
+  return message.metrics ? { metrics: message.metrics } : { error: message.error || 'No metrics' };
+}
+
 async function processSensorData() {
   try {
+    const fresh = [];
     for (const deviceId of Object.keys(sensorDataStore)) {
       const deviceData = sensorDataStore[deviceId];
       if (!deviceData || deviceData.length === 0) continue;
@@ -82,10 +266,15 @@ async function processSensorData() {
       const lastProcessedTime = predictionStore[deviceId]?.lastProcessedTime;
       if (lastProcessedTime && lastProcessedTime === latestReading.receivedAt) continue;
 
-      const prediction = await getPrediction(latestReading);
+      fresh.push({ deviceId, latestReading });
+    }
+
+    const predictions = await getPredictions(fresh.map(({ latestReading }) => latestReading));
+    fresh.forEach(({ deviceId, latestReading }, i) => {
+      const prediction = predictions[i];
       const emitterControl = scentToEmitterControl(prediction.predicted_scent, prediction.confidence);
       storePrediction(deviceId, prediction, latestReading, emitterControl);
-    }
+    });
   } catch (error) {
     console.error('Error in prediction service:', error);
   }
@@ -99,6 +288,7 @@ function startPredictionService(intervalMs = 5000) {
     stop: () => {
       console.log('Stopping prediction service');
       clearInterval(interval);
+      stopPredictionDaemon();
     },
     processNow: processSensorData,
   };
@@ -109,4 +299,7 @@ module.exports = {
   processSensorData,
   scentToEmitterControl,
   getPrediction,
+  getPredictions,
+  getDaemonMetrics,
+  stopPredictionDaemon,
 };
@@ -903,6 +903,75 @@ metrics_blob = {
 print("Saved:", sorted(p.name for p in MODEL_DIR.glob('*')))
 """)
 
+md("""
+### 9.1 Compiled forest for serving
+
+`ml/compile_model.py` flattens `pipeline.joblib` into `model/pipeline_compiled/`:
+the imputer medians and scaler mean/scale become plain arrays and every tree
+becomes a slice of shared node arrays (feature, threshold, left, right, leaf
+value). Each array is a raw `.npy` file that `serve.py` memory-maps, so all
+serving processes on a host share the same physical pages. `serve.py` walks all
+trees at once with vectorised NumPy and falls back to `pipeline.joblib` when the
+directory is missing or was built from an older pipeline. Only forest
+classifiers can be compiled.
+""")
+code(r"""
+from ml.compile_model import dir_size, export as export_compiled
+
+try:
+    compiled_path = export_compiled()
+    print(f"Compiled forest -> {compiled_path.name} "
+          f"({dir_size(compiled_path) / 1024:.0f} KiB)")
+except TypeError as e:
+    print(f"No compiled artefact for {sk_best_name}: {e}")
+""")
+
+md("""
+### 9.2 ScentNet for serving
+
+`ml/compile_scentnet.py` folds each BatchNorm layer into the Linear layer before
+it and writes two artefacts, each used by `serve.py` only while it matches the
+current weights:
+
+- `model/scentnet_compiled/` — plain `.npy` weights (the scaler folded into the
+  first layer as well) for a pure-NumPy forward pass. This is what serves
+  `kind: "torch"` by default, so serving hosts do not need PyTorch.
+- `model/scentnet_scripted.pt` — a traced, frozen TorchScript module, used when
+  production.json sets `"numpy_mlp": false`. `TELESCENT_TORCH_THREADS` /
+  `TELESCENT_TORCH_INTEROP_THREADS` size torch's thread pools (default one each).
+""")
+code(r"""
+from ml.compile_scentnet import export as export_scentnet, export_numpy as export_scentnet_numpy
+
+numpy_path = export_scentnet_numpy()
+print(f"NumPy ScentNet -> {numpy_path.name} ({dir_size(numpy_path) / 1024:.0f} KiB)")
+scripted_path = export_scentnet()
+print(f"Frozen ScentNet -> {scripted_path.name} ({scripted_path.stat().st_size / 1024:.0f} KiB)")
+""")
+
+md("""
+### 9.3 Reduced-precision variants
+
+`ml/export_variants.py` writes smaller copies of both compiled models next to
+them: `pipeline_compiled_float32/` (thresholds rounded down to float32, which
+splits exactly like float64 for float32 inputs) and `_float16/`, and
+`scentnet_compiled_float16/` and `_int8/` (per-column int8 weights, activations
+quantised per row at call time). Size, single-row p50/p99 latency and holdout
+macro-F1 of every variant land under `variants` in `metrics.json`.
+production.json's optional `"variant"` selects one; `serve.py` only uses it while
+its holdout macro-F1 is within `"variant_tolerance"` (default 0.01) of the full
+model.
+""")
+code(r"""
+from ml.export_variants import export_variants
+
+for artefact, scores in export_variants().items():
+    for name, s in scores.items():
+        print(f"{artefact:<20} {name:>8}  {s['size_bytes'] / 1024:>5.0f} KiB  "
+              f"p50 {s['p50_ms']:.3f} ms  p99 {s['p99_ms']:.3f} ms  "
+              f"macro-F1 {s['holdout_macro_f1']:.4f}")
+""")
+
 md("""
 ## 10. Acceptance criteria check
 
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""Serving-path micro-benchmarks.
+
+    python ml/benchmark.py features     # pandas vs NumPy feature engine
+    python ml/benchmark.py load         # pipeline.joblib vs compiled forest
+    python ml/benchmark.py rss          # per-worker memory, eager vs mmap
+    python ml/benchmark.py torch        # eager ScentNet vs frozen TorchScript
+    python ml/benchmark.py responses    # response bytes and encode time per format
+    python ml/benchmark.py dataset      # load_dataset: CSV parse vs columnar cache
+    python ml/benchmark.py shards       # sharded loads, serial vs process pool
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+_HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+
+# ml.* imports live inside each benchmark: the load probes must start from a
+# bare interpreter for their RSS numbers to mean anything.
+
+
+def _best_ms(fn, repeat: int) -> float:
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def _sample_rows(n: int, seed: int = 42):
+    from ml.data_loader import load_dataset
+
+    X = load_dataset().X
+    idx = np.random.default_rng(seed).integers(0, len(X), size=n)
+    return X.iloc[idx].reset_index(drop=True)
+
+
+def bench_features(sizes: list[int], repeat: int) -> None:
+    from ml.features import ScentFeatureBuilder
+
+    pandas_fb = ScentFeatureBuilder(engine="pandas")
+    numpy_fb = ScentFeatureBuilder(engine="numpy")
+
+    print(f"{'rows':>8}  {'pandas ms':>10}  {'numpy ms':>10}  {'speedup':>8}  identical")
+    for n in sizes:
+        rows = _sample_rows(n)
+        same = np.array_equal(pandas_fb.transform(rows).to_numpy(),
+                              numpy_fb.transform(rows), equal_nan=True)
+        reps = repeat if n < 10_000 else max(3, repeat // 20)
+        t_pd = _best_ms(lambda: pandas_fb.transform(rows), reps)
+        t_np = _best_ms(lambda: numpy_fb.transform(rows), reps)
+        print(f"{n:>8}  {t_pd:>10.3f}  {t_np:>10.3f}  {t_pd / t_np:>7.1f}x  {same}")
+
+
+def _proc_kib(path: str, *fields: str) -> dict[str, int]:
+    out = {}
+    for line in Path(path).read_text().splitlines():
+        key, _, rest = line.partition(":")
+        if key in fields:
+            out[key] = int(rest.split()[0])
+    return out
+
+
+def _rss_kib() -> int:
+    return _proc_kib("/proc/self/status", "VmRSS").get("VmRSS", 0)
+
+
+def _probe_load(kind: str) -> None:
+    # Runs in a fresh interpreter so import caches don't flatter either path.
+    from ml import compile_model
+
+    if kind == "sklearn":
+        import joblib
+        import sklearn.ensemble  # noqa: F401  (import cost is not load cost)
+        load = lambda: joblib.load(compile_model.PIPELINE_PATH)  # noqa: E731
+    else:
+        mmap_mode = "r" if kind == "mmap" else None
+        load = lambda: compile_model.load_compiled(mmap_mode=mmap_mode)  # noqa: E731
+
+    rss0 = _rss_kib()
+    t0 = time.perf_counter()
+    model = load()  # noqa: F841
+    elapsed = (time.perf_counter() - t0) * 1000
+    print(json.dumps({"load_ms": elapsed, "rss_delta_kib": _rss_kib() - rss0,
+                      "rss_kib": _rss_kib()}))
+
+
+def bench_load(repeat: int) -> None:
+    print(f"{'artefact':>9}  {'load ms':>8}  {'model RSS MiB':>13}  {'process RSS MiB':>15}")
+    for kind in ("sklearn", "compiled", "mmap"):
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, __file__, "_probe-load", kind],
+                                 capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        best = min(runs, key=lambda r: r["load_ms"])
+        print(f"{kind:>9}  {best['load_ms']:>8.1f}  {best['rss_delta_kib'] / 1024:>13.1f}  "
+              f"{best['rss_kib'] / 1024:>15.1f}")
+
+
+def _probe_worker(kind: str) -> None:
+    # A stand-in serving worker: load the compiled forest, fault in every page
+    # like a prediction would, then idle until the parent has measured us.
+    from ml import compile_model
+
+    before = _proc_kib("/proc/self/status", "RssAnon", "RssFile")
+    arrays, _ = compile_model.load_compiled(mmap_mode="r" if kind == "mmap" else None)
+    for arr in arrays.values():
+        if arr.dtype.kind in "fiu":
+            float(arr.sum())
+    after = _proc_kib("/proc/self/status", "RssAnon", "RssFile")
+    print(json.dumps({k: after[k] - before[k] for k in after}), flush=True)
+    sys.stdin.readline()
+
+
+def bench_rss(workers: int) -> None:
+    # PSS splits shared pages between the processes mapping them, so it is
+    # the number that shows what N workers really cost together.
+    print(f"{'mode':>6}  {'worker':>6}  {'model anon KiB':>14}  {'model file KiB':>14}  "
+          f"{'RSS KiB':>8}  {'PSS KiB':>8}")
+    for kind in ("eager", "mmap"):
+        procs = [subprocess.Popen([sys.executable, __file__, "_probe-worker", kind],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                 for _ in range(workers)]
+        deltas = [json.loads(p.stdout.readline()) for p in procs]
+        total_pss = 0
+        for i, (p, delta) in enumerate(zip(procs, deltas)):
+            rollup = _proc_kib(f"/proc/{p.pid}/smaps_rollup", "Rss", "Pss")
+            total_pss += rollup["Pss"]
+            print(f"{kind:>6}  {i:>6}  {delta['RssAnon']:>14}  {delta['RssFile']:>14}  "
+                  f"{rollup['Rss']:>8}  {rollup['Pss']:>8}")
+        print(f"{kind:>6}  {'total':>6}  {sum(d['RssAnon'] for d in deltas):>14}  "
+              f"{'':>14}  {'':>8}  {total_pss:>8}")
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+
+
+def _probe_torch(mode: str, threads: int, sizes: list[int], repeat: int) -> None:
+    # One process per configuration: torch's inter-op pool can only be sized
+    # before it is first used.
+    import os
+    os.environ["TELESCENT_TORCH_THREADS"] = os.environ["TELESCENT_TORCH_INTEROP_THREADS"] = \
+        str(threads)
+    from ml import serve
+
+    if threads == 0:
+        serve._configure_torch_threads = lambda torch: None  # torch's own defaults
+    backend = serve._load_torch_backend({"torchscript": mode == "scripted"})
+    out = {}
+    for n in sizes:
+        records = _sample_rows(n).to_dict("records")
+        out[n] = _best_ms(lambda: backend.predict(records), repeat)
+    print(json.dumps(out))
+
+
+def bench_torch(sizes: list[int], threads: list[int], repeat: int) -> None:
+    # threads=0 leaves torch's defaults (one intra-op thread per core).
+    print(f"{'mode':>8}  {'threads':>7}  " + "  ".join(f"{f'{n} rows ms':>12}" for n in sizes))
+    for mode in ("eager", "scripted"):
+        for t in threads:
+            out = subprocess.run(
+                [sys.executable, __file__, "_probe-torch", mode, str(t), "--repeat", str(repeat),
+                 "--sizes", *map(str, sizes)],
+                capture_output=True, text=True, check=True).stdout
+            ms = json.loads(out.strip().splitlines()[-1])
+            label = "default" if t == 0 else str(t)
+            print(f"{mode:>8}  {label:>7}  " + "  ".join(f"{ms[str(n)]:>12.3f}" for n in sizes))
+
+
+def bench_responses(n: int, repeat: int) -> None:
+    # Encoded size and encode/decode time of one daemon response, per field
+    # selection and encoding, over real predictions.
+    from ml import serve
+
+    serve.CACHE = None
+    results = serve.predict_scent_batch(_sample_rows(n).to_dict("records"))
+    encoders = {
+        "json indent=2": (lambda r: json.dumps(r, indent=2).encode(), json.loads),
+        "json default":  (lambda r: json.dumps(r).encode(), json.loads),
+        "json compact":  (serve.encode_json, json.loads),
+    }
+    try:
+        import msgpack
+        encoders["msgpack"] = (msgpack.packb, msgpack.unpackb)
+    except ImportError:
+        pass
+
+    print(f"{'fields':>6}  {'encoding':>14}  {'bytes':>6}  {'encode us':>9}  {'decode us':>9}")
+    for fields in serve.RESPONSE_FIELDS:
+        responses = [{"id": i, "result": serve.select_fields(r, fields)}
+                     for i, r in enumerate(results)]
+        for name, (encode, decode) in encoders.items():
+            payloads = [encode(r) for r in responses]
+            size = sum(map(len, payloads)) / n
+            t_enc = _best_ms(lambda: [encode(r) for r in responses], repeat) / n * 1000
+            t_dec = _best_ms(lambda: [decode(p) for p in payloads], repeat) / n * 1000
+            print(f"{fields:>6}  {name:>14}  {size:>6.0f}  {t_enc:>9.2f}  {t_dec:>9.2f}")
+
+
+def _scaled_csv(out: Path, factor: int) -> Path:
+    # sensor_data.csv repeated `factor` times, standing in for a longer history.
+    from ml.data_loader import DEFAULT_CSV
+
+    header, *rows = DEFAULT_CSV.read_text().splitlines(keepends=True)
+    out.write_text(header + "".join(rows * factor))
+    return out
+
+
+def bench_dataset(factors: list[int], repeat: int) -> None:
+    # "appended" is a load right after csvExporter-style appends of 10 rows.
+    from ml.data_loader import DEFAULT_CSV, cache_path, load_dataset
+
+    new_rows = "".join(DEFAULT_CSV.read_text().splitlines(keepends=True)[1:11])
+    print(f"{'rows':>8}  {'csv ms':>8}  {'cold ms':>8}  {'warm ms':>8}  {'touched ms':>10}  "
+          f"{'appended ms':>11}  {'cache KiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for factor in factors:
+            csv = _scaled_csv(Path(tmp) / f"x{factor}.csv", factor)
+            cache = cache_path(csv)
+            t_csv = _best_ms(lambda: load_dataset(csv, cache=False), repeat)
+
+            def cold():
+                cache.unlink(missing_ok=True)
+                load_dataset(csv)
+
+            def touched():
+                os.utime(csv)
+                load_dataset(csv)
+
+            t_cold = _best_ms(cold, repeat)
+            t_warm = _best_ms(lambda: load_dataset(csv), repeat)
+            t_touch = _best_ms(touched, repeat)
+            rows = len(load_dataset(csv))
+
+            def appended():
+                with open(csv, "a") as f:
+                    f.write(new_rows)
+                load_dataset(csv)
+
+            t_append = _best_ms(appended, repeat)
+            print(f"{rows:>8}  {t_csv:>8.2f}  {t_cold:>8.2f}  {t_warm:>8.2f}  {t_touch:>10.2f}  "
+                  f"{t_append:>11.2f}  {cache.stat().st_size / 1024:>9.0f}")
+
+
+def bench_shards(shards: int, factor: int, workers: list[int], repeat: int) -> None:
+    # sensor_data.csv repeated `factor` times, split into `shards` daily files.
+    from ml.data_loader import DEFAULT_CSV, load_shards
+
+    header, *rows = DEFAULT_CSV.read_text().splitlines(keepends=True)
+    rows = rows * factor
+    per = -(-len(rows) // shards)
+    print(f"{len(rows)} rows in {shards} shards, {os.cpu_count()} CPUs")
+    print(f"{'workers':>7}  {'parse ms':>9}  {'cached ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(shards):
+            Path(tmp, f"sensor_data_{i:03d}.csv").write_text(
+                header + "".join(rows[i * per:(i + 1) * per]))
+        for n in workers:
+            t_parse = _best_ms(lambda: load_shards(tmp, cache=False, workers=n), repeat)
+            t_cached = _best_ms(lambda: load_shards(tmp, workers=n), repeat)
+            print(f"{n:>7}  {t_parse:>9.1f}  {t_cached:>9.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("features", help="pandas vs NumPy ScentFeatureBuilder.transform")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 100_000])
+    p.add_argument("--repeat", type=int, default=100)
+
+    p = sub.add_parser("load", help="cold load time and RSS of each artefact")
+    p.add_argument("--repeat", type=int, default=5)
+
+    p = sub.add_parser("rss", help="per-worker RSS/PSS of the compiled forest, eager vs mmap")
+    p.add_argument("--workers", type=int, default=4)
+
+    p = sub.add_parser("torch", help="eager vs TorchScript ScentNet across thread counts")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1, 32, 1000])
+    p.add_argument("--threads", type=int, nargs="+", default=[0, 1, 2, 4])
+    p.add_argument("--repeat", type=int, default=200)
+
+    p = sub.add_parser("responses", help="response bytes and encode/decode time per format")
+    p.add_argument("--rows", type=int, default=1000)
+    p.add_argument("--repeat", type=int, default=20)
+
+    p = sub.add_parser("dataset", help="load_dataset from the CSV vs its columnar cache")
+    p.add_argument("--factors", type=int, nargs="+", default=[1, 10, 100])
+    p.add_argument("--repeat", type=int, default=5)
+
+    p = sub.add_parser("shards", help="load_shards serially vs across a process pool")
+    p.add_argument("--shards", type=int, default=8)
+    p.add_argument("--factor", type=int, default=100)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--repeat", type=int, default=3)
+
+    p = sub.add_parser("_probe-load")
+    p.add_argument("kind", choices=["sklearn", "compiled", "mmap"])
+
+    p = sub.add_parser("_probe-worker")
+    p.add_argument("kind", choices=["eager", "mmap"])
+
+    p = sub.add_parser("_probe-torch")
+    p.add_argument("mode", choices=["eager", "scripted"])
+    p.add_argument("threads", type=int)
+    p.add_argument("--sizes", type=int, nargs="+")
+    p.add_argument("--repeat", type=int)
+
+    args = parser.parse_args()
+    if args.cmd == "features":
+        bench_features(args.sizes, args.repeat)
+    elif args.cmd == "load":
+        bench_load(args.repeat)
+    elif args.cmd == "rss":
+        bench_rss(args.workers)
+    elif args.cmd == "_probe-load":
+        _probe_load(args.kind)
+    elif args.cmd == "torch":
+        bench_torch(args.sizes, args.threads, args.repeat)
+    elif args.cmd == "responses":
+        bench_responses(args.rows, args.repeat)
+    elif args.cmd == "dataset":
+        bench_dataset(args.factors, args.repeat)
+    elif args.cmd == "shards":
+        bench_shards(args.shards, args.factor, args.workers, args.repeat)
+    elif args.cmd == "_probe-worker":
+        _probe_worker(args.kind)
+    elif args.cmd == "_probe-torch":
+        _probe_torch(args.mode, args.threads, args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
-import requests
+import sys
 import time
-import statistics
 from datetime import datetime
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    from ml.drift import DriftTracker
+except ModuleNotFoundError:
+    from drift import DriftTracker
 
 LOCAL_BACKEND  = "http://localhost:5001/api/sensor-data"
 CLOUD_BACKEND  = "https://telescent-157735763503.europe-west1.run.app/api/sensor-data"
@@ -34,12 +43,6 @@ def get_gas(reading: dict) -> float | None:
         return None
 
 
-def gas_deviation(gas: float | None, baseline: float | None) -> float | None:
-    if gas is None or not baseline:
-        return None
-    return abs(gas - baseline) / baseline
-
-
 _last_cloud_timestamp: str | None = None
 
 
@@ -112,8 +115,10 @@ def send_reading(label: str, phase: str, session_id: str, reading: dict) -> bool
 
 
 def collect_block(label: str, phase: str, session_id: str, n: int,
-                  baseline_gas: float | None = None) -> list[dict]:
-    readings = []
+                  drift: DriftTracker, calibrate: bool = False) -> int:
+    # Gas readings feed `drift` as they arrive (the baseline too when
+    # `calibrate`), so nothing is kept per block; returns the count saved.
+    drift.reset_block()
     print(f"\n  {n} readings  |  phase={phase}  |  label={label}")
     print(f"  {'-' * 54}")
 
@@ -133,7 +138,8 @@ def collect_block(label: str, phase: str, session_id: str, n: int,
         gas = get_gas(reading)
         gas_str = f"{gas:>8.1f}" if gas is not None else "     N/A"
 
-        dev = gas_deviation(gas, baseline_gas)
+        dev = drift.update(gas, calibrate=calibrate)["deviation"]
+        dev = None if calibrate else dev
         flag = f"  gas dev {dev*100:.0f}%" if dev is not None and dev > BASELINE_TOLERANCE else ""
 
         saved += 1
@@ -145,25 +151,18 @@ def collect_block(label: str, phase: str, session_id: str, n: int,
         if not send_reading(label, phase, session_id, reading):
             print(f"         save failed")
 
-        readings.append(reading)
         retries = 0
 
-    return readings
-
-
-def baseline_median(readings: list[dict]) -> float | None:
-    vals = [get_gas(r) for r in readings if get_gas(r) is not None]
-    return statistics.median(vals) if vals else None
+    return saved
 
 
-def recovery_ok(readings: list[dict], baseline: float) -> bool:
-    for r in readings:
-        dev = gas_deviation(get_gas(r), baseline)
-        if dev is not None and dev > BASELINE_TOLERANCE:
-            g = get_gas(r)
-            print(f"  gas={g:.1f} is {dev*100:.0f}% from baseline ({baseline:.1f})")
-            return False
-    return True
+def recovery_ok(drift: DriftTracker) -> bool:
+    # Judged on the block just collected.
+    if drift.block_ok():
+        return True
+    g, dev = drift.block_worst
+    print(f"  gas={g:.1f} is {dev*100:.0f}% from baseline ({drift.baseline:.1f})")
+    return False
 
 
 def select_label(class_counts: dict | None = None) -> str | None:
@@ -219,15 +218,17 @@ def main():
     input(f"  Press ENTER when ready for stabilisation baseline\n"
           f"  (fan running, no scent near intake)...")
 
-    stab = collect_block("no_scent", "stabilisation", session_id, READINGS_STAB)
-    baseline = baseline_median(stab)
+    drift = DriftTracker(tolerance=BASELINE_TOLERANCE)
+    stab = collect_block("no_scent", "stabilisation", session_id, READINGS_STAB, drift,
+                         calibrate=True)
+    baseline = drift.baseline
     if baseline:
         print(f"\n  Baseline gas_resistance: {baseline:.2f} kOhm  (+/-{BASELINE_TOLERANCE*100:.0f}% tolerance)")
     else:
         print(f"\n  Could not compute baseline - gas values missing. Continuing without drift check.")
 
     block_num  = 0
-    total_sent = len(stab)
+    total_sent = stab
     class_counts = {lbl: 0 for lbl in VALID_LABELS}
 
     while True:
@@ -245,22 +246,20 @@ def main():
         print(f"    3. Hold pad at the 3 cm tape mark on the intake")
         input(f"\n  Press ENTER when pad is in position and 45 s wait is done...")
 
-        exp = collect_block(exposure_label, "exposure", session_id, READINGS_EXPOSURE,
-                            baseline_gas=baseline)
-        total_sent += len(exp)
-        class_counts[exposure_label] = class_counts.get(exposure_label, 0) + len(exp)
+        exp = collect_block(exposure_label, "exposure", session_id, READINGS_EXPOSURE, drift)
+        total_sent += exp
+        class_counts[exposure_label] = class_counts.get(exposure_label, 0) + exp
 
         print(f"\n  Remove pad from intake NOW.")
         print(f"  Fan flush for {FLUSH_DURATION_S // 60} minutes. Prepare next pad during wait.")
         countdown(FLUSH_DURATION_S, label="Flush: ")
         print(f"  Flush complete.")
 
-        rec = collect_block("no_scent", "recovery", session_id, READINGS_RECOVERY,
-                            baseline_gas=baseline)
-        total_sent += len(rec)
+        rec = collect_block("no_scent", "recovery", session_id, READINGS_RECOVERY, drift)
+        total_sent += rec
 
         if baseline and rec:
-            if recovery_ok(rec, baseline):
+            if recovery_ok(drift):
                 print(f"\n  Baseline restored - block {block_num} is valid.")
             else:
                 print(f"\n  Baseline NOT restored after {FLUSH_DURATION_S // 60} min flush.")
@@ -270,10 +269,9 @@ def main():
                         print(f"  Block {block_num} flagged. Review in QA before training.")
                         break
                     countdown(60, label="Extended flush: ")
-                    recheck = collect_block("no_scent", "recovery", session_id, 5,
-                                           baseline_gas=baseline)
-                    total_sent += len(recheck)
-                    if recovery_ok(recheck, baseline):
+                    recheck = collect_block("no_scent", "recovery", session_id, 5, drift)
+                    total_sent += recheck
+                    if recovery_ok(drift):
                         print(f"  Baseline restored after extended flush.")
                         break
                     print(f"  Still not restored.")
@@ -281,10 +279,9 @@ def main():
         if exposure_label != "no_scent":
             print(f"\n  Collecting {READINGS_BASELINE} clean-air baseline readings "
                   f"(no_scent / exposure) for balanced training data...")
-            bl = collect_block("no_scent", "exposure", session_id, READINGS_BASELINE,
-                               baseline_gas=baseline)
-            total_sent += len(bl)
-            class_counts["no_scent"] = class_counts.get("no_scent", 0) + len(bl)
+            bl = collect_block("no_scent", "exposure", session_id, READINGS_BASELINE, drift)
+            total_sent += bl
+            class_counts["no_scent"] = class_counts.get("no_scent", 0) + bl
 
         print(f"\n  Block {block_num} done  |  Session total: {total_sent} readings")
         print(f"     Class balance: {class_counts}")
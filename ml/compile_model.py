@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Flatten pipeline.joblib into plain arrays for serve.py's compiled backend.
+
+Run after scent_classification.ipynb has saved the production artefacts:
+
+    python ml/compile_model.py
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+
+_HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+
+MODEL_DIR     = _HERE / "model"
+PIPELINE_PATH = MODEL_DIR / "pipeline.joblib"
+ENCODER_PATH  = MODEL_DIR / "label_encoder.joblib"
+COMPILED_DIR  = MODEL_DIR / "pipeline_compiled"
+MANIFEST_NAME = "manifest.json"
+
+
+def file_sha256(path: Path | str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def flatten_forest(clf) -> dict[str, np.ndarray]:
+    # Concatenate every tree's nodes into shared arrays with global child
+    # indices. Leaves point at themselves, so a fixed max_depth number of
+    # vectorised steps lands every row on its leaf in every tree.
+    trees = [est.tree_ for est in clf.estimators_]
+    offsets = np.cumsum([0] + [t.node_count for t in trees])
+
+    feature, threshold, left, right, value = [], [], [], [], []
+    for tree, offset in zip(trees, offsets[:-1]):
+        own = np.arange(tree.node_count, dtype=np.int64) + offset
+        is_leaf = tree.children_left == -1
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        left.append(np.where(is_leaf, own, tree.children_left + offset))
+        right.append(np.where(is_leaf, own, tree.children_right + offset))
+        # Same per-leaf normalisation as DecisionTreeClassifier.predict_proba.
+        v = tree.value[:, 0, :].astype(np.float64)
+        norm = v.sum(axis=1, keepdims=True)
+        norm[norm == 0.0] = 1.0
+        value.append(v / norm)
+
+    return {
+        "feature":   np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left":      np.concatenate(left).astype(np.int32),
+        "right":     np.concatenate(right).astype(np.int32),
+        "value":     np.concatenate(value),
+        "roots":     offsets[:-1].astype(np.int32),
+        "max_depth": np.array([max(t.max_depth for t in trees)], dtype=np.int32),
+    }
+
+
+def compile_preprocessing(features, imputer, scaler) -> dict[str, np.ndarray]:
+    # The features -> impute -> scale head shared by pipeline.joblib and
+    # scentnet_preprocessor.joblib, as arrays.
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import StandardScaler
+
+    if not hasattr(features, "transform_records"):
+        raise TypeError(f"first step must be a ScentFeatureBuilder, got {type(features).__name__}")
+    if not (isinstance(imputer, SimpleImputer) and not imputer.add_indicator
+            and isinstance(imputer.missing_values, float) and np.isnan(imputer.missing_values)):
+        raise TypeError(f"imputer step must be a NaN SimpleImputer, got {imputer!r}")
+    if np.isnan(imputer.statistics_).any():
+        raise ValueError("imputer has all-missing features; retrain before compiling")
+    if not isinstance(scaler, StandardScaler):
+        raise TypeError(f"scaler step must be a StandardScaler, got {type(scaler).__name__}")
+
+    n_features = len(imputer.statistics_)
+    return {
+        "out_cols":    np.array(features.OUT_COLS),
+        "impute_fill": imputer.statistics_.astype(np.float64),
+        "scale_mean":  scaler.mean_ if scaler.with_mean else np.zeros(n_features),
+        "scale_scale": scaler.scale_ if scaler.with_std else np.ones(n_features),
+    }
+
+
+def compile_pipeline(pipeline, class_names) -> dict[str, np.ndarray]:
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+
+    if len(pipeline.steps) != 4:
+        raise TypeError("expected features/imputer/scaler/clf steps, got "
+                        f"{[name for name, _ in pipeline.steps]}")
+    features, imputer, scaler, clf = (step for _, step in pipeline.steps)
+    if not isinstance(clf, (RandomForestClassifier, ExtraTreesClassifier)):
+        raise TypeError(f"only forest classifiers can be compiled, got {type(clf).__name__}")
+
+    arrays = flatten_forest(clf)
+    arrays.update(compile_preprocessing(features, imputer, scaler))
+    arrays.update({
+        # Value columns follow clf.classes_ (encoded ints); store their labels.
+        "class_names": np.array([str(class_names[c]) for c in clf.classes_]),
+    })
+    return arrays
+
+
+def round_down(values: np.ndarray, dtype) -> np.ndarray:
+    # Largest `dtype` value <= each input. For float32 thresholds this is
+    # lossless: a float32 x satisfies x <= t exactly when x <= round_down(t).
+    out = values.astype(dtype)
+    over = out.astype(np.float64) > values
+    out[over] = np.nextafter(out[over], np.array(-np.inf, dtype=dtype))
+    return out
+
+
+def forest_variant(arrays: dict[str, np.ndarray], dtype) -> dict[str, np.ndarray]:
+    # Reduced-precision copy of a compiled forest. float32 thresholds split
+    # exactly like the original, so only the leaf values lose precision;
+    # float16 also moves thresholds and is left to export_variants.py's
+    # accuracy gate.
+    out = dict(arrays)
+    out["threshold"] = round_down(arrays["threshold"], dtype)
+    out["value"] = arrays["value"].astype(dtype)
+    out["feature"] = arrays["feature"].astype(np.int16)
+    return out
+
+
+def variant_dir(base_dir: Path, variant: str) -> Path:
+    return Path(base_dir).with_name(f"{Path(base_dir).name}_{variant}")
+
+
+def save_compiled(arrays: dict[str, np.ndarray], out_dir: Path, manifest: dict) -> Path:
+    # One raw .npy per array so serving processes can np.load(mmap_mode="r")
+    # them: the pages then live in the shared page cache rather than each
+    # worker's private heap. Written beside the target and swapped in whole.
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    old_dir = out_dir.with_name(out_dir.name + ".old")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    for name, arr in arrays.items():
+        np.save(tmp_dir / f"{name}.npy", np.ascontiguousarray(arr))
+    (tmp_dir / MANIFEST_NAME).write_text(json.dumps(
+        {**manifest, "arrays": sorted(arrays)}, indent=2))
+
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if out_dir.exists():
+        out_dir.rename(old_dir)
+    tmp_dir.rename(out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return out_dir
+
+
+def load_compiled(path: Path = COMPILED_DIR,
+                  mmap_mode: str | None = "r") -> tuple[dict[str, np.ndarray], dict]:
+    path = Path(path)
+    manifest = json.loads((path / MANIFEST_NAME).read_text())
+    arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+              for name in manifest["arrays"]}
+    return arrays, manifest
+
+
+def dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in Path(path).iterdir())
+
+
+def export(pipeline_path: Path = PIPELINE_PATH,
+           encoder_path: Path = ENCODER_PATH,
+           out_dir: Path = COMPILED_DIR) -> Path:
+    import joblib
+
+    pipeline = joblib.load(pipeline_path)
+    class_names = joblib.load(encoder_path).classes_.tolist()
+    arrays = compile_pipeline(pipeline, class_names)
+    # serve.py ignores the artefact unless this still matches pipeline.joblib.
+    return save_compiled(arrays, out_dir, {"source_sha256": file_sha256(pipeline_path)})
+
+
+def main() -> None:
+    out = export()
+    print(f"Wrote {out} ({dir_size(out) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Export scentnet.pt for serving, with BatchNorm folded into the Linear layers.
+
+Two artefacts:
+  model/scentnet_compiled/   plain .npy weights for serve.py's NumPy backend,
+                             which needs no torch at all (the scaler is folded
+                             into the first layer too)
+  model/scentnet_scripted.pt a frozen TorchScript module for the torch backend
+
+Run after scent_classification.ipynb has saved the production artefacts:
+
+    python ml/compile_scentnet.py
+"""
+from __future__ import annotations
+
+import json
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+_HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+
+try:
+    from ml.compile_model import compile_preprocessing, dir_size, file_sha256, save_compiled
+except ModuleNotFoundError:
+    from compile_model import compile_preprocessing, dir_size, file_sha256, save_compiled
+
+MODEL_DIR         = _HERE / "model"
+WEIGHTS_PATH      = MODEL_DIR / "scentnet.pt"
+PREPROCESSOR_PATH = MODEL_DIR / "scentnet_preprocessor.joblib"
+TORCHSCRIPT_PATH  = MODEL_DIR / "scentnet_scripted.pt"
+COMPILED_DIR      = MODEL_DIR / "scentnet_compiled"
+MANIFEST_NAME     = "manifest.json"
+
+
+def fold_batchnorm(state_dict) -> list[tuple]:
+    # ScentNet's net.* is Linear, BatchNorm1d, ReLU, Dropout repeated, then a
+    # final Linear. In eval mode BatchNorm is an affine map, so it folds into
+    # the Linear before it:  W' = W * s,  b' = (b - mean) * s + beta,
+    # with s = gamma / sqrt(running_var + eps).
+    layers, i = [], 0
+    while f"net.{i}.weight" in state_dict:
+        weight = state_dict[f"net.{i}.weight"].double()
+        bias = state_dict[f"net.{i}.bias"].double()
+        bn = f"net.{i + 1}"
+        if f"{bn}.running_mean" in state_dict:
+            s = state_dict[f"{bn}.weight"].double() / (
+                state_dict[f"{bn}.running_var"].double() + 1e-5).sqrt()
+            weight = weight * s[:, None]
+            bias = (bias - state_dict[f"{bn}.running_mean"].double()) * s \
+                + state_dict[f"{bn}.bias"].double()
+            i += 4  # Linear, BatchNorm1d, ReLU, Dropout
+        else:
+            i += 1
+        layers.append((weight, bias))
+    return layers
+
+
+def build_folded(layers):
+    import torch
+    import torch.nn as nn
+
+    modules = []
+    for k, (weight, bias) in enumerate(layers):
+        linear = nn.Linear(weight.shape[1], weight.shape[0])
+        with torch.no_grad():
+            linear.weight.copy_(weight)
+            linear.bias.copy_(bias)
+        modules.append(linear)
+        if k < len(layers) - 1:
+            modules.append(nn.ReLU())
+    modules.append(nn.Softmax(dim=1))
+    return nn.Sequential(*modules).eval()
+
+
+def compile_mlp(layers, preprocessor, class_names) -> dict[str, np.ndarray]:
+    # Folded layers plus the preprocessor's arrays, with the scaler folded
+    # into the first layer as well: for z = (x - mean) / scale,
+    # W z + b = (W / scale) x + (b - (W / scale) @ mean).
+    features, imputer, scaler = (step for _, step in preprocessor.steps)
+    arrays = compile_preprocessing(features, imputer, scaler)
+    mean, scale = arrays.pop("scale_mean"), arrays.pop("scale_scale")
+
+    for i, (weight, bias) in enumerate(layers):
+        weight, bias = weight.numpy(), bias.numpy()
+        if i == 0:
+            weight = weight / scale
+            bias = bias - weight @ mean
+        # Stored (in, out) so the forward pass is X @ w + b.
+        arrays[f"w{i}"] = np.ascontiguousarray(weight.T)
+        arrays[f"b{i}"] = bias
+    arrays["n_layers"] = np.array([len(layers)], dtype=np.int32)
+    arrays["class_names"] = np.array([str(c) for c in class_names])
+    return arrays
+
+
+def quantize_int8(weight: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Symmetric per-output-column int8, as torch's dynamic quantisation does
+    # for Linear weights.
+    scale = np.abs(weight).max(axis=0) / 127
+    scale[scale == 0] = 1.0
+    return np.rint(weight / scale).astype(np.int8), scale.astype(np.float32)
+
+
+def mlp_variant(arrays: dict[str, np.ndarray], variant: str) -> dict[str, np.ndarray]:
+    # "float16" stores the weights in half precision; "int8" quantises them
+    # per column and serve.py quantises activations per row at call time.
+    # The first layer stays float32 in the int8 variant: with the scaler
+    # folded in it sees raw sensor units spanning five orders of magnitude,
+    # and a per-row int8 scale would flush the small ratio features to zero.
+    out = dict(arrays)
+    for i in range(int(arrays["n_layers"][0])):
+        w = arrays[f"w{i}"]
+        if variant == "float16":
+            out[f"w{i}"] = w.astype(np.float16)
+            out[f"b{i}"] = arrays[f"b{i}"].astype(np.float16)
+        elif variant == "int8":
+            if i > 0:
+                out[f"w{i}"], out[f"w{i}_scale"] = quantize_int8(w)
+            else:
+                out[f"w{i}"] = w.astype(np.float32)
+            out[f"b{i}"] = arrays[f"b{i}"].astype(np.float32)
+        else:
+            raise ValueError(f"unknown ScentNet variant {variant!r}")
+    return out
+
+
+def export_numpy(weights_path: Path = WEIGHTS_PATH,
+                 preprocessor_path: Path = PREPROCESSOR_PATH,
+                 out_dir: Path = COMPILED_DIR) -> Path:
+    import joblib
+    import torch
+
+    blob = torch.load(weights_path, map_location="cpu", weights_only=False)
+    arrays = compile_mlp(fold_batchnorm(blob["state_dict"]),
+                         joblib.load(preprocessor_path), blob["class_names"])
+    # serve.py ignores the artefact unless both hashes still match.
+    return save_compiled(arrays, out_dir, {
+        "source_sha256": file_sha256(weights_path),
+        "preprocessor_sha256": file_sha256(preprocessor_path),
+    })
+
+
+def export(weights_path: Path = WEIGHTS_PATH,
+           out_path: Path = TORCHSCRIPT_PATH) -> Path:
+    import torch
+
+    blob = torch.load(weights_path, map_location="cpu", weights_only=False)
+    model = build_folded(fold_batchnorm(blob["state_dict"]))
+    example = torch.zeros(1, blob["arch"]["in_dim"])
+    with torch.no_grad(), warnings.catch_warnings():
+        # Recent torch releases flag torch.jit as deprecated; it still works
+        # and is what torch>=2.0 hosts can all load.
+        warnings.simplefilter("ignore", FutureWarning)
+        frozen = torch.jit.freeze(torch.jit.trace(model, example))
+    manifest = {
+        # serve.py ignores the module unless this still matches scentnet.pt.
+        "source_sha256": file_sha256(weights_path),
+        "class_names": [str(c) for c in blob["class_names"]],
+    }
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        torch.jit.save(frozen, str(tmp_path), _extra_files={MANIFEST_NAME: json.dumps(manifest)})
+    tmp_path.replace(out_path)
+    return out_path
+
+
+def load_scripted(path: Path = TORCHSCRIPT_PATH):
+    import torch
+
+    extra = {MANIFEST_NAME: ""}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        module = torch.jit.load(str(path), map_location="cpu", _extra_files=extra)
+    return module, json.loads(extra[MANIFEST_NAME])
+
+
+def main() -> None:
+    out = export_numpy()
+    print(f"Wrote {out} ({dir_size(out) / 1024:.0f} KiB)")
+    out = export()
+    print(f"Wrote {out} ({out.stat().st_size / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
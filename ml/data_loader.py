@@ -1,16 +1,28 @@
 from __future__ import annotations
 
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+import warnings
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import StratifiedGroupKFold
+from sklearn.utils import check_random_state
+from sklearn.utils.multiclass import type_of_target
 
 
 DEFAULT_CSV = Path(__file__).resolve().parent / "sensor_data.csv"
 
+ID_COL = "ID"
 LABEL_COL = "Scent"
 SESSION_COL = "Session ID"
 PHASE_COL = "Phase"
@@ -25,6 +37,22 @@ LEAK_COLS = ["ID", "Device ID", "Timestamp", "Created At",
 
 DEFAULT_CLASSES = ("no_scent", "sweet_orange", "peppermint")
 
+# Columnar cache of the parsed CSV next to it (<csv>.cache.npz): numeric
+# sensor columns, Scent/Session ID/Phase as categorical codes. Valid while the CSV's
+# size and mtime match, or failing that its SHA-256 (a touch without edits).
+# The CSV only ever grows (backend/services/csvExporter.js appends rows), so
+# the cache also keeps a watermark: bytes and rows parsed so far, plus the
+# header and a hash of SAMPLE_BLOCKS blocks of BLOCK_BYTES spread over the
+# parsed bytes, ending at the watermark. If those still match, only the bytes
+# past it are parsed and appended to the cached columns.
+CACHE_SUFFIX = ".cache.npz"
+CACHE_FORMAT = 3
+BLOCK_BYTES = 4096
+SAMPLE_BLOCKS = 16
+_CATEGORICAL_COLS = [LABEL_COL, SESSION_COL, PHASE_COL]
+# What np.load raises on a truncated or corrupt cache: rebuild, don't fail.
+_CACHE_ERRORS = (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile)
+
 
 @dataclass
 class Dataset:
@@ -32,6 +60,8 @@ class Dataset:
     y: pd.Series
     groups: pd.Series
     phase: pd.Series
+    # Sharded loads: one entry per shard read (see load_shards).
+    manifest: list[dict] | None = None
 
     def __len__(self) -> int:
         return len(self.y)
@@ -40,11 +70,316 @@ class Dataset:
         return self.y.value_counts().sort_index()
 
 
+@dataclass
+class DatasetChunk:
+    # One slice of iter_dataset: rows start..start+len of what load_dataset
+    # would return, as arrays. X columns are `sensor_cols`, always float64.
+    X: np.ndarray
+    sensor_cols: list[str]
+    y: np.ndarray
+    groups: np.ndarray
+    phase: np.ndarray
+    start: int
+
+    def __len__(self) -> int:
+        return len(self.y)
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.X, columns=self.sensor_cols,
+                            index=pd.RangeIndex(self.start, self.start + len(self)))
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_path(csv_path: Path | str) -> Path:
+    csv_path = Path(csv_path)
+    return csv_path.with_name(csv_path.name + CACHE_SUFFIX)
+
+
+def _parse_csv(csv_path: Path, start: int = 0, end: int | None = None) -> dict[str, np.ndarray]:
+    # Rows in bytes [start, end) of the file (start 0 or on a line boundary),
+    # read under the file's own header. Only the columns load_dataset uses
+    # (and the DB ID, for de-duplicating shards); the verbose Timestamp and
+    # Created At strings are never parsed.
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        f.seek(max(start, len(header)))
+        body = f.read() if end is None else f.read(max(0, end - f.tell()))
+    columns = pd.read_csv(io.BytesIO(header), nrows=0).columns
+    sensors = [c for c in RAW_SENSOR_COLS if c in columns]
+    cats = [c for c in _CATEGORICAL_COLS if c in columns]
+    ids = [ID_COL] if ID_COL in columns else []
+    df = pd.read_csv(io.BytesIO(header + body), usecols=ids + sensors + cats,
+                     dtype={c: object for c in cats})
+
+    table = {"sensor_cols": np.array(sensors, dtype=str)}
+    if ids:
+        table["id"] = pd.to_numeric(df[ID_COL], errors="coerce").to_numpy(np.float64)
+    for c in sensors:
+        # Whatever dtype read_csv gives (int64 for whole readings, float64
+        # otherwise), so cached and uncached loads are identical.
+        table[f"num:{c}"] = pd.to_numeric(df[c], errors="coerce").to_numpy()
+    for c in cats:
+        codes, categories = pd.factorize(df[c])
+        table[f"codes:{c}"] = codes.astype(np.int32)
+        table[f"cats:{c}"] = np.array([str(v) for v in categories], dtype=str)
+    return table
+
+
+def _n_rows(table: dict) -> int:
+    return next((len(v) for k, v in table.items() if k != "sensor_cols"), 0)
+
+
+def _concat_tables(tables: list[dict]) -> dict:
+    # Row-wise concatenation, as one read_csv over all of them would give:
+    # an int64 column meeting a float64 one becomes float64, and categories
+    # keep their order of first appearance. Tables may differ in columns (a
+    # shard from an older export): a missing sensor is NaN there, a missing
+    # Phase "unknown" and any other missing category -1.
+    nonempty = [t for t in tables if _n_rows(t)]
+    if len(nonempty) <= 1:
+        return nonempty[0] if nonempty else tables[0]  # empty columns carry no dtype
+    tables = nonempty
+    present = set().union(*(t["sensor_cols"].tolist() for t in tables))
+    sensors = [c for c in RAW_SENSOR_COLS if c in present]
+    out = {"sensor_cols": np.array(sensors, dtype=str)}
+    for key in [f"num:{c}" for c in sensors] + ["id"] * any("id" in t for t in tables):
+        out[key] = np.concatenate([t[key] if key in t else np.full(_n_rows(t), np.nan)
+                                   for t in tables])
+    for col in _CATEGORICAL_COLS:
+        if not any(f"codes:{col}" in t for t in tables):
+            continue
+        index: dict = {}
+        parts = []
+        for t in tables:
+            if f"codes:{col}" in t:
+                remap = [index.setdefault(c, len(index)) for c in t[f"cats:{col}"].tolist()]
+                parts.append(np.array(remap + [-1], dtype=np.int32)[t[f"codes:{col}"]])
+            else:
+                fill = index.setdefault("unknown", len(index)) if col == PHASE_COL else -1
+                parts.append(np.full(_n_rows(t), fill, dtype=np.int32))
+        out[f"codes:{col}"] = np.concatenate(parts)
+        out[f"cats:{col}"] = np.array(list(index), dtype=str)
+    return out
+
+
+def _watermark(csv_path: Path, offset: int) -> dict:
+    # O(1) reads however large the file: an in-place edit is caught when it
+    # shifts the bytes after it or lands in a sampled block.
+    h = hashlib.sha256()
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        for i in range(1, SAMPLE_BLOCKS + 1):
+            end = offset * i // SAMPLE_BLOCKS
+            f.seek(max(0, end - BLOCK_BYTES))
+            block = f.read(end - f.tell())
+            h.update(block)
+    return {"offset": offset, "header": header.decode("latin-1"),
+            "sample_sha256": h.hexdigest(), "ends_line": block.endswith(b"\n")}
+
+
+def _appended(csv_path: Path, meta: dict, size: int) -> bool:
+    # Has the file only grown past the watermark since the cache was built?
+    mark = _watermark(csv_path, meta["offset"])
+    return size > meta["offset"] and meta["ends_line"] and all(
+        meta[k] == v for k, v in mark.items())
+
+
+def _read_cache(path: Path) -> tuple[dict, dict] | None:
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            table = {k: npz[k] for k in npz.files}
+        meta = json.loads(str(table.pop("meta")))
+    except _CACHE_ERRORS:
+        return None
+    return (table, meta) if meta.get("format") == CACHE_FORMAT else None
+
+
+def _cache_fresh(csv_path: Path) -> bool:
+    # Reads only the cache's meta entry, not its columns.
+    try:
+        with np.load(cache_path(csv_path), allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+        stat = csv_path.stat()
+    except _CACHE_ERRORS:
+        return False
+    return (meta.get("format") == CACHE_FORMAT and meta["size"] == stat.st_size
+            and meta["mtime_ns"] == stat.st_mtime_ns)
+
+
+def _write_cache(path: Path, table: dict, meta: dict) -> None:
+    # A temporary file of its own, so concurrent loaders (load_shards' pool,
+    # two notebooks) never interleave writes; the last rename wins.
+    try:
+        f = tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".",
+                                        suffix=".tmp", delete=False)
+    except OSError:
+        return  # read-only checkout: just don't cache
+    try:
+        with f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **table)
+        os.replace(f.name, path)
+    except OSError:
+        Path(f.name).unlink(missing_ok=True)
+
+
+def load_table(csv_path: Path | str = DEFAULT_CSV, cache: bool = True) -> dict[str, np.ndarray]:
+    # The parsed CSV as typed columns, from the cache when it is still valid.
+    csv_path = Path(csv_path)
+    if not cache:
+        return _parse_csv(csv_path)
+    stat = csv_path.stat()
+    size = stat.st_size
+    path = cache_path(csv_path)
+    cached = _read_cache(path)
+    table = digest = None
+    if cached is not None:
+        table, meta = cached
+        if meta["size"] == size and meta["mtime_ns"] == stat.st_mtime_ns:
+            return table
+        if _n_rows(table) == meta["rows"] and _appended(csv_path, meta, size):
+            # The SHA-256 would cost a pass over the whole file; a touch
+            # without edits after this just re-parses once.
+            table = _concat_tables([table, _parse_csv(csv_path, meta["offset"], size)])
+        elif meta["size"] == size and meta["sha256"] \
+                and (digest := _file_sha256(csv_path)) == meta["sha256"]:
+            pass  # only the mtime moved: keep the columns, refresh the stamp
+        else:
+            table = None
+    if table is None:
+        table = _parse_csv(csv_path, 0, size)
+        digest = digest or _file_sha256(csv_path)
+    _write_cache(path, table, {"format": CACHE_FORMAT, "size": size,
+                               "mtime_ns": stat.st_mtime_ns, "sha256": digest,
+                               "rows": _n_rows(table), **_watermark(csv_path, size)})
+    return table
+
+
+def _as_read_csv(categories: np.ndarray, missing: bool) -> np.ndarray:
+    # The cache keeps each value as written; this is what read_csv's type
+    # inference over the whole column, then astype(str), makes of them: an
+    # all-integer column without gaps is int64 ("05" -> "5"), any other
+    # all-numeric one float64 ("5" -> "5.0"), anything else stays as is.
+    values = pd.Series(categories, dtype=object).str.strip()
+    if values.empty or pd.to_numeric(values, errors="coerce").isna().any():
+        return categories
+    if not missing and values.str.fullmatch(r"[+-]?\d+").all():
+        return np.array([str(int(v)) for v in values], dtype=str)
+    return np.array([str(float(v)) for v in values], dtype=str)
+
+
+def _categorical(table: dict, col: str, mask: np.ndarray) -> pd.Series:
+    codes = table[f"codes:{col}"][mask]
+    missing = bool((table[f"codes:{col}"] < 0).any())
+    values = np.append(_as_read_csv(table[f"cats:{col}"], missing).astype(object), "nan")
+    return pd.Series(values[codes], dtype=object, name=col)  # code -1 picks "nan"
+
+
 def load_dataset(csv_path: Path | str = DEFAULT_CSV,
                  classes: Iterable[str] = DEFAULT_CLASSES,
                  sensor_cols: Iterable[str] = RAW_SENSOR_COLS,
-                 drop_empty_cols: bool = True) -> Dataset:
-    csv_path = Path(csv_path)
+                 drop_empty_cols: bool = True,
+                 cache: bool = True) -> Dataset:
+    sensor_cols = list(sensor_cols)
+    if any(c not in RAW_SENSOR_COLS for c in sensor_cols):
+        cache = False  # the cache only holds RAW_SENSOR_COLS
+    if is_sharded(csv_path):
+        return load_shards(csv_path, classes, sensor_cols, drop_empty_cols, cache=cache)
+    table = load_table(csv_path) if cache else None
+    if table is None or f"codes:{LABEL_COL}" not in table or f"codes:{SESSION_COL}" not in table:
+        return _load_dataset_csv(Path(csv_path), classes, sensor_cols, drop_empty_cols)
+    return _dataset_from_table(table, classes, sensor_cols, drop_empty_cols)
+
+
+def _dataset_from_table(table: dict, classes, sensor_cols, drop_empty_cols) -> Dataset:
+    wanted = np.flatnonzero(np.isin(table[f"cats:{LABEL_COL}"], [str(c) for c in classes]))
+    mask = np.isin(table[f"codes:{LABEL_COL}"], wanted) & (table[f"codes:{SESSION_COL}"] >= 0)
+
+    present = set(table["sensor_cols"].tolist())
+    X = pd.DataFrame({c: table[f"num:{c}"][mask] for c in sensor_cols if c in present})
+    if drop_empty_cols:
+        X = X.drop(columns=[c for c in X.columns if X[c].isna().all()])
+
+    y = _categorical(table, LABEL_COL, mask)
+    groups = _categorical(table, SESSION_COL, mask)
+    phase = _categorical(table, PHASE_COL, mask) if f"codes:{PHASE_COL}" in table \
+        else pd.Series(["unknown"] * int(mask.sum()))
+    return Dataset(X=X, y=y, groups=groups, phase=phase)
+
+
+def is_sharded(source: Path | str) -> bool:
+    # A directory of CSVs or a glob pattern rather than one file. A file
+    # that exists is one file, whatever its name (run[1].csv).
+    path = Path(source)
+    if path.is_file():
+        return False
+    return path.is_dir() or any(c in str(source) for c in "*?[")
+
+
+def shard_paths(source: Path | str) -> list[Path]:
+    # The CSVs a directory or glob names, in name order (per-day shards
+    # named by date sort chronologically). Cache files are never shards.
+    if Path(source).is_dir():
+        paths = Path(source).glob("*.csv")
+    else:
+        paths = map(Path, glob.glob(str(source)))
+    return sorted(p for p in paths
+                  if p.is_file() and CACHE_SUFFIX not in p.name)
+
+
+def load_shards(source: Path | str,
+                classes: Iterable[str] = DEFAULT_CLASSES,
+                sensor_cols: Iterable[str] = RAW_SENSOR_COLS,
+                drop_empty_cols: bool = True,
+                cache: bool = True,
+                workers: int | None = None) -> Dataset:
+    # load_dataset over every shard of `source`, concatenated in name order
+    # and de-duplicated on the DB ID: a row exported to several shards (say a
+    # daily file and a backup of it) is kept once, where it first appears.
+    # Rows without an ID are all kept. Each shard keeps its own columnar
+    # cache; shards whose cache is stale are parsed in a pool of `workers`
+    # processes (default: one per CPU), the rest just read in this one.
+    paths = shard_paths(source)
+    if not paths:
+        raise FileNotFoundError(f"no CSV shards in {source}")
+    sensor_cols = list(sensor_cols)
+    if any(c not in RAW_SENSOR_COLS for c in sensor_cols):
+        raise ValueError(f"sharded loads only read RAW_SENSOR_COLS, not {sensor_cols}")
+    stale = [p for p in paths if not (cache and _cache_fresh(p))]
+    workers = min(len(stale), workers or os.cpu_count() or 1)
+    parsed = {}
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            parsed = dict(zip(stale, pool.map(load_table, stale, [cache] * len(stale))))
+    tables = [parsed[p] if p in parsed else load_table(p, cache) for p in paths]
+
+    table = _concat_tables(tables)
+    if "id" in table:
+        ids = table["id"]
+        keep = ~(pd.Series(ids).duplicated().to_numpy() & ~np.isnan(ids))
+        table = {k: v if k == "sensor_cols" or k.startswith("cats:") else v[keep]
+                 for k, v in table.items()}
+    else:
+        keep = np.ones(_n_rows(table), dtype=bool)
+    bounds = np.cumsum([0] + [_n_rows(t) for t in tables])
+    manifest = [{"path": str(p), "bytes": p.stat().st_size, "rows": int(hi - lo),
+                 "duplicates": int(hi - lo - keep[lo:hi].sum())}
+                for p, lo, hi in zip(paths, bounds[:-1], bounds[1:])]
+
+    if f"codes:{LABEL_COL}" not in table or f"codes:{SESSION_COL}" not in table:
+        raise KeyError(f"shards of {source} have no {LABEL_COL!r}/{SESSION_COL!r} columns")
+    ds = _dataset_from_table(table, classes, sensor_cols, drop_empty_cols)
+    ds.manifest = manifest
+    return ds
+
+
+def _load_dataset_csv(csv_path: Path, classes, sensor_cols, drop_empty_cols) -> Dataset:
     df = pd.read_csv(csv_path)
 
     df = df[df[LABEL_COL].isin(classes)].copy()
@@ -67,30 +402,227 @@ def load_dataset(csv_path: Path | str = DEFAULT_CSV,
     return Dataset(X=X, y=y, groups=groups, phase=phase)
 
 
-def holdout_test_sessions(ds: Dataset,
-                          target_frac: float = 0.2,
-                          random_state: int = 42) -> tuple[np.ndarray, np.ndarray]:
-    _ = np.random.default_rng(random_state)
+def _csv_chunks(csv_path: Path, sensor_cols: list[str], classes, chunksize: int):
+    # (sensor DataFrame, filtered rows) per chunk of the CSV, with
+    # load_dataset's row filter applied.
+    header = pd.read_csv(csv_path, nrows=0).columns
+    sensors = [c for c in sensor_cols if c in header]
+    cats = [c for c in _CATEGORICAL_COLS if c in header]
+    classes = list(classes)
+    with pd.read_csv(csv_path, usecols=sensors + cats, dtype={c: object for c in cats},
+                     chunksize=chunksize) as reader:
+        for df in reader:
+            df = df[df[LABEL_COL].isin(classes)]
+            df = df.dropna(subset=[SESSION_COL, LABEL_COL])
+            yield sensors, df
+
+
+def _session_spelling(csv_path: Path, chunksize: int) -> dict[str, str]:
+    # Each Session ID as written -> as load_dataset spells it, which depends
+    # on every value in the column (see _as_read_csv).
+    values: dict = {}
+    missing = False
+    with pd.read_csv(csv_path, usecols=[SESSION_COL], dtype=object,
+                     chunksize=chunksize) as reader:
+        for df in reader:
+            col = df[SESSION_COL]
+            missing = missing or bool(col.isna().any())
+            values.update(dict.fromkeys(col.dropna().tolist()))
+    raw = np.array(list(values), dtype=str)
+    return dict(zip(raw.tolist(), _as_read_csv(raw, missing).tolist()))
+
+
+def iter_dataset(csv_path: Path | str = DEFAULT_CSV,
+                 chunksize: int = 100_000,
+                 classes: Iterable[str] = DEFAULT_CLASSES,
+                 sensor_cols: Iterable[str] = RAW_SENSOR_COLS,
+                 drop_empty_cols: bool = True) -> Iterator[DatasetChunk]:
+    # load_dataset in DatasetChunks of at most `chunksize` CSV rows, in file
+    # order, so memory is bounded by the chunk rather than the file. Rows of a
+    # session may span chunks; `groups` carries the session of every row.
+    # Whether a column is empty is a property of the whole file, so
+    # drop_empty_cols costs a first pass over the sensor columns; so is how
+    # numeric Session IDs are spelled, a pass over that column alone.
+    csv_path = Path(csv_path)
+    sensor_cols, classes = list(sensor_cols), list(classes)
+    spelling = _session_spelling(csv_path, chunksize)
+    if drop_empty_cols:
+        seen: set[str] = set()
+        for sensors, df in _csv_chunks(csv_path, sensor_cols, classes, chunksize):
+            for c in sensors:
+                if c not in seen and pd.to_numeric(df[c], errors="coerce").notna().any():
+                    seen.add(c)
+        sensor_cols = [c for c in sensor_cols if c in seen]
 
-    test_sessions: list[str] = []
-    for cls in sorted(ds.y.unique()):
-        cls_mask = (ds.y == cls)
-        cls_sessions = ds.groups[cls_mask].value_counts()
-        if cls_sessions.empty:
+    start = 0
+    for sensors, df in _csv_chunks(csv_path, sensor_cols, classes, chunksize):
+        if df.empty:
             continue
-        target = max(1, int(round(cls_sessions.sum() * target_frac)))
-        # Tiebreaker prefers the smaller session so the test set can't dominate train.
-        ranked = sorted(cls_sessions.items(),
-                        key=lambda kv: (abs(kv[1] - target), kv[1], kv[0]))
-        test_sessions.append(ranked[0][0])
+        X = np.empty((len(df), len(sensors)), dtype=np.float64)
+        for j, c in enumerate(sensors):
+            X[:, j] = pd.to_numeric(df[c], errors="coerce").to_numpy(np.float64, na_value=np.nan)
+        phase = df[PHASE_COL].astype(str).to_numpy() if PHASE_COL in df.columns \
+            else np.full(len(df), "unknown", dtype=object)
+        yield DatasetChunk(X=X, sensor_cols=sensors,
+                           y=df[LABEL_COL].astype(str).to_numpy(),
+                           groups=df[SESSION_COL].map(spelling).to_numpy(),
+                           phase=phase, start=start)
+        start += len(df)
 
-    mask_test = ds.groups.isin(test_sessions).to_numpy()
-    test_idx = np.where(mask_test)[0]
-    train_idx = np.where(~mask_test)[0]
-    return train_idx, test_idx
+
+def _sorted_codes(values) -> tuple[np.ndarray, np.ndarray]:
+    # np.unique(values, return_inverse=True), hashing the values and sorting
+    # only the distinct values.
+    codes, uniques = pd.factorize(np.asarray(values), use_na_sentinel=False)
+    uniques = np.asarray(uniques)
+    rank = np.argsort(uniques, kind="stable")
+    inverse = np.empty_like(rank)
+    inverse[rank] = np.arange(len(rank))
+    return uniques[rank], inverse[codes]
+
+
+class SessionIndex:
+    # Rows grouped by session, built in one pass: sessions (sorted, as
+    # np.unique gives them), each one's rows as a contiguous run of `order`
+    # (rows stably sorted by session), and per-session row, label and phase
+    # counts. Splits are then computed per session, and only the index
+    # arrays they return scale with rows.
+    def __init__(self, groups, y, phase=None):
+        self.sessions, self.codes = _sorted_codes(groups)
+        self.classes, y_codes = _sorted_codes(y)
+        self.order = np.argsort(self.codes, kind="stable")
+        self.sizes = np.bincount(self.codes, minlength=len(self.sessions))
+        self.starts = np.cumsum(self.sizes) - self.sizes
+        self.label_counts = self._counts(y_codes, len(self.classes))
+        if phase is not None:
+            self.phases, phase_codes = _sorted_codes(phase)
+            self.phase_counts = self._counts(phase_codes, len(self.phases))
+        # Sessions recorded one after another (as the collector writes them)
+        # are each one run of the original rows, starting at `first`.
+        self.first = self.order[self.starts]
+        self.grouped = int(np.count_nonzero(np.diff(self.codes))) + 1 == len(self.sessions)
+
+    def _counts(self, codes: np.ndarray, k: int) -> np.ndarray:
+        # (sessions, k) table of how often each code occurs in each session.
+        flat = np.bincount(self.codes * k + codes, minlength=len(self.sessions) * k)
+        return flat.reshape(len(self.sessions), k)
+
+    @classmethod
+    def from_dataset(cls, ds: Dataset) -> SessionIndex:
+        return cls(ds.groups.to_numpy(), ds.y.to_numpy(), ds.phase.to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def session_rows(self, session: int) -> np.ndarray:
+        # Rows of the session at this position in `sessions`, ascending: a
+        # view into `order`.
+        return self.order[self.starts[session]:self.starts[session] + self.sizes[session]]
+
+    def slices(self, sessions) -> list[slice]:
+        # Row ranges of the given session positions, in row order, for
+        # slicing views (X[sl]) instead of fancy-indexed copies. Needs each
+        # session in one run of rows; X[index.order] arranges any data so.
+        if not self.grouped:
+            raise ValueError("sessions are not contiguous runs of rows; reorder by `order` first")
+        return sorted((slice(int(self.first[s]), int(self.first[s] + self.sizes[s]))
+                       for s in np.asarray(sessions, dtype=np.int64)), key=lambda sl: sl.start)
+
+    def rows(self, sessions) -> np.ndarray:
+        # Ascending row indices of the given session positions.
+        sessions = np.asarray(sessions, dtype=np.int64)
+        if not len(sessions):
+            return np.empty(0, dtype=np.int64)
+        parts = [self.session_rows(s) for s in sessions]
+        if self.grouped:
+            return np.concatenate(sorted(parts, key=lambda r: r[0]))
+        return np.sort(np.concatenate(parts))
+
+    def _train_test(self, test: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        is_test = np.zeros(len(self.sessions), dtype=bool)
+        is_test[test] = True
+        return self.rows(np.flatnonzero(~is_test)), self.rows(np.flatnonzero(is_test))
+
+    def holdout(self, target_frac: float = 0.2) -> tuple[np.ndarray, np.ndarray]:
+        # holdout_test_sessions on the per-session counts.
+        test = []
+        for c in range(len(self.classes)):
+            counts = self.label_counts[:, c]
+            present = np.flatnonzero(counts)
+            if not len(present):
+                continue
+            target = max(1, int(round(counts.sum() * target_frac)))
+            # Tiebreaker prefers the smaller session so the test set can't dominate train.
+            test.append(min(present, key=lambda s: (abs(counts[s] - target), counts[s],
+                                                    self.sessions[s])))
+        return self._train_test(np.array(test, dtype=np.int64))
+
+    def stratified_group_folds(self, n_splits: int = 5, shuffle: bool = True,
+                               random_state=None) -> np.ndarray:
+        # Fold of each session, assigned exactly as StratifiedGroupKFold does
+        # (scikit-learn 1.x): largest class imbalance first, each session to
+        # the fold that keeps class proportions most even. That includes its
+        # quirk of shuffling the count rows but not the session ids they are
+        # filed under, so the folds match it row for row.
+        y_cnt = self.label_counts.sum(axis=0)
+        if np.all(n_splits > y_cnt):
+            raise ValueError("n_splits=%d cannot be greater than the"
+                             " number of members in each class." % n_splits)
+        if n_splits > y_cnt.min():
+            warnings.warn("The least populated class in y has only %d"
+                          " members, which is less than n_splits=%d." % (y_cnt.min(), n_splits),
+                          UserWarning)
+        counts = self.label_counts.astype(np.float64)
+        if shuffle:
+            check_random_state(random_state).shuffle(counts)
+        per_fold = np.zeros((n_splits, len(self.classes)))
+        folds = np.empty(len(self.sessions), dtype=np.int64)
+        for g in np.argsort(-np.std(counts, axis=1), kind="mergesort"):
+            best, best_eval, best_n = None, np.inf, np.inf
+            for i in range(n_splits):
+                per_fold[i] += counts[g]
+                fold_eval = np.mean(np.std(per_fold / y_cnt.reshape(1, -1), axis=0))
+                per_fold[i] -= counts[g]
+                n = np.sum(per_fold[i])
+                if fold_eval < best_eval or (np.isclose(fold_eval, best_eval) and n < best_n):
+                    best, best_eval, best_n = i, fold_eval, n
+            per_fold[best] += counts[g]
+            folds[g] = best
+        return folds
+
+    def split(self, n_splits: int = 5, shuffle: bool = True, random_state=None):
+        # (train_idx, test_idx) per fold, as StratifiedGroupKFold.split.
+        folds = self.stratified_group_folds(n_splits, shuffle, random_state)
+        for i in range(n_splits):
+            yield self._train_test(np.flatnonzero(folds == i))
+
+
+class SessionGroupKFold(StratifiedGroupKFold):
+    # StratifiedGroupKFold computed on a SessionIndex: the same folds, but
+    # without a Python-level pass over every row for every fold.
+    def split(self, X, y=None, groups=None):
+        if groups is None:
+            raise ValueError("The 'groups' parameter should not be None.")
+        target = type_of_target(np.asarray(y))
+        if target not in ("binary", "multiclass"):
+            raise ValueError("Supported target types are: ('binary', 'multiclass'). "
+                             f"Got {target!r} instead.")
+        index = SessionIndex(groups, y)
+        if self.n_splits > len(index):
+            raise ValueError(f"Cannot have number of splits n_splits={self.n_splits} greater "
+                             f"than the number of groups: {len(index)}.")
+        yield from index.split(self.n_splits, self.shuffle,
+                               self.random_state if self.shuffle else None)
+
+
+def holdout_test_sessions(ds: Dataset,
+                          target_frac: float = 0.2,
+                          random_state: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    # One test session per class: the one closest to target_frac of that
+    # class's rows. Deterministic, so random_state is unused.
+    return SessionIndex.from_dataset(ds).holdout(target_frac)
 
 
 def grouped_cv_splitter(n_splits: int = 5,
                         random_state: int = 42) -> StratifiedGroupKFold:
-    return StratifiedGroupKFold(n_splits=n_splits, shuffle=True,
-                                random_state=random_state)
+    return SessionGroupKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
@@ -0,0 +1,215 @@
+"""Constant-memory baseline and drift tracking for sensor channels.
+
+Pure Python so collect_labeled_data.py can use it without NumPy. Each tracker
+keeps a streaming median of its calibration readings (P², Jain & Chlamtac
+1985) as the baseline and an EWMA of recent readings as the current level;
+both update in O(1) per reading however long the stream runs.
+"""
+from __future__ import annotations
+
+import math
+import statistics
+from collections import OrderedDict
+
+
+class P2Quantile:
+    # The first `exact_n` values are kept and the quantile is exact over
+    # them (for the median, identical to statistics.median). After that the
+    # five P² markers are seeded from those values and the buffer dropped.
+    def __init__(self, p: float = 0.5, exact_n: int = 32):
+        if not 0.0 < p < 1.0:
+            raise ValueError(f"p must be in (0, 1), got {p}")
+        self.p = p
+        self.exact_n = max(exact_n, 5)
+        self.count = 0
+        self._buffer: list[float] | None = []
+        self._q: list[float] = []
+        self._n: list[int] = []
+        self._want: list[float] = []
+        self._dn = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        if self._buffer is not None:
+            self._buffer.append(x)
+            if len(self._buffer) > self.exact_n:
+                self._seed_markers()
+            return
+
+        q, n = self._q, self._n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._want[i] += self._dn[i]
+
+        for i in (1, 2, 3):
+            d = self._want[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                n[i] += step
+
+    def _seed_markers(self) -> None:
+        values = sorted(self._buffer)
+        m = len(values)
+        self._want = [1 + (m - 1) * f for f in self._dn]
+        self._n = [1] + [int(round(w)) for w in self._want[1:4]] + [m]
+        self._q = [values[i - 1] for i in self._n]
+        self._buffer = None
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self._q, self._n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self) -> float | None:
+        if self._buffer is None:
+            return self._q[2]
+        if not self._buffer:
+            return None
+        if self.p == 0.5:
+            return statistics.median(self._buffer)
+        values = sorted(self._buffer)
+        pos = (len(values) - 1) * self.p
+        lo = math.floor(pos)
+        hi = min(lo + 1, len(values) - 1)
+        return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+class DriftTracker:
+    # One sensor channel. Readings passed with calibrate=True build the
+    # baseline (median); every reading moves the EWMA level. `normalised` is
+    # the latest reading's signed offset from baseline relative to it,
+    # `deviation` its magnitude and `level_deviation` the EWMA's; `alarm`
+    # fires when the level has drifted beyond `tolerance`. With
+    # auto_calibrate_n, the first that many readings calibrate automatically
+    # (the serving daemon has no labelled phases to go by). NaN and infinite
+    # readings count as missing: one would hold the baseline or level forever.
+    def __init__(self, tolerance: float = 0.15, alpha: float = 0.1,
+                 auto_calibrate_n: int = 0):
+        self.tolerance = tolerance
+        self.alpha = alpha
+        self.auto_calibrate_n = auto_calibrate_n
+        self.median = P2Quantile(0.5)
+        self.level: float | None = None
+        self.last: float | None = None
+        # Worst reading since the last reset_block(), for pass/fail checks
+        # over a block of readings without keeping the block.
+        self.block_worst: tuple[float, float] | None = None
+
+    @property
+    def baseline(self) -> float | None:
+        return self.median.value()
+
+    def normalise(self, value: float | None) -> float | None:
+        baseline = self.baseline
+        if value is None or not baseline:
+            return None
+        return (value - baseline) / abs(baseline)
+
+    def deviation(self, value: float | None) -> float | None:
+        rel = self.normalise(value)
+        return None if rel is None else abs(rel)
+
+    def update(self, value: float | None, calibrate: bool | None = None) -> dict:
+        if value is not None and math.isfinite(value):
+            if calibrate or (calibrate is None and self.median.count < self.auto_calibrate_n):
+                self.median.add(value)
+            self.level = value if self.level is None \
+                else self.alpha * value + (1 - self.alpha) * self.level
+            dev = self.deviation(value)
+            if dev is not None and (self.block_worst is None or dev > self.block_worst[1]):
+                self.block_worst = (value, dev)
+        else:
+            value = None
+        self.last = value
+        return self.state()
+
+    def state(self) -> dict:
+        level_dev = self.deviation(self.level)
+        rel = self.normalise(self.last)
+        return {
+            "baseline":        self.baseline,
+            "normalised":      rel,
+            "deviation":       None if rel is None else abs(rel),
+            "level_deviation": level_dev,
+            "alarm":           level_dev is not None and level_dev > self.tolerance,
+        }
+
+    def reset_block(self) -> None:
+        self.block_worst = None
+
+    def block_ok(self) -> bool:
+        return self.block_worst is None or self.block_worst[1] <= self.tolerance
+
+
+class _Device:
+    __slots__ = ("trackers", "stamp", "out")
+
+    def __init__(self, trackers: dict[str, DriftTracker]):
+        self.trackers = trackers
+        self.stamp = None
+        self.out = None
+
+
+class DriftMonitor:
+    # DriftTrackers per (device, channel), created on first sight. At most
+    # `max_devices` devices are tracked; the least recently seen is dropped.
+    def __init__(self, channels: list[str], max_devices: int = 10_000, **tracker_kwargs):
+        self.channels = list(channels)
+        self.max_devices = max_devices
+        self.tracker_kwargs = tracker_kwargs
+        self._devices: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def reset(self, device=None) -> None:
+        # Forget a device (or all), so its baseline is learned afresh.
+        if device is None:
+            self._devices.clear()
+        else:
+            self._devices.pop(device, None)
+
+    def _device(self, device) -> _Device:
+        d = self._devices.get(device)
+        if d is None:
+            d = _Device({c: DriftTracker(**self.tracker_kwargs) for c in self.channels})
+            self._devices[device] = d
+            if len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+        else:
+            self._devices.move_to_end(device)
+        return d
+
+    def trackers(self, device) -> dict[str, DriftTracker]:
+        return self._device(device).trackers
+
+    def update(self, device, values: dict[str, float | None], stamp=None) -> dict:
+        # Per-channel tracker states plus an overall "alarm". A repeated
+        # non-None `stamp` is the same reading again and changes nothing.
+        d = self._device(device)
+        if stamp is not None and stamp == d.stamp:
+            return d.out
+        channels = {c: t.update(values.get(c)) for c, t in d.trackers.items()}
+        d.stamp = stamp
+        d.out = {"alarm": any(s["alarm"] for s in channels.values()), "channels": channels}
+        return d.out
+
+    def alarms(self) -> dict:
+        # Devices whose last update raised an alarm, with the channels at fault.
+        return {device: [c for c, s in d.out["channels"].items() if s["alarm"]]
+                for device, d in self._devices.items() if d.out and d.out["alarm"]}
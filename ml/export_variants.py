@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Export reduced-precision variants of the compiled serving models.
+
+For each of model/pipeline_compiled/ and model/scentnet_compiled/ this writes
+one sibling directory per variant (e.g. pipeline_compiled_float16/) and
+records size, single-row p50/p99 latency and holdout macro-F1 of the full-
+precision model and every variant under "variants" in model/metrics.json.
+serve.py only serves a variant named in production.json while its macro-F1 is
+within tolerance of the full model. Run after compile_model.py and
+compile_scentnet.py:
+
+    python ml/export_variants.py
+"""
+from __future__ import annotations
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+_HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+
+from ml import serve  # noqa: E402
+from ml.compile_model import (COMPILED_DIR, dir_size, forest_variant,  # noqa: E402
+                              load_compiled, save_compiled, variant_dir)
+from ml.compile_scentnet import COMPILED_DIR as SCENTNET_COMPILED_DIR, mlp_variant  # noqa: E402
+from ml.data_loader import holdout_test_sessions, load_dataset  # noqa: E402
+
+METRICS_PATH = serve.METRICS_PATH
+
+ARTEFACTS = {
+    COMPILED_DIR: (serve._CompiledBackend, {
+        "float32": lambda arrays: forest_variant(arrays, np.float32),
+        "float16": lambda arrays: forest_variant(arrays, np.float16),
+    }),
+    SCENTNET_COMPILED_DIR: (serve._NumpyMLPBackend, {
+        "float16": lambda arrays: mlp_variant(arrays, "float16"),
+        "int8":    lambda arrays: mlp_variant(arrays, "int8"),
+    }),
+}
+
+
+def evaluate(backend, records: list[dict], y_true: np.ndarray, n_calls: int = 1000) -> dict:
+    from sklearn.metrics import f1_score
+
+    pred_enc, _ = backend.predict(records)
+    y_pred = np.asarray(backend.classes)[pred_enc]
+
+    latencies = np.empty(n_calls)
+    for i in range(n_calls):
+        record = records[i % len(records)]
+        t0 = time.perf_counter()
+        backend.predict([record])
+        latencies[i] = (time.perf_counter() - t0) * 1000
+    return {
+        "holdout_macro_f1": float(f1_score(y_true, y_pred, average="macro")),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def export_variants() -> dict:
+    ds = load_dataset()
+    _, test_idx = holdout_test_sessions(ds)
+    records = ds.X.iloc[test_idx].to_dict("records")
+    y_true = ds.y.iloc[test_idx].to_numpy()
+
+    results = {}
+    for base_dir, (backend_cls, variants) in ARTEFACTS.items():
+        if not base_dir.exists():
+            continue
+        arrays, manifest = load_compiled(base_dir)
+        manifest = {k: v for k, v in manifest.items() if k != "arrays"}
+        scores = {"full": {"size_bytes": dir_size(base_dir),
+                           **evaluate(backend_cls(arrays), records, y_true)}}
+        for name, make in variants.items():
+            out_dir = save_compiled(make(load_compiled(base_dir, mmap_mode=None)[0]),
+                                    variant_dir(base_dir, name), {**manifest, "variant": name})
+            scores[name] = {"size_bytes": dir_size(out_dir),
+                            **evaluate(backend_cls(load_compiled(out_dir)[0]), records, y_true)}
+        results[base_dir.name] = scores
+
+    metrics = json.loads(METRICS_PATH.read_text()) if METRICS_PATH.exists() else {}
+    metrics["variants"] = results
+    METRICS_PATH.write_text(json.dumps(metrics, indent=2, default=str))
+    return results
+
+
+def main() -> None:
+    results = export_variants()
+    print(f"{'artefact':<20}  {'variant':>8}  {'KiB':>6}  {'p50 ms':>7}  {'p99 ms':>7}  macro-F1")
+    for artefact, scores in results.items():
+        for name, s in scores.items():
+            print(f"{artefact:<20}  {name:>8}  {s['size_bytes'] / 1024:>6.0f}  "
+                  f"{s['p50_ms']:>7.3f}  {s['p99_ms']:>7.3f}  {s['holdout_macro_f1']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
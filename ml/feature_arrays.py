@@ -0,0 +1,266 @@
+"""Feature engineering on plain arrays, with no pandas or scikit-learn import.
+
+features.ScentFeatureBuilder delegates its NumPy engine here; serve.py's
+compiled backend uses it directly so a cold start never pays for pandas.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+
+CANONICAL = {
+    "VOC_multichannel": ["VOC_multichannel", "Sensor 4", "voc", "VOC"],
+    "NO2":             ["NO2", "Sensor 5", "no2"],
+    "Ethanol":         ["Ethanol", "ethanol"],
+    "CoH2":            ["CoH2", "COandH2", "co_h2"],
+    "VocRaw":          ["VocRaw", "srawVoc", "voc_raw"],
+    "NoxRaw":          ["NoxRaw", "srawNox", "nox_raw"],
+}
+
+ENV_COLS = {
+    "Temperature": ["Sensor 0", "temperature", "Temperature"],
+    "Humidity":    ["Sensor 1", "humidity", "Humidity"],
+    "GasResist":   ["Sensor 3", "gas", "gas_resistance"],
+}
+
+RAW_COLS = list({**CANONICAL, **ENV_COLS})
+ALIASES = list({**CANONICAL, **ENV_COLS}.values())
+
+OUT_COLS = [
+    "VOC_multichannel", "NO2", "Ethanol", "CoH2", "VocRaw", "NoxRaw",
+    # Temperature/Humidity excluded as raw features: near-constant within
+    # a session, so the model would learn session identity. GasResist
+    # stays — it responds to VOC exposure within a session.
+    "GasResist",
+    "voc_ratio", "ethanol_voc_ratio", "voc_balance",
+    "nox_intensity", "nox_balance",
+    "voc_no2_interaction", "ethanol_no2_ratio", "co_voc_ratio",
+    "total_voc_intensity", "chemical_diversity", "gas_dominance",
+    "vocraw_log", "noxraw_log",
+    # Env interactions only mix env with a gas channel, never env alone.
+    "gas_temp_ratio", "gas_humidity_ratio",
+    "voc_humidity_corrected", "voc_temp_corrected",
+    "humidity_voc_interaction", "ethanol_humidity_ratio",
+    "gasresist_log",
+]
+
+
+def to_float(value) -> float:
+    # Scalar counterpart of pd.to_numeric(errors="coerce").
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def records_matrix(records) -> np.ndarray:
+    # Raw RAW_COLS matrix straight from reading dicts, resolving the aliases
+    # per record; no DataFrame is built.
+    raw = np.full((len(records), len(RAW_COLS)), np.nan, dtype=np.float64)
+    for i, record in enumerate(records):
+        row = raw[i]
+        for j, aliases in enumerate(ALIASES):
+            for a in aliases:
+                if a in record:
+                    row[j] = to_float(record[a])
+                    break
+    return raw
+
+
+def nan_row_stats(g: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Row-wise skipna std (ddof=1), max and mean, computed the same way as
+    # pandas' nanops so results match the DataFrame path bit for bit.
+    mask = np.isnan(g)
+    count = (~mask).sum(axis=1)
+    filled = np.where(mask, 0.0, g)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = filled.sum(axis=1) / count
+        sqr = np.where(mask, 0.0, (mean[:, None] - filled) ** 2)
+        std = np.sqrt(sqr.sum(axis=1) / (count - 1))
+    std[count <= 1] = np.nan
+    mx = np.where(mask, -np.inf, g).max(axis=1)
+    mx[count == 0] = np.nan
+    return std, mx, mean
+
+
+def engineer(raw: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    # NumPy twin of the pandas arithmetic in features.ScentFeatureBuilder;
+    # operand order is kept identical so float rounding matches.
+    voc, no2, eth, co, vraw, nraw, t, rh, gas = raw.T
+    eps = 1.0
+    if out is None:
+        out = np.empty((len(raw), len(OUT_COLS)), dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std, mx, mean = nan_row_stats(raw[:, [1, 2, 0, 3]])
+        cols = {
+            "VOC_multichannel": voc, "NO2": no2, "Ethanol": eth, "CoH2": co,
+            "VocRaw": vraw, "NoxRaw": nraw, "GasResist": gas,
+            "voc_ratio":         voc / (vraw + eps),
+            "ethanol_voc_ratio": eth / (voc + eps),
+            "voc_balance":       (voc - eth) / (voc + eth + eps),
+            "nox_intensity":     no2 / (nraw + eps),
+            "nox_balance":       (no2 - nraw / 100) / (no2 + nraw / 100 + eps),
+            "voc_no2_interaction": voc * no2 / 1000,
+            "ethanol_no2_ratio":   eth / (no2 + eps),
+            "co_voc_ratio":        co / (voc + eps),
+            "total_voc_intensity": voc + eth + vraw / 100,
+            "chemical_diversity":  std,
+            "gas_dominance":       mx / (mean + eps),
+            "vocraw_log": np.log1p(np.maximum(vraw, 0)),
+            "noxraw_log": np.log1p(np.maximum(nraw, 0)),
+            "gas_temp_ratio":      gas / (t + eps),
+            "gas_humidity_ratio":  gas / (rh + eps),
+            "voc_humidity_corrected": voc / (rh + eps),
+            "voc_temp_corrected":     voc / (t + eps),
+            "humidity_voc_interaction": rh * voc / 1000,
+            "ethanol_humidity_ratio":   eth / (rh + eps),
+            "gasresist_log": np.log1p(np.maximum(gas, 0)),
+        }
+        for j, name in enumerate(OUT_COLS):
+            out[:, j] = cols[name]
+
+    out[np.isinf(out)] = np.nan
+    return out
+
+
+def transform_records(records) -> np.ndarray:
+    return engineer(records_matrix(records))
+
+
+# Temporal context per stream of readings (a session in training, a device
+# when serving). Stat-major column order: all rolling means, then stds, ...
+TEMPORAL_CHANNELS = ["VOC_multichannel", "NO2", "Ethanol", "GasResist"]
+TEMPORAL_STATS = ["roll_mean", "roll_std", "diff", "ewma", "baseline_delta"]
+TEMPORAL_COLS = [f"{c}_{s}" for s in TEMPORAL_STATS for c in TEMPORAL_CHANNELS]
+_TEMPORAL_IDX = [RAW_COLS.index(c) for c in TEMPORAL_CHANNELS]
+
+
+class _Stream:
+    __slots__ = ("ring", "pos", "count", "mean", "m2", "prev", "run", "last", "ewma",
+                 "base_sum", "base_n", "stamp", "out")
+
+    def __init__(self, window: int, k: int):
+        self.ring = np.full((window, k), np.nan)
+        self.pos = 0
+        # Windowed Welford: count, mean and sum of squared deviations.
+        self.count = np.zeros(k)
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        # Length of the current run of identical finite values: a window
+        # holding only that value has std exactly 0, which the running
+        # update can miss by rounding (pandas special-cases it the same way).
+        self.prev = np.full(k, np.nan)
+        self.run = np.zeros(k)
+        self.last = np.full(k, np.nan)
+        self.ewma = np.full(k, np.nan)
+        self.base_sum = np.zeros(k)
+        self.base_n = np.zeros(k)
+        self.stamp = None
+        self.out = None
+
+
+class RollingFeatures:
+    # O(1) per reading: a ring buffer of the last `window` values with a
+    # sliding Welford mean/variance gives the rolling mean/std (ddof=1, NaNs skipped, as
+    # pandas' rolling(window, min_periods=1)); `diff` is the change from the
+    # previous reading; `ewma` is ewm(alpha, adjust=False, ignore_na=True);
+    # `baseline_delta` is the offset from the mean of the first `baseline_n`
+    # values seen on the stream. The same instance serves batch training
+    # (transform) and live readings (update), so both see identical features.
+    def __init__(self, window: int = 10, alpha: float = 0.3, baseline_n: int = 5,
+                 max_streams: int = 10_000):
+        self.window = window
+        self.alpha = alpha
+        self.baseline_n = baseline_n
+        self.max_streams = max_streams
+        self._streams: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def reset(self, key=None) -> None:
+        if key is None:
+            self._streams.clear()
+        else:
+            self._streams.pop(key, None)
+
+    def _stream(self, key) -> _Stream:
+        s = self._streams.pop(key, None)
+        if s is None:
+            s = _Stream(self.window, len(_TEMPORAL_IDX))
+            if len(self._streams) >= self.max_streams:
+                del self._streams[next(iter(self._streams))]  # least recently updated
+        self._streams[key] = s
+        return s
+
+    def update(self, key, raw_row: np.ndarray, stamp=None) -> np.ndarray:
+        # raw_row is one RAW_COLS row. A repeated non-None `stamp` for the
+        # same key is the same reading again and returns the last features
+        # without advancing the stream.
+        s = self._stream(key)
+        if stamp is not None and stamp == s.stamp:
+            return s.out
+        x = raw_row[_TEMPORAL_IDX]
+        finite = ~np.isnan(x)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Drop the value leaving the window, then add the new one.
+            old = s.ring[s.pos]
+            old_ok = ~np.isnan(old)
+            s.count -= old_ok
+            delta = np.where(old_ok, old - s.mean, 0.0)
+            mean = np.where(s.count > 0, s.mean - delta / s.count, 0.0)
+            m2 = np.where(s.count > 0, s.m2 - delta * (old - mean), 0.0)
+            s.mean = np.where(old_ok, mean, s.mean)
+            s.m2 = np.where(old_ok, m2, s.m2)
+
+            s.count += finite
+            delta = np.where(finite, x - s.mean, 0.0)
+            s.mean = s.mean + np.where(finite, delta / s.count, 0.0)
+            s.m2 = s.m2 + np.where(finite, delta * (x - s.mean), 0.0)
+
+        s.ring[s.pos] = x
+        s.pos = (s.pos + 1) % self.window
+        if s.pos == 0:
+            # Re-derive from the window once per lap so rounding can't
+            # drift over a long stream; amortised O(1).
+            ok = ~np.isnan(s.ring)
+            vals = np.where(ok, s.ring, 0.0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                s.mean = np.where(s.count > 0, vals.sum(axis=0) / s.count, 0.0)
+            s.m2 = np.where(ok, (vals - s.mean) ** 2, 0.0).sum(axis=0)
+
+        s.run = np.where(finite, np.where(x == s.prev, s.run + 1, 1), s.run)
+        s.prev = np.where(finite, x, s.prev)
+        constant = s.run >= s.count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var = np.where(constant, 0.0, np.maximum(s.m2, 0.0) / (s.count - 1))
+        mean = np.where(s.count > 0, np.where(constant, s.prev, s.mean), np.nan)
+        std = np.where(s.count > 1, np.sqrt(var), np.nan)
+
+        diff = x - s.last
+        s.last = x
+
+        s.ewma = np.where(finite, np.where(np.isnan(s.ewma), x,
+                                           self.alpha * x + (1 - self.alpha) * s.ewma), s.ewma)
+
+        take = finite & (s.base_n < self.baseline_n)
+        s.base_sum += np.where(take, x, 0.0)
+        s.base_n += take
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = x - s.base_sum / s.base_n
+
+        s.stamp = stamp
+        s.out = np.concatenate([mean, std, diff, s.ewma, delta])
+        return s.out
+
+    def transform(self, raw: np.ndarray, keys) -> np.ndarray:
+        # Batch form: rows of `raw` in time order, keys[i] naming each row's
+        # stream. Interleaved streams are fine.
+        out = np.empty((len(raw), len(TEMPORAL_COLS)))
+        for i, key in enumerate(keys):
+            out[i] = self.update(key, raw[i])
+        return out
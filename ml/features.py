@@ -4,21 +4,12 @@ import numpy as np
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 
-
-CANONICAL = {
-    "VOC_multichannel": ["VOC_multichannel", "Sensor 4", "voc", "VOC"],
-    "NO2":             ["NO2", "Sensor 5", "no2"],
-    "Ethanol":         ["Ethanol", "ethanol"],
-    "CoH2":            ["CoH2", "COandH2", "co_h2"],
-    "VocRaw":          ["VocRaw", "srawVoc", "voc_raw"],
-    "NoxRaw":          ["NoxRaw", "srawNox", "nox_raw"],
-}
-
-ENV_COLS = {
-    "Temperature": ["Sensor 0", "temperature", "Temperature"],
-    "Humidity":    ["Sensor 1", "humidity", "Humidity"],
-    "GasResist":   ["Sensor 3", "gas", "gas_resistance"],
-}
+try:
+    from ml.feature_arrays import (ALIASES, CANONICAL, ENV_COLS, OUT_COLS, RAW_COLS,
+                                   TEMPORAL_COLS, RollingFeatures, engineer, records_matrix)
+except ModuleNotFoundError:
+    from feature_arrays import (ALIASES, CANONICAL, ENV_COLS, OUT_COLS, RAW_COLS,
+                                TEMPORAL_COLS, RollingFeatures, engineer, records_matrix)
 
 
 def _canonicalise(df: pd.DataFrame) -> pd.DataFrame:
@@ -33,29 +24,77 @@ def _canonicalise(df: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
+_ALIAS_INDEX_CACHE: dict[tuple, list[int | None]] = {}
+
+
+def _alias_index(columns) -> list[int | None]:
+    # Position of the first matching alias for each RAW_COLS channel (None if
+    # absent). Resolved once per distinct column layout, then reused.
+    key = tuple(columns)
+    index = _ALIAS_INDEX_CACHE.get(key)
+    if index is None:
+        position = {c: i for i, c in enumerate(key)}
+        index = [next((position[a] for a in aliases if a in position), None)
+                 for aliases in ALIASES]
+        _ALIAS_INDEX_CACHE[key] = index
+    return index
+
+
+def _is_chunk(X) -> bool:
+    # data_loader.DatasetChunk, by its shape rather than its class:
+    # pipeline.joblib unpickles this module where data_loader isn't shipped.
+    return not isinstance(X, pd.DataFrame) and hasattr(X, "sensor_cols")
+
+
+def _raw_matrix(X) -> np.ndarray:
+    # (n, len(RAW_COLS)) float64 matrix in RAW_COLS order. A bare ndarray is
+    # taken to be in RAW_COLS order already.
+    if _is_chunk(X):
+        raw = np.full((len(X), len(RAW_COLS)), np.nan, dtype=np.float64)
+        for j, i in enumerate(_alias_index(X.sensor_cols)):
+            if i is not None:
+                raw[:, j] = X.X[:, i]
+        return raw
+    if not isinstance(X, pd.DataFrame):
+        raw = np.asarray(X, dtype=np.float64)
+        if raw.ndim != 2 or raw.shape[1] != len(RAW_COLS):
+            raise ValueError(f"expected an (n, {len(RAW_COLS)}) array in RAW_COLS order, "
+                             f"got shape {raw.shape}")
+        return raw
+
+    raw = np.full((len(X), len(RAW_COLS)), np.nan, dtype=np.float64)
+    for j, i in enumerate(_alias_index(X.columns)):
+        if i is None:
+            continue
+        col = X.iloc[:, i]
+        if not pd.api.types.is_numeric_dtype(col.dtype):
+            col = pd.to_numeric(col, errors="coerce")
+        raw[:, j] = col.to_numpy(dtype=np.float64, na_value=np.nan)
+    return raw
+
+
 class ScentFeatureBuilder(BaseEstimator, TransformerMixin):
-    OUT_COLS = [
-        "VOC_multichannel", "NO2", "Ethanol", "CoH2", "VocRaw", "NoxRaw",
-        # Temperature/Humidity excluded as raw features: near-constant within
-        # a session, so the model would learn session identity. GasResist
-        # stays — it responds to VOC exposure within a session.
-        "GasResist",
-        "voc_ratio", "ethanol_voc_ratio", "voc_balance",
-        "nox_intensity", "nox_balance",
-        "voc_no2_interaction", "ethanol_no2_ratio", "co_voc_ratio",
-        "total_voc_intensity", "chemical_diversity", "gas_dominance",
-        "vocraw_log", "noxraw_log",
-        # Env interactions only mix env with a gas channel, never env alone.
-        "gas_temp_ratio", "gas_humidity_ratio",
-        "voc_humidity_corrected", "voc_temp_corrected",
-        "humidity_voc_interaction", "ethanol_humidity_ratio",
-        "gasresist_log",
-    ]
+    # engine="numpy" skips DataFrame construction and returns an ndarray in
+    # OUT_COLS order. Pipelines pickled before the parameter existed unpickle
+    # without the attribute, hence the class-level default.
+    engine = "pandas"
+
+    OUT_COLS = OUT_COLS
+
+    def __init__(self, engine: str = "pandas"):
+        self.engine = engine
 
     def fit(self, X, y=None):
         return self
 
     def transform(self, X):
+        if self.engine == "numpy":
+            return engineer(_raw_matrix(X))
+        if self.engine != "pandas":
+            raise ValueError(f"unknown engine {self.engine!r}; expected 'pandas' or 'numpy'")
+
+        if _is_chunk(X):
+            X = X.frame()
         df = X if isinstance(X, pd.DataFrame) else pd.DataFrame(X)
         c = _canonicalise(df)
 
@@ -95,5 +134,58 @@ class ScentFeatureBuilder(BaseEstimator, TransformerMixin):
         out = out.replace([np.inf, -np.inf], np.nan)
         return out[self.OUT_COLS]
 
+    def transform_chunks(self, chunks):
+        # transform() over an iterable of chunks (data_loader.iter_dataset's
+        # DatasetChunks, DataFrames or arrays), one output per chunk. Features
+        # are per row, so the outputs stacked equal one transform of the lot.
+        for chunk in chunks:
+            yield self.transform(chunk)
+
+    def transform_records(self, records) -> np.ndarray:
+        # Live-serving path: a list of flat reading dicts (e.g. the JSON the
+        # backend posts) to an (n, len(OUT_COLS)) matrix.
+        return engineer(records_matrix(records))
+
+    def transform_record(self, record: dict) -> np.ndarray:
+        return self.transform_records([record])[0]
+
     def get_feature_names_out(self, input_features=None):
         return np.array(self.OUT_COLS)
+
+
+class RollingFeatureBuilder(BaseEstimator, TransformerMixin):
+    # Per-stream temporal context (rolling mean/std, diff, EWMA, delta from
+    # the stream's opening baseline) for VOC, NO2, Ethanol and GasResist.
+    # Rows must be in time order within each `group_col` value; without that
+    # column the whole frame is one stream. Uses the same RollingFeatures
+    # that serve.py updates per device, so training sees the serving values.
+    TEMPORAL_COLS = TEMPORAL_COLS
+
+    def __init__(self, group_col: str = "Session ID", window: int = 10,
+                 alpha: float = 0.3, baseline_n: int = 5):
+        self.group_col = group_col
+        self.window = window
+        self.alpha = alpha
+        self.baseline_n = baseline_n
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        df = X if isinstance(X, pd.DataFrame) else pd.DataFrame(X)
+        keys = df[self.group_col].to_numpy() if self.group_col in df.columns \
+            else np.zeros(len(df))
+        rolling = RollingFeatures(self.window, self.alpha, self.baseline_n)
+        out = rolling.transform(_raw_matrix(df), keys)
+        return pd.DataFrame(out, columns=self.TEMPORAL_COLS, index=df.index)
+
+    def transform_chunks(self, chunks):
+        # DatasetChunks in file order to one (n, len(TEMPORAL_COLS)) array per
+        # chunk. Stream state carries over, so a session split across chunks
+        # gets the same features as from transform() on the whole frame.
+        rolling = RollingFeatures(self.window, self.alpha, self.baseline_n)
+        for chunk in chunks:
+            yield rolling.transform(_raw_matrix(chunk), chunk.groups)
+
+    def get_feature_names_out(self, input_features=None):
+        return np.array(self.TEMPORAL_COLS)
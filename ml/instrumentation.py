@@ -0,0 +1,127 @@
+"""Always-on serving metrics: per-stage latency histograms and counters.
+
+Recording is a few integer operations, so serve.py times every request. The
+same numbers come out as a dict for {"cmd": "stats"} and as Prometheus text
+exposition for {"cmd": "metrics"}.
+"""
+from __future__ import annotations
+
+import math
+import time
+from collections import Counter
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class LatencyHistogram:
+    # HDR-style log-linear buckets over whole microseconds: exact below
+    # 2**SUB_BITS us, then 2**SUB_BITS buckets per power of two, so any
+    # recorded value is off by at most 1/32 (~3%). Fixed size, O(1) record.
+    SUB_BITS = 5
+    SUB = 1 << SUB_BITS
+    MAX_EXP = 37  # ~38 hours; anything slower lands in the last bucket
+
+    def __init__(self):
+        self.counts = [0] * ((self.MAX_EXP - self.SUB_BITS + 2) * self.SUB)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def _index(self, us: int) -> int:
+        if us < self.SUB:
+            return us
+        shift = min(us.bit_length() - 1, self.MAX_EXP) - self.SUB_BITS
+        mantissa = min(us >> shift, 2 * self.SUB - 1)
+        return (shift + 1) * self.SUB + mantissa - self.SUB
+
+    def _bucket_mid_ms(self, idx: int) -> float:
+        if idx < self.SUB:
+            return idx / 1000
+        shift, mantissa = idx // self.SUB - 1, idx % self.SUB + self.SUB
+        return ((mantissa << shift) + ((1 << shift) - 1) / 2) / 1000
+
+    def record(self, ms: float) -> None:
+        self.counts[self._index(max(0, int(ms * 1000)))] += 1
+        self.count += 1
+        self.sum_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> float | None:
+        # q in [0, 1]; the middle of the bucket holding that rank.
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                if idx == len(self.counts) - 1:
+                    return self.max_ms  # overflow bucket has no upper bound
+                return min(self._bucket_mid_ms(idx), self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.sum_ms / self.count,
+                **{f"p{q * 100:g}": self.percentile(q) for q in QUANTILES},
+                "max": self.max_ms}
+
+
+class Instruments:
+    def __init__(self):
+        self.started = time.time()
+        self.stages: dict[str, LatencyHistogram] = {}
+        self.counters: Counter = Counter()
+
+    def observe(self, stage: str, ms: float) -> None:
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = LatencyHistogram()
+        hist.record(ms)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def reset(self) -> None:
+        self.stages.clear()
+        self.counters.clear()
+
+    def snapshot(self) -> dict:
+        return {"uptime_s": time.time() - self.started,
+                "counters": dict(self.counters),
+                "latency_ms": {stage: h.summary() for stage, h in sorted(self.stages.items())}}
+
+    def prometheus(self, prefix: str = "telescent", gauges: dict | None = None,
+                   counters: dict | None = None, info: dict | None = None) -> str:
+        # Text exposition format 0.0.4. Latencies become one summary labelled
+        # by stage; `counters`/`gauges` add values kept elsewhere.
+        lines = []
+        if info:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in info.items())
+            lines += [f"# TYPE {prefix}_info gauge", f"{prefix}_info{{{labels}}} 1"]
+        name = f"{prefix}_stage_latency_seconds"
+        lines += [f"# HELP {name} Serving latency per stage.", f"# TYPE {name} summary"]
+        for stage, h in sorted(self.stages.items()):
+            for q in QUANTILES:
+                lines.append(f'{name}{{stage="{stage}",quantile="{q:g}"}} '
+                             f"{_num(h.percentile(q) / 1000 if h.count else math.nan)}")
+            lines.append(f'{name}_sum{{stage="{stage}"}} {_num(h.sum_ms / 1000)}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        for key, value in sorted({**self.counters, **(counters or {})}.items()):
+            lines += [f"# TYPE {prefix}_{key}_total counter", f"{prefix}_{key}_total {_num(value)}"]
+        for key, value in sorted({"uptime_seconds": time.time() - self.started,
+                                  **(gauges or {})}.items()):
+            lines += [f"# TYPE {prefix}_{key} gauge", f"{prefix}_{key} {_num(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+def _num(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
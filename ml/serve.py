@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
+import hashlib
 import json
+import math
+import os
+import queue
+import struct
 import sys
+import threading
+import time
+from collections import Counter, OrderedDict
 from pathlib import Path
 
 
@@ -10,10 +19,10 @@ _HERE = Path(__file__).resolve().parent
 sys.path.insert(0, str(_HERE))
 sys.path.insert(0, str(_HERE.parent))
 
+# Only NumPy is imported up front. pandas, joblib and scikit-learn are pulled
+# in by the loaders that need them, so the compiled backend starts without.
 try:
-    import numpy as np  # noqa: F401
-    import pandas as pd
-    import joblib
+    import numpy as np
 except ImportError as e:
     print(json.dumps({
         "error": f"Missing Python dependency: {e}. "
@@ -24,17 +33,32 @@ except ImportError as e:
     sys.exit(1)
 
 try:
-    from ml.features import ScentFeatureBuilder  # noqa: F401
+    from ml import feature_arrays
+    from ml.compile_model import file_sha256, load_compiled, variant_dir
+    from ml.compile_scentnet import load_scripted
+    from ml.drift import DriftMonitor
+    from ml.instrumentation import Instruments
+    from ml.shadow import ShadowEvaluator
 except ModuleNotFoundError:
-    from features import ScentFeatureBuilder  # noqa: F401
+    import feature_arrays
+    from compile_model import file_sha256, load_compiled, variant_dir
+    from compile_scentnet import load_scripted
+    from drift import DriftMonitor
+    from instrumentation import Instruments
+    from shadow import ShadowEvaluator
 
 
 MODEL_DIR             = Path(__file__).parent / "model"
 PIPELINE_PATH         = MODEL_DIR / "pipeline.joblib"
 ENCODER_PATH          = MODEL_DIR / "label_encoder.joblib"
+COMPILED_DIR          = MODEL_DIR / "pipeline_compiled"
 PRODUCTION_JSON_PATH  = MODEL_DIR / "production.json"
+METRICS_PATH          = MODEL_DIR / "metrics.json"
 SCENTNET_WEIGHTS_PATH = MODEL_DIR / "scentnet.pt"
 SCENTNET_PRE_PATH     = MODEL_DIR / "scentnet_preprocessor.joblib"
+SCENTNET_SCRIPTED_PATH = MODEL_DIR / "scentnet_scripted.pt"
+SCENTNET_COMPILED_DIR  = MODEL_DIR / "scentnet_compiled"
+SHADOW_LOG_PATH       = _HERE / "logs" / "shadow.ndjson"
 
 
 def _error_response(message: str) -> dict:
@@ -50,35 +74,226 @@ def _read_production_config() -> dict:
         return {"kind": "sklearn"}
 
 
+def _array_step(step):
+    # Fitted imputer/scaler steps reduced to their array arithmetic, which is
+    # what sklearn's transform does after validating the input. Anything else
+    # falls back to the estimator's own transform.
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import StandardScaler
+
+    if (isinstance(step, SimpleImputer) and not step.add_indicator
+            and isinstance(step.missing_values, float) and np.isnan(step.missing_values)
+            and not np.isnan(step.statistics_).any()):
+        statistics = step.statistics_
+        return lambda X: np.where(np.isnan(X), statistics, X)
+    if isinstance(step, StandardScaler):
+        mean = step.mean_ if step.with_mean else None
+        scale = step.scale_ if step.with_std else None
+
+        def scale_step(X):
+            if mean is not None:
+                X = X - mean
+            if scale is not None:
+                X = X / scale
+            return X
+        return scale_step
+    return step.transform
+
+
+class FeatureRows(list):
+    # Reading dicts that carry their engineered OUT_COLS matrix along, so a
+    # batch routed to several models builds its features once. Backends that
+    # engineer features themselves (all built-in ones do) take `X` as is;
+    # anything else just sees a list of readings.
+    def __init__(self, records, X: np.ndarray):
+        super().__init__(records)
+        self.X = X
+
+
+def _engineer_records(records) -> np.ndarray:
+    X = getattr(records, "X", None)
+    return X if X is not None else feature_arrays.transform_records(records)
+
+
+class _Preprocessor:
+    # The features -> impute -> scale head of a fitted pipeline, applied to
+    # reading dicts without a DataFrame round trip.
+    def __init__(self, steps):
+        (self.features_name, self.features), *rest = steps
+        self.steps = [(name, _array_step(step)) for name, step in rest]
+
+    def transform(self, records, timings: dict | None = None):
+        t0 = time.perf_counter()
+        if hasattr(self.features, "transform_records"):
+            # ScentFeatureBuilder.transform_records is the same arithmetic
+            # as feature_arrays.transform_records.
+            X = _engineer_records(records) if isinstance(records, FeatureRows) \
+                else self.features.transform_records(records)
+        else:
+            import pandas as pd
+            X = self.features.transform(pd.DataFrame(records))
+        if timings is not None:
+            timings[self.features_name] = (time.perf_counter() - t0) * 1000
+        for name, step in self.steps:
+            t0 = time.perf_counter()
+            X = step(X)
+            if timings is not None:
+                timings[name] = (time.perf_counter() - t0) * 1000
+        return X
+
+
 class _SklearnBackend:
     kind = "sklearn"
 
     def __init__(self, pipeline, classes):
         self.pipeline = pipeline
+        self.preprocessor = _Preprocessor(pipeline.steps[:-1])
         self.classes = list(classes)
 
-    def predict(self, row_df):
-        pred_enc = int(self.pipeline.predict(row_df)[0])
-        proba = self.pipeline.predict_proba(row_df)[0]
+    def predict(self, records, timings: dict | None = None):
+        # Derive the label from the probabilities rather than calling
+        # pipeline.predict, which would rebuild features and re-run the forest.
+        X = self.preprocessor.transform(records, timings)
+        clf_name, clf = self.pipeline.steps[-1]
+        t0 = time.perf_counter()
+        proba = clf.predict_proba(X)
+        if timings is not None:
+            timings[clf_name] = (time.perf_counter() - t0) * 1000
+        pred_enc = clf.classes_.take(proba.argmax(axis=1)).astype(int)
         return pred_enc, proba
 
 
+class _CompiledBackend:
+    # pipeline.joblib flattened by compile_model.py: imputer/scaler as plain
+    # arrays and the forest as contiguous node arrays, walked for all trees
+    # and rows at once. The arrays are read-only memory maps shared by every
+    # serve.py process on the host.
+    kind = "compiled"
+
+    def __init__(self, arrays):
+        self.fill = arrays["impute_fill"]
+        self.mean = arrays["scale_mean"]
+        self.scale = arrays["scale_scale"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"][0])
+        self.classes = arrays["class_names"].tolist()
+        # Reduced-precision variants still average the trees in float32.
+        self.mean_dtype = np.promote_types(self.value.dtype, np.float32)
+
+    def forest_proba(self, X):
+        # Trees compare float32 inputs against float64 thresholds, as sklearn does.
+        X = X.astype(np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node].mean(axis=1, dtype=self.mean_dtype)
+
+    def predict(self, records, timings: dict | None = None):
+        stages = [
+            ("features", _engineer_records),
+            ("imputer",  lambda X: np.where(np.isnan(X), self.fill, X)),
+            ("scaler",   lambda X: (X - self.mean) / self.scale),
+            ("clf",      self.forest_proba),
+        ]
+        X = records
+        for name, stage in stages:
+            t0 = time.perf_counter()
+            X = stage(X)
+            if timings is not None:
+                timings[name] = (time.perf_counter() - t0) * 1000
+        return X.argmax(axis=1), X
+
+
+class _NumpyMLPBackend:
+    # ScentNet exported by compile_scentnet.py: BatchNorm and the scaler are
+    # folded into the Linear layers, so a forward pass is a chain of
+    # X @ w + b with ReLU between and softmax at the end. No torch needed.
+    kind = "numpy_mlp"
+
+    def __init__(self, arrays):
+        self.fill = arrays["impute_fill"]
+        self.layers = []
+        for i in range(int(arrays["n_layers"][0])):
+            w, b = arrays[f"w{i}"], arrays[f"b{i}"]
+            scale = arrays.get(f"w{i}_scale")
+            if scale is not None:
+                w = w.astype(np.int32)  # int8 products accumulate in int32
+            elif w.dtype == np.float16:
+                w, b = w.astype(np.float32), b.astype(np.float32)
+            self.layers.append((w, b, scale))
+        # Full-precision exports run in float64, reduced variants in float32.
+        self.dtype = np.float64 if self.layers[0][1].dtype == np.float64 else np.float32
+        self.classes = arrays["class_names"].tolist()
+
+    @staticmethod
+    def _int8_matmul(X, wq, w_scale):
+        # Dynamic quantisation: each row of activations gets its own
+        # symmetric int8 scale at call time.
+        x_scale = np.abs(X).max(axis=1, keepdims=True) / 127
+        x_scale[x_scale == 0] = 1.0
+        Xq = np.rint(X / x_scale).astype(np.int32)
+        return (Xq @ wq) * (x_scale * w_scale)
+
+    def forward(self, X):
+        X = X.astype(self.dtype, copy=False)
+        last = len(self.layers) - 1
+        for i, (w, b, scale) in enumerate(self.layers):
+            X = (X @ w if scale is None else self._int8_matmul(X, w, scale)) + b
+            if i < last:
+                np.maximum(X, 0.0, out=X)
+        X -= X.max(axis=1, keepdims=True)
+        np.exp(X, out=X)
+        X /= X.sum(axis=1, keepdims=True)
+        return X
+
+    def predict(self, records, timings: dict | None = None):
+        stages = [
+            ("features", _engineer_records),
+            ("imputer",  lambda X: np.where(np.isnan(X), self.fill, X)),
+            ("scentnet", self.forward),
+        ]
+        X = records
+        for name, stage in stages:
+            t0 = time.perf_counter()
+            X = stage(X)
+            if timings is not None:
+                timings[name] = (time.perf_counter() - t0) * 1000
+        return X.argmax(axis=1), X
+
+
 class _TorchBackend:
     kind = "torch"
 
-    def __init__(self, preprocessor, model, classes):
-        self.preprocessor = preprocessor
+    def __init__(self, preprocessor, model, classes, scripted: bool = False):
+        import torch
+        self.torch = torch
+        self.preprocessor = _Preprocessor(preprocessor.steps)
         self.model = model.eval()
         self.classes = list(classes)
+        # The frozen module from compile_scentnet.py already ends in softmax.
+        self.scripted = scripted
+        if scripted:
+            self.kind = "torchscript"
 
-    def predict(self, row_df):
-        import torch
-        import torch.nn.functional as F
-        feats = self.preprocessor.transform(row_df).astype("float32")
-        with torch.no_grad():
-            logits = self.model(torch.tensor(feats))
-            proba = F.softmax(logits, dim=1).cpu().numpy()[0]
-        return int(proba.argmax()), proba
+    def predict(self, records, timings: dict | None = None):
+        torch = self.torch
+        feats = self.preprocessor.transform(records, timings).astype(np.float32)
+        t0 = time.perf_counter()
+        with torch.inference_mode():
+            out = self.model(torch.from_numpy(feats))
+            if not self.scripted:
+                out = torch.softmax(out, dim=1)
+            proba = out.numpy()
+        if timings is not None:
+            timings["scentnet"] = (time.perf_counter() - t0) * 1000
+        return proba.argmax(axis=1), proba
 
 
 def _build_scentnet(arch):
@@ -110,28 +325,138 @@ def _build_scentnet(arch):
     return ScentNet()
 
 
-def _load_sklearn_backend(label_encoder):
-    pipeline = joblib.load(PIPELINE_PATH)
+def _load_sklearn_backend(pipeline_path: Path = PIPELINE_PATH,
+                          encoder_path: Path = ENCODER_PATH):
+    import joblib
+    pipeline = joblib.load(pipeline_path)
+    label_encoder = joblib.load(encoder_path)
     return _SklearnBackend(pipeline, label_encoder.classes_.tolist())
 
 
-def _load_torch_backend():
+def _select_variant(base_dir: Path, cfg: dict) -> Path:
+    # production.json "variant" (e.g. "float16", "int8") picks a reduced-
+    # precision export from export_variants.py, but only while its holdout
+    # macro-F1 in metrics.json is within "variant_tolerance" of the full-
+    # precision model. Anything missing falls back to base_dir.
+    variant = cfg.get("variant")
+    if not variant:
+        return base_dir
+    path = variant_dir(base_dir, variant)
+    try:
+        scores = json.loads(METRICS_PATH.read_text())["variants"][base_dir.name]
+        full_f1 = scores["full"]["holdout_macro_f1"]
+        variant_f1 = scores[variant]["holdout_macro_f1"]
+    except (OSError, ValueError, KeyError):
+        print(f"No metrics for {path.name}; serving full precision", file=sys.stderr)
+        return base_dir
+    tolerance = float(cfg.get("variant_tolerance", 0.01))
+    if not path.exists() or variant_f1 < full_f1 - tolerance:
+        print(f"{path.name} not used (holdout macro-F1 {variant_f1:.4f} vs "
+              f"{full_f1:.4f}, tolerance {tolerance})", file=sys.stderr)
+        return base_dir
+    return path
+
+
+def _with_variant(backend, manifest: dict):
+    if manifest.get("variant"):
+        backend.kind = f"{backend.kind}_{manifest['variant']}"
+    return backend
+
+
+def _load_export(loader, base_dir: Path, cfg: dict):
+    # The export _select_variant picks from base_dir or, when that one is
+    # stale, incompatible or unreadable, the full-precision export itself,
+    # before anything slower. None if neither loads.
+    chosen = _select_variant(base_dir, cfg)
+    for path in dict.fromkeys([chosen, base_dir]):
+        try:
+            backend = loader(path)
+        except Exception as e:
+            print(f"Failed to load {path.name}/ ({e})", file=sys.stderr)
+            continue
+        if backend is not None:
+            if path != chosen:
+                print(f"{chosen.name}/ not usable; serving {path.name}/", file=sys.stderr)
+            return backend
+    return None
+
+
+def _load_compiled_backend(path: Path = COMPILED_DIR):
+    if not path.exists():
+        return None
+    arrays, manifest = load_compiled(path, mmap_mode="r")
+    if manifest["source_sha256"] != file_sha256(PIPELINE_PATH):
+        print(f"{path.name}/ is stale (pipeline.joblib changed); "
+              "re-run ml/compile_model.py", file=sys.stderr)
+        return None
+    if arrays["out_cols"].tolist() != feature_arrays.OUT_COLS:
+        print(f"{path.name}/ was built for different features; "
+              "re-run ml/compile_model.py", file=sys.stderr)
+        return None
+    return _with_variant(_CompiledBackend(arrays), manifest)
+
+
+def _load_numpy_mlp_backend(path: Path = SCENTNET_COMPILED_DIR):
+    if not path.exists():
+        return None
+    arrays, manifest = load_compiled(path, mmap_mode="r")
+    if (manifest["source_sha256"] != file_sha256(SCENTNET_WEIGHTS_PATH)
+            or manifest["preprocessor_sha256"] != file_sha256(SCENTNET_PRE_PATH)):
+        print(f"{path.name}/ is stale (scentnet.pt or its preprocessor changed); "
+              "re-run ml/compile_scentnet.py", file=sys.stderr)
+        return None
+    if arrays["out_cols"].tolist() != feature_arrays.OUT_COLS:
+        print(f"{path.name}/ was built for different features; "
+              "re-run ml/compile_scentnet.py", file=sys.stderr)
+        return None
+    return _with_variant(_NumpyMLPBackend(arrays), manifest)
+
+
+def _configure_torch_threads(torch) -> None:
+    # ScentNet is a few thousand multiply-adds per row: extra intra-op threads
+    # only add hand-off cost, and oversubscribe the host when several serving
+    # processes each start one thread per core. Defaults to one of each.
+    torch.set_num_threads(int(os.environ.get("TELESCENT_TORCH_THREADS", 1)))
+    try:
+        torch.set_num_interop_threads(int(os.environ.get("TELESCENT_TORCH_INTEROP_THREADS", 1)))
+    except RuntimeError:
+        pass  # settable once per process; a hot reload keeps the first value
+
+
+def _load_torch_backend(cfg: dict):
+    import joblib
     import torch
+    _configure_torch_threads(torch)
     preprocessor = joblib.load(SCENTNET_PRE_PATH)
+    # Prefer the frozen TorchScript module unless production.json opts out
+    # with "torchscript": false.
+    if cfg.get("torchscript", True) and SCENTNET_SCRIPTED_PATH.exists():
+        module, manifest = load_scripted(SCENTNET_SCRIPTED_PATH)
+        if manifest["source_sha256"] == file_sha256(SCENTNET_WEIGHTS_PATH):
+            return _TorchBackend(preprocessor, module, manifest["class_names"], scripted=True)
+        print("scentnet_scripted.pt is stale (scentnet.pt changed); "
+              "re-run ml/compile_scentnet.py", file=sys.stderr)
     blob = torch.load(SCENTNET_WEIGHTS_PATH, map_location="cpu", weights_only=False)
     model = _build_scentnet(blob["arch"])
     model.load_state_dict(blob["state_dict"])
     return _TorchBackend(preprocessor, model, blob["class_names"])
 
 
-def _load_backend():
-    cfg = _read_production_config()
+def _load_backend(cfg: dict | None = None):
+    # `cfg` is production.json unless given (a registry model's spec).
+    cfg = _read_production_config() if cfg is None else cfg
     kind = cfg.get("kind", "sklearn")
-    label_encoder = joblib.load(ENCODER_PATH)
 
     if kind == "torch":
+        # The exported NumPy MLP is ScentNet without the torch dependency;
+        # prefer it unless production.json opts out with "numpy_mlp": false.
+        if cfg.get("numpy_mlp", True):
+            backend = _load_export(_load_numpy_mlp_backend, SCENTNET_COMPILED_DIR, cfg)
+            if backend is not None:
+                return backend
+            print("No usable NumPy ScentNet; trying PyTorch", file=sys.stderr)
         try:
-            return _load_torch_backend(), label_encoder
+            return _load_torch_backend(cfg)
         except ImportError:
             print("production.json requests torch backend but PyTorch is not "
                   "installed; falling back to sklearn pipeline.joblib",
@@ -140,55 +465,864 @@ def _load_backend():
             print(f"Failed to load PyTorch backend ({e}); "
                   "falling back to sklearn pipeline.joblib", file=sys.stderr)
 
-    return _load_sklearn_backend(label_encoder), label_encoder
+    # A registry model with its own pipeline file; only pipeline.joblib has
+    # a compiled form.
+    if "pipeline" in cfg:
+        return _load_sklearn_backend(MODEL_DIR / cfg["pipeline"],
+                                     MODEL_DIR / cfg.get("label_encoder", ENCODER_PATH.name))
+
+    # The compiled forest is pipeline.joblib in array form; prefer it unless
+    # production.json opts out with "compiled": false.
+    if cfg.get("compiled", True):
+        backend = _load_export(_load_compiled_backend, COMPILED_DIR, cfg)
+        if backend is not None:
+            return backend
+        print("No usable compiled forest; using pipeline.joblib", file=sys.stderr)
+
+    return _load_sklearn_backend()
+
+
+def _load_registry(cfg: dict) -> tuple[dict, dict]:
+    # production.json "models" names backends to load next to the default
+    # one, each spec read like production.json itself ("kind", "variant",
+    # "compiled", or "pipeline"/"label_encoder" files under ml/model/).
+    # "routes" maps a device id to the model its readings use. A model that
+    # fails to load is left out, and so are routes to it.
+    models = {}
+    for name, spec in cfg.get("models", {}).items():
+        try:
+            backend = _load_backend(spec)
+            _warm_up(backend)
+        except Exception as e:
+            print(f"Model {name!r} not loaded ({e})", file=sys.stderr)
+            continue
+        backend.name = name
+        models[name] = backend
+    routes = {}
+    for device, name in cfg.get("routes", {}).items():
+        if name in models or name == "default":
+            routes[str(device)] = name
+        else:
+            print(f"Route for {device!r} ignored: no model {name!r}", file=sys.stderr)
+    return models, routes
+
+
+# Everything _load_backend reads. production.json is compared by mtime so a
+# touch forces a reload; the others by content hash.
+_WATCHED_PATHS = (PIPELINE_PATH, ENCODER_PATH, COMPILED_DIR / "manifest.json",
+                  SCENTNET_WEIGHTS_PATH, SCENTNET_PRE_PATH, SCENTNET_SCRIPTED_PATH,
+                  SCENTNET_COMPILED_DIR / "manifest.json", METRICS_PATH)
+_hash_cache: dict = {}
+
+
+def _registry_paths() -> tuple:
+    # Pipeline files named by registry models, watched like the rest.
+    paths = []
+    for spec in _read_production_config().get("models", {}).values():
+        for key in ("pipeline", "label_encoder"):
+            if key in spec:
+                paths.append(MODEL_DIR / spec[key])
+    return tuple(paths)
+
+
+def _artifact_fingerprint() -> tuple:
+    # Files are only re-hashed when their mtime or size moves, so polling
+    # costs a few stat() calls.
+    try:
+        fingerprint = [PRODUCTION_JSON_PATH.stat().st_mtime_ns]
+    except FileNotFoundError:
+        fingerprint = [None]
+    for path in _WATCHED_PATHS + _registry_paths():
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            fingerprint.append(None)
+            continue
+        key = (st.st_mtime_ns, st.st_size)
+        cached = _hash_cache.get(path)
+        if cached is None or cached[0] != key:
+            cached = _hash_cache[path] = (key, file_sha256(path))
+        fingerprint.append(cached[1])
+    return tuple(fingerprint)
+
+
+def _warm_up(backend) -> None:
+    # One prediction on an empty reading before the backend takes traffic:
+    # fails fast on a model that loads but cannot predict.
+    _, proba = backend.predict([{}])
+    if proba.shape != (1, len(backend.classes)) or not np.isfinite(proba).all():
+        raise ValueError(f"warm-up prediction returned {proba!r}")
+
 
+def _model_version(fingerprint: tuple, name: str = "default") -> str:
+    key = fingerprint if name == "default" else (fingerprint, name)
+    return hashlib.sha256(repr(key).encode()).hexdigest()[:12]
 
+
+def _stamp_versions(backend, models: dict, fingerprint: tuple) -> None:
+    backend.name = "default"
+    backend.version = _model_version(fingerprint)
+    for name, model in models.items():
+        model.version = _model_version(fingerprint, name)
+
+
+# BACKEND answers every reading not routed elsewhere; MODELS and ROUTES are
+# the registry. A batch captures all three once, so a reload never mixes
+# generations within one batch.
+MODEL_LOAD_MS = 0.0
+MODEL_FINGERPRINT = _artifact_fingerprint()
+MODELS: dict = {}
+ROUTES: dict = {}
 try:
-    BACKEND, LABEL_ENCODER = _load_backend()
-    print(f"TeleScent backend loaded ({BACKEND.kind})", file=sys.stderr)
+    _t0 = time.perf_counter()
+    BACKEND = _load_backend()
+    MODELS, ROUTES = _load_registry(_read_production_config())
+    _stamp_versions(BACKEND, MODELS, MODEL_FINGERPRINT)
+    MODEL_LOAD_MS = (time.perf_counter() - _t0) * 1000
+    print(f"TeleScent backend loaded ({BACKEND.kind}"
+          + "".join(f", {n}: {m.kind}" for n, m in MODELS.items())
+          + f") in {MODEL_LOAD_MS:.0f} ms", file=sys.stderr)
 except Exception as e:
-    BACKEND = LABEL_ENCODER = None
+    BACKEND = None
     print(f"Could not load model: {e}", file=sys.stderr)
 
 
-def predict_scent(sensor_reading: dict) -> dict:
-    if BACKEND is None or LABEL_ENCODER is None:
-        return _error_response("Model not loaded — run scent_classification.ipynb first.")
+def reload_backend() -> bool:
+    # Load whatever ml/model/ holds now if it changed since the last attempt.
+    # BACKEND is replaced by a single assignment once the new backend has
+    # answered a warm-up prediction; requests already running keep the
+    # backend they started with. On failure the old backend stays.
+    global BACKEND, MODELS, ROUTES, MODEL_FINGERPRINT, MODEL_LOAD_MS
+    fingerprint = _artifact_fingerprint()
+    if fingerprint == MODEL_FINGERPRINT:
+        return False
+    # Remember failed attempts too: a half-written file is retried once it
+    # changes again rather than on every poll.
+    MODEL_FINGERPRINT = fingerprint
+    old_kind = BACKEND.kind if BACKEND is not None else "none"
+    try:
+        t0 = time.perf_counter()
+        backend = _load_backend()
+        _warm_up(backend)
+        models, routes = _load_registry(_read_production_config())
+        load_ms = (time.perf_counter() - t0) * 1000
+        _stamp_versions(backend, models, fingerprint)
+    except Exception as e:
+        print(f"Model reload failed ({e}); keeping {old_kind} backend", file=sys.stderr)
+        return False
+    BACKEND, MODELS, ROUTES, MODEL_LOAD_MS = backend, models, routes, load_ms
+    print(f"TeleScent backend reloaded ({old_kind} -> {backend.kind}) in {load_ms:.0f} ms",
+          file=sys.stderr)
+    INSTRUMENTS.count("model_reloads")
+    if _shadow_enabled:
+        start_shadow()
+    return True
+
+
+# Shadow evaluation (shadow.py), daemon only. production.json "shadow" is
+# the candidate: a registry model's name, or a spec of its own like the
+# registry's. "shadow_log" (relative to ml/) and "shadow_queue" (batches
+# held while the candidate catches up) are optional.
+SHADOW: ShadowEvaluator | None = None
+_shadow_enabled = False
+
+
+def _load_shadow(cfg: dict, models: dict) -> ShadowEvaluator | None:
+    spec = cfg.get("shadow")
+    if not spec:
+        return None
+    if isinstance(spec, str):
+        name, candidate = spec, models.get(spec)
+        if candidate is None:
+            print(f"Shadow model {spec!r} is not in the registry", file=sys.stderr)
+            return None
+    else:
+        name, candidate = spec.get("name", "candidate"), _load_backend(spec)
+        _warm_up(candidate)
+    log_path = _HERE / cfg["shadow_log"] if "shadow_log" in cfg else SHADOW_LOG_PATH
+    return ShadowEvaluator(candidate, log_path, int(cfg.get("shadow_queue", 256)), name)
+
 
+def start_shadow() -> None:
+    # (Re)load the candidate named in production.json; the previous
+    # evaluator, if any, drains its queue on its own thread.
+    global SHADOW, _shadow_enabled
+    _shadow_enabled = True
     try:
-        row = pd.DataFrame([sensor_reading])
-        pred_enc, proba = BACKEND.predict(row)
-
-        class_names = BACKEND.classes
-        pred_label = str(class_names[pred_enc])
-
-        probs = {str(c): float(proba[i]) for i, c in enumerate(class_names)}
-        top3 = sorted(
-            [{"scent": s, "confidence": p} for s, p in probs.items()],
-            key=lambda d: d["confidence"], reverse=True,
-        )[:3]
-
-        return {
-            "predicted_scent":   pred_label,
-            "confidence":        float(proba[pred_enc]),
-            "top_predictions":   top3,
-            "all_probabilities": probs,
-            "backend":           BACKEND.kind,
-        }
+        shadow = _load_shadow(_read_production_config(), MODELS)
+    except Exception as e:
+        print(f"Shadow model not loaded ({e})", file=sys.stderr)
+        shadow = None
+    old, SHADOW = SHADOW, shadow
+    if old is not None:
+        threading.Thread(target=old.close, name="shadow-close", daemon=True).start()
+    if shadow is not None:
+        print(f"Shadowing with {shadow.name} ({shadow.candidate.kind}) -> {shadow.log_path}",
+              file=sys.stderr)
+
+
+def start_model_watcher(interval_s: float) -> threading.Event:
+    # Poll ml/model/ from a background thread so a reload never holds up the
+    # request loop. Set the returned event to stop watching.
+    stop = threading.Event()
+
+    def watch():
+        while not stop.wait(interval_s):
+            try:
+                reload_backend()
+            except Exception as e:
+                print(f"Model watcher error: {e}", file=sys.stderr)
+
+    threading.Thread(target=watch, name="model-watcher", daemon=True).start()
+    return stop
+
+
+def _format_prediction(backend, pred_enc: int, proba) -> dict:
+    class_names = backend.classes
+    pred_label = str(class_names[pred_enc])
+
+    probs = {str(c): float(proba[i]) for i, c in enumerate(class_names)}
+    top3 = sorted(
+        [{"scent": s, "confidence": p} for s, p in probs.items()],
+        key=lambda d: d["confidence"], reverse=True,
+    )[:3]
+
+    return {
+        "predicted_scent":   pred_label,
+        "confidence":        float(proba[pred_enc]),
+        "top_predictions":   top3,
+        "all_probabilities": probs,
+        "backend":           backend.kind,
+        "model":             getattr(backend, "name", "default"),
+    }
+
 
+# Response shapes a request can ask for with "fields" ("k" sets top-k's
+# length, default 3). Error responses and the timings/temporal/drift extras
+# are never trimmed.
+RESPONSE_FIELDS = {
+    "label": ("predicted_scent", "confidence"),
+    "topk":  ("predicted_scent", "confidence", "top_predictions"),
+    "full":  None,
+}
+_EXTRA_FIELDS = ("timings_ms", "temporal", "drift")
+
+
+def select_fields(result: dict, fields: str | None = "full", k: int = 3) -> dict:
+    keep = RESPONSE_FIELDS[fields or "full"]
+    if keep is None or "error" in result:
+        return result
+    out = {f: result[f] for f in keep}
+    if "top_predictions" in out and k != len(out["top_predictions"]):
+        out["top_predictions"] = sorted(
+            [{"scent": s, "confidence": c} for s, c in result["all_probabilities"].items()],
+            key=lambda d: d["confidence"], reverse=True)[:k]
+    for f in _EXTRA_FIELDS:
+        if f in result:
+            out[f] = result[f]
+    return out
+
+
+# No whitespace between tokens: the daemon's clients only parse it. One
+# shared encoder, since json.dumps builds a new one per call for any
+# non-default option. NaN/Infinity are not JSON (Node's JSON.parse rejects
+# them), so they raise here rather than reach a client.
+_COMPACT_JSON = json.JSONEncoder(separators=(",", ":"), allow_nan=False)
+
+
+def encode_json(obj) -> bytes:
+    return _COMPACT_JSON.encode(obj).encode()
+
+
+# Per-device temporal context (feature_arrays.RollingFeatures), advanced by
+# every reading that names its device, in arrival order. A reading seen again
+# (same receivedAt/timestamp) does not advance its device's stream.
+ROLLING = feature_arrays.RollingFeatures()
+
+# Per-device baseline drift (drift.DriftMonitor) on the same channels. Each
+# device's baseline is the median of its first DRIFT_CALIBRATION readings,
+# until {"cmd": "recalibrate"} starts it over.
+DRIFT_CALIBRATION = 30
+DRIFT = DriftMonitor(feature_arrays.TEMPORAL_CHANNELS, tolerance=0.15,
+                     auto_calibrate_n=DRIFT_CALIBRATION)
+_DRIFT_IDX = [feature_arrays.RAW_COLS.index(c) for c in DRIFT.channels]
+
+
+def _valid_device(device) -> bool:
+    # Device ids key the per-device state (ROLLING, DRIFT): scalars only.
+    return device is None or isinstance(device, (str, int, float))
+
+
+def _finite(state: dict) -> dict:
+    # DriftMonitor state with every non-finite number as None, as for the
+    # temporal features: a relative offset from a tiny baseline can overflow.
+    return {k: _finite(v) if isinstance(v, dict)
+            else None if isinstance(v, float) and not math.isfinite(v) else v
+            for k, v in state.items()}
+
+
+def _update_temporal(readings: list[dict], raw: np.ndarray, include: bool,
+                     include_drift: bool = False) -> tuple[list, list]:
+    # (temporal features, drift state) per reading; None where not asked for
+    # or the reading names no device. `raw` is records_matrix(readings).
+    temporal: list[dict | None] = []
+    drift: list[dict | None] = []
+    for reading, row in zip(readings, raw):
+        key = reading.get("deviceId", reading.get("device_id"))
+        if key is None:
+            temporal.append(None)
+            drift.append(None)
+            continue
+        stamp = reading.get("receivedAt", reading.get("timestamp"))
+        values = ROLLING.update(key, row, stamp)
+        state = DRIFT.update(key, dict(zip(DRIFT.channels, row[_DRIFT_IDX].tolist())), stamp)
+        temporal.append({c: float(v) if math.isfinite(v) else None
+                         for c, v in zip(feature_arrays.TEMPORAL_COLS, values)} if include else None)
+        drift.append(_finite(state) if include_drift else None)
+    return temporal, drift
+
+
+class PredictionCache:
+    # LRU of formatted predictions keyed on the model version and the
+    # reading's canonical RAW_COLS row, so alias spellings and extra fields
+    # don't matter. With `decimals` set, rows are rounded first and nearly
+    # identical readings share an entry. Entries older than ttl_s miss.
+    def __init__(self, size: int = 4096, ttl_s: float = 300.0, decimals: int | None = None):
+        self.size = size
+        self.ttl_s = ttl_s
+        self.decimals = decimals
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = self.misses = self.expired = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, version, raw_row: np.ndarray) -> tuple:
+        if self.decimals is not None:
+            raw_row = np.round(raw_row, self.decimals)
+        return version, raw_row.tobytes()
+
+    def get(self, key) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] > self.ttl_s:
+            del self._entries[key]
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    def put(self, key, result: dict) -> None:
+        self._entries[key] = (time.monotonic(), dict(result))
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"size": len(self._entries), "max_size": self.size, "ttl_s": self.ttl_s,
+                "decimals": self.decimals, "hits": self.hits, "misses": self.misses,
+                "expired": self.expired, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+# None turns caching off; main() sizes it from --cache-size/--cache-ttl.
+CACHE: PredictionCache | None = PredictionCache()
+
+
+def _predict_routed(backends: list, batch: list[dict], raw: np.ndarray,
+                    timings: dict) -> list[dict]:
+    # Formatted predictions for `batch`, where backends[j] is the model for
+    # batch[j]. Only readings the cache can't answer reach a backend, each
+    # distinct one once, and their features are built once for all models.
+    cache = CACHE
+    out: list[dict | None] = [None] * len(batch)
+    groups: dict = {}  # id(backend) -> (backend, {key: [j, ...]})
+    for j, (backend, row) in enumerate(zip(backends, raw)):
+        pending = groups.setdefault(id(backend), (backend, {}))[1]
+        if cache is None:
+            pending[j] = [j]
+            continue
+        key = cache.key(getattr(backend, "version", id(backend)), row)
+        if key in pending:
+            pending[key].append(j)
+            continue
+        out[j] = cache.get(key)
+        if out[j] is None:
+            pending[key] = [j]
+
+    firsts = [slots[0] for _, pending in groups.values() for slots in pending.values()]
+    if not firsts:
+        return out
+    t0 = time.perf_counter()
+    X = feature_arrays.engineer(raw[firsts])
+    features_ms = (time.perf_counter() - t0) * 1000
+    start = 0
+    for backend, pending in groups.values():
+        if not pending:
+            continue
+        rows = [slots[0] for slots in pending.values()]
+        pred_enc, proba = backend.predict(
+            FeatureRows([batch[j] for j in rows], X[start:start + len(rows)]), timings)
+        start += len(rows)
+        for k, (key, slots) in enumerate(pending.items()):
+            result = _format_prediction(backend, int(pred_enc[k]), proba[k])
+            if cache is not None:
+                cache.put(key, result)
+            for j in slots:
+                out[j] = dict(result)
+    timings["features"] = features_ms  # the shared build, not the backends' lookups
+    return out
+
+
+def predict_scent_batch(readings: list[dict],
+                        include_timings: bool = False,
+                        include_temporal: bool = False,
+                        include_drift: bool = False,
+                        models: list | None = None) -> list[dict]:
+    # One backend call per model in the batch (less whatever CACHE answers);
+    # results keep the order of `readings`. A malformed entry only fails its
+    # own slot. models[i], if given, names the registry model for
+    # readings[i]; otherwise ROUTES picks by device id, else BACKEND.
+    # include_timings adds a per-stage breakdown (ms, for the whole batch);
+    # include_temporal adds the device's rolling features as "temporal";
+    # include_drift adds its baseline-normalised channels and alarm as "drift".
+    # One registry per batch, even if a reload swaps it mid-way.
+    backend, registry, routes = BACKEND, MODELS, ROUTES
+    if backend is None:
+        return [_error_response("Model not loaded — run scent_classification.ipynb first.")
+                for _ in readings]
+
+    results: list[dict | None] = [None] * len(readings)
+    valid, backends = [], []
+    for i, reading in enumerate(readings):
+        if not isinstance(reading, dict):
+            results[i] = _error_response("Invalid reading: expected a JSON object")
+            continue
+        device = reading.get("deviceId", reading.get("device_id"))
+        if not _valid_device(device):
+            # One bad id must not fail the batch.
+            results[i] = _error_response("Invalid deviceId: expected a string or number")
+            continue
+        name = models[i] if models is not None else None
+        if name is None:
+            name = routes.get(str(device)) if device is not None else None
+        model = backend if name is None or name == "default" \
+            else registry.get(name) if isinstance(name, str) else None
+        if model is None:
+            results[i] = _error_response(f"Unknown model {name!r}")
+            continue
+        valid.append(i)
+        backends.append(model)
+    if not valid:
+        return results
+
+    # Stage timings are always collected for INSTRUMENTS; they are only
+    # attached to results when asked for.
+    timings: dict = {}
+    t0 = time.perf_counter()
+    try:
+        batch = [readings[i] for i in valid]
+        raw = feature_arrays.records_matrix(batch)
+        temporal, drift = _update_temporal(batch, raw, include_temporal, include_drift)
+        t_predict = time.perf_counter()
+        predictions = _predict_routed(backends, batch, raw, timings)
+        shadow = SHADOW
+        if shadow is not None:
+            served = [j for j, r in enumerate(predictions) if "error" not in r]
+            shadow.submit([batch[j] for j in served], [predictions[j] for j in served],
+                          (time.perf_counter() - t_predict) * 1000)
+        for j, i in enumerate(valid):
+            results[i] = predictions[j]
+            if include_timings:
+                results[i]["timings_ms"] = timings
+            if temporal[j] is not None:
+                results[i]["temporal"] = temporal[j]
+            if drift[j] is not None:
+                results[i]["drift"] = drift[j]
     except Exception as e:
-        return _error_response(f"Prediction failed: {e}")
+        for i in valid:
+            results[i] = _error_response(f"Prediction failed: {e}")
+
+    for stage, ms in timings.items():
+        INSTRUMENTS.observe(stage, ms)
+    INSTRUMENTS.observe("predict", (time.perf_counter() - t0) * 1000)
+    INSTRUMENTS.count("readings", len(readings))
+    INSTRUMENTS.count("errors", sum("error" in r for r in results))
+    return results
+
+
+def predict_scent(sensor_reading: dict, include_timings: bool = False,
+                  model: str | None = None) -> dict:
+    return predict_scent_batch([sensor_reading], include_timings,
+                               models=None if model is None else [model])[0]
+
+
+# Readings per backend call in the daemon, for {"cmd": "stats"}.
+BATCH_SIZES: Counter = Counter()
+
+# Stage latencies and request/reading/error counts since start-up; see
+# instrumentation.py. Stages: parse, the backend's own (features, imputer,
+# scaler, clf / scentnet), predict (the whole batch), serialise, and request
+# (a line's arrival to its response being written, queueing included).
+INSTRUMENTS = Instruments()
+
+
+def batch_stats() -> dict:
+    sizes = sorted(BATCH_SIZES.elements())
+    if not sizes:
+        return {"batches": 0, "readings": 0}
+    return {
+        "batches":  len(sizes),
+        "readings": sum(sizes),
+        "mean":     sum(sizes) / len(sizes),
+        "p50":      sizes[len(sizes) // 2],
+        "p99":      sizes[min(len(sizes) - 1, int(len(sizes) * 0.99))],
+        "max":      sizes[-1],
+        "histogram": {str(n): BATCH_SIZES[n] for n in sorted(BATCH_SIZES)},
+    }
+
+
+def _is_prediction(msg: dict) -> bool:
+    return "reading" in msg or isinstance(msg.get("readings"), list)
+
+
+def _handle_predictions(msgs: list[dict]) -> list[dict]:
+    # Several prediction requests answered by one backend call. Each response
+    # carries only its own slice of the results, and timings/temporal/drift
+    # fields only if asked.
+    readings, models = [], []
+    for msg in msgs:
+        part = [msg["reading"]] if "reading" in msg else msg["readings"]
+        readings.extend(part)
+        models.extend([msg.get("model")] * len(part))
+    results = predict_scent_batch(readings, any(msg.get("timings") for msg in msgs),
+                                  any(msg.get("temporal") for msg in msgs),
+                                  any(msg.get("drift") for msg in msgs),
+                                  models if any(models) else None)
+    if readings:
+        BATCH_SIZES[len(readings)] += 1
+
+    responses, start = [], 0
+    for msg in msgs:
+        n = 1 if "reading" in msg else len(msg["readings"])
+        part, start = results[start:start + n], start + n
+        for flag, field in (("timings", "timings_ms"), ("temporal", "temporal"), ("drift", "drift")):
+            if not msg.get(flag):
+                for result in part:
+                    result.pop(field, None)
+        fields, k = msg.get("fields"), msg.get("k", 3)
+        if fields is not None and (not isinstance(fields, str) or fields not in RESPONSE_FIELDS):
+            response = _error_response(
+                f"Unknown fields {fields!r}: expected one of {', '.join(RESPONSE_FIELDS)}")
+        elif not isinstance(k, int) or isinstance(k, bool) or k < 1:
+            response = _error_response(f"Invalid k {k!r}: expected a positive integer")
+        else:
+            part = [select_fields(result, fields, k) for result in part]
+            response = {"result": part[0]} if "reading" in msg else {"results": part}
+        if "id" in msg:
+            response["id"] = msg["id"]
+        responses.append(response)
+    return responses
+
+
+def _model_info() -> dict:
+    backend, models = BACKEND, MODELS
+    return {"kind": backend.kind if backend is not None else None,
+            "version": getattr(backend, "version", None),
+            "load_ms": MODEL_LOAD_MS,
+            "models": {name: {"kind": m.kind, "version": getattr(m, "version", None)}
+                       for name, m in models.items()},
+            "routes": len(ROUTES)}
+
+
+def metrics_text() -> str:
+    # Everything in {"cmd": "stats"} that Prometheus can scrape.
+    model = _model_info()
+    counters = {"batches": sum(BATCH_SIZES.values())}
+    gauges = {"model_load_seconds": model["load_ms"] / 1000}
+    if CACHE is not None:
+        counters.update(cache_hits=CACHE.hits, cache_misses=CACHE.misses)
+        gauges["cache_entries"] = len(CACHE)
+    gauges["drift_alarm_devices"] = len(DRIFT.alarms())
+    shadow = SHADOW
+    if shadow is not None:
+        counters.update(shadow_evaluated=shadow.evaluated, shadow_agreed=shadow.agree,
+                        shadow_dropped=shadow.dropped)
+        stats = shadow.stats()
+        gauges["shadow_agreement"] = stats["agreement"]
+        for q in ("p50", "p99"):
+            delta = stats["latency_ms"][f"{q}_delta"]
+            gauges[f"shadow_{q}_delta_seconds"] = None if delta is None else delta / 1000
+    return INSTRUMENTS.prometheus(
+        gauges=gauges, counters=counters,
+        info={"backend": model["kind"], "version": model["version"]})
+
+
+def _handle_message(msg: dict) -> dict:
+    if _is_prediction(msg):
+        return _handle_predictions([msg])[0]
+    if msg.get("cmd") == "stats":
+        response = {"stats": {**INSTRUMENTS.snapshot(),
+                              "model": _model_info(),
+                              "batch_sizes": batch_stats(),
+                              "cache": CACHE.stats() if CACHE is not None else None,
+                              "drift": {"devices": len(DRIFT), "alarms": DRIFT.alarms()},
+                              "shadow": SHADOW.stats() if SHADOW is not None else None}}
+    elif msg.get("cmd") == "metrics":
+        response = {"metrics": metrics_text()}
+    elif msg.get("cmd") == "recalibrate":
+        # {"cmd": "recalibrate", "device": id}, or every device without one.
+        if _valid_device(msg.get("device")):
+            DRIFT.reset(msg.get("device"))
+            response = {"recalibrated": msg.get("device", "all")}
+        else:
+            response = _error_response("Invalid device: expected a string or number")
+    else:
+        response = _error_response("Unknown request: expected a 'reading' or 'readings' field")
+    if "id" in msg:
+        response["id"] = msg["id"]
+    return response
+
+
+def _internal_error(msg: dict, e: Exception) -> dict:
+    # A request that broke its handler (or the encoder) is answered with an
+    # error like any other bad request; the daemon keeps serving the rest.
+    print(f"Request failed: {e!r}", file=sys.stderr)
+    response = _error_response(f"Internal error: {type(e).__name__}")
+    if "id" in msg:
+        response["id"] = msg["id"]
+    return response
+
+
+def _parse_request(line: str) -> tuple[dict | None, dict | None]:
+    # (request, None) or (None, error response).
+    try:
+        msg = json.loads(line)
+    except (ValueError, RecursionError) as e:  # RecursionError: nested too deeply
+        return None, _error_response(f"Invalid JSON input: {e}")
+    if not isinstance(msg, dict):
+        return None, _error_response("Invalid request: expected a JSON object")
+    return msg, None
+
+
+def _response_writer(stdout, framing: str, encoding: str):
+    # ndjson: one compact JSON response per line. length: each response is a
+    # 4-byte big-endian byte count then the payload, JSON or (with the
+    # optional msgpack package) MessagePack, so clients can slice frames
+    # without scanning for newlines.
+    if encoding == "msgpack":
+        import msgpack
+        encode = msgpack.packb
+    else:
+        encode = encode_json
+    if framing == "ndjson":
+        if encoding != "json":
+            raise ValueError("msgpack responses need --framing length")
+        return lambda response: stdout.write(encode(response).decode() + "\n")
+    out = getattr(stdout, "buffer", stdout)
+
+    def write(response):
+        payload = encode(response)
+        out.write(struct.pack(">I", len(payload)) + payload)
+    return write
+
+
+def serve_forever(stdin=None, stdout=None,
+                  max_batch: int = 32, max_wait_ms: float = 2.0,
+                  framing: str = "ndjson", encoding: str = "json") -> None:
+    # One request object per input line; responses are framed per `framing`
+    # and echo the request's "id". The backend stays loaded for
+    # the life of the process, so each reading only pays for the prediction.
+    #
+    # Prediction requests arriving within max_wait_ms of the first one in a
+    # window are coalesced, up to max_batch readings, into one backend call.
+    # Responses may therefore come back out of request order; callers match
+    # them by "id". A command still runs after every prediction sent before
+    # it: the pending batch is answered first. max_batch=1 turns coalescing off.
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    lines: queue.Queue = queue.Queue()
+
+    def read():
+        # Lines are stamped on arrival so "request" latency includes the
+        # time spent queued and waiting for a batch to fill.
+        for line in stdin:
+            lines.put((time.perf_counter(), line))
+        lines.put(None)
+
+    emit = _response_writer(stdout, framing, encoding)
+    threading.Thread(target=read, name="stdin-reader", daemon=True).start()
+
+    def write(response: dict, arrived: float) -> None:
+        t0 = time.perf_counter()
+        try:
+            emit(response)
+        except (TypeError, ValueError) as e:  # not encodable: nothing was written
+            response = _internal_error(response, e)
+            emit(response)
+        t1 = time.perf_counter()
+        INSTRUMENTS.observe("serialise", (t1 - t0) * 1000)
+        INSTRUMENTS.observe("request", (t1 - arrived) * 1000)
+        INSTRUMENTS.count("requests")
+        if "error" in response:
+            INSTRUMENTS.count("request_errors")
+
+    def flush(batch: list, arrivals: list) -> None:
+        if not batch:
+            return
+        try:
+            responses = _handle_predictions(batch)
+        except Exception as e:
+            responses = [_internal_error(msg, e) for msg in batch]
+        for response, arrived in zip(responses, arrivals):
+            write(response, arrived)
+
+    eof = False
+    while not eof:
+        item = lines.get()
+        deadline = time.perf_counter() + max_wait_ms / 1000
+        batch, arrivals, size = [], [], 0
+        while True:
+            if item is None:
+                eof = True
+                break
+            arrived, line = item
+            line = line.strip()
+            if line:
+                t0 = time.perf_counter()
+                msg, error = _parse_request(line)
+                INSTRUMENTS.observe("parse", (time.perf_counter() - t0) * 1000)
+                if error is not None:
+                    write(error, arrived)
+                elif _is_prediction(msg):
+                    batch.append(msg)
+                    arrivals.append(arrived)
+                    size += 1 if "reading" in msg else len(msg["readings"])
+                else:
+                    # A recalibrate or reload must not overtake readings
+                    # queued ahead of it.
+                    flush(batch, arrivals)
+                    batch, arrivals, size = [], [], 0
+                    try:
+                        response = _handle_message(msg)
+                    except Exception as e:
+                        response = _internal_error(msg, e)
+                    write(response, arrived)
+            if size >= max_batch:
+                break
+            try:
+                item = lines.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+        flush(batch, arrivals)
+        stdout.flush()
+
+
+def profile_startup(top: int = 15) -> None:
+    # Re-import serve.py in a fresh interpreter under -X importtime and report
+    # where a cold start goes: the slowest imports, then the model load.
+    import subprocess
+    probe = ("import json, time; t0 = time.perf_counter(); import serve; "
+             "print(json.dumps({'wall_ms': (time.perf_counter() - t0) * 1000, "
+             "'model_load_ms': serve.MODEL_LOAD_MS, "
+             "'backend': serve.BACKEND and serve.BACKEND.kind}))")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                          cwd=_HERE, capture_output=True, text=True)
+    imports = []
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative_us), int(self_us), name.strip()))
+    summary = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"{'cumulative ms':>13}  {'self ms':>8}  module")
+    for cumulative_us, self_us, name in sorted(imports, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>13.1f}  {self_us / 1000:>8.1f}  {name}")
+    print(f"\nimport serve: {summary['wall_ms']:.0f} ms wall, "
+          f"model load ({summary['backend']}): {summary['model_load_ms']:.0f} ms")
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="TeleScent scent prediction")
+    parser.add_argument("--daemon", action="store_true",
+                        help="serve newline-delimited JSON requests on stdin")
+    parser.add_argument("--reload-interval", type=float, default=2.0, metavar="SECONDS",
+                        help="daemon: how often to check ml/model/ for a new model (0 = never)")
+    parser.add_argument("--max-batch", type=int, default=32,
+                        help="daemon: most readings coalesced into one backend call")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0,
+                        help="daemon: how long to hold a request open for others to join it")
+    parser.add_argument("--cache-size", type=int, default=4096,
+                        help="predictions kept for repeated readings (0 = no cache)")
+    parser.add_argument("--cache-ttl", type=float, default=300.0, metavar="SECONDS",
+                        help="how long a cached prediction may be served")
+    parser.add_argument("--cache-decimals", type=int, default=None,
+                        help="round readings to this many decimals before the cache "
+                             "lookup (default: exact match only)")
+    parser.add_argument("--framing", choices=["ndjson", "length"], default="ndjson",
+                        help="daemon: newline-delimited responses, or 4-byte length-prefixed")
+    parser.add_argument("--encoding", choices=["json", "msgpack"], default="json",
+                        help="daemon: response payload encoding (msgpack needs --framing "
+                             "length and the msgpack package)")
+    parser.add_argument("--model", default=None,
+                        help="registry model to use instead of the default/routed one")
+    parser.add_argument("--fields", choices=list(RESPONSE_FIELDS), default="full",
+                        help="which result fields to return")
+    parser.add_argument("--pretty", action="store_true",
+                        help="indent the JSON output (default: compact)")
+    parser.add_argument("--timings", action="store_true",
+                        help="add a per-stage timings_ms breakdown to each result")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="report import and model load times, then exit")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup()
+        return
+
+    global CACHE
+    CACHE = PredictionCache(args.cache_size, args.cache_ttl, args.cache_decimals) \
+        if args.cache_size > 0 else None
+
+    if args.daemon:
+        start_shadow()
+        if args.reload_interval > 0:
+            start_model_watcher(args.reload_interval)
+        serve_forever(max_batch=max(1, args.max_batch), max_wait_ms=args.max_wait_ms,
+                      framing=args.framing, encoding=args.encoding)
+        return
+
     try:
         sensor_reading = json.loads(sys.stdin.read())
     except json.JSONDecodeError as e:
         print(json.dumps(_error_response(f"Invalid JSON input: {e}")))
         sys.exit(1)
 
-    result = predict_scent(sensor_reading)
-    print(json.dumps(result, indent=2))
+    timings = args.timings
+
+    def dump(obj) -> str:
+        return json.dumps(obj, indent=2) if args.pretty else encode_json(obj).decode()
+
+    # A JSON array is a batch: one result per reading, in input order.
+    if isinstance(sensor_reading, list):
+        models = None if args.model is None else [args.model] * len(sensor_reading)
+        results = [select_fields(r, args.fields)
+                   for r in predict_scent_batch(sensor_reading, timings, models=models)]
+        print(dump(results))
+        sys.exit(0 if not results or any("error" not in r for r in results) else 1)
+
+    result = select_fields(predict_scent(sensor_reading, timings, args.model), args.fields)
+    print(dump(result))
     sys.exit(0 if "error" not in result else 1)
 
 
@@ -0,0 +1,120 @@
+"""Shadow evaluation of a candidate model on live traffic.
+
+serve.py hands every served batch to a ShadowEvaluator, which replays it
+through the candidate on its own thread. The request path only pays for a
+non-blocking queue put: when the candidate falls behind, batches are dropped
+(and counted) rather than queued without bound. Each compared reading is
+appended to an NDJSON log for offline analysis:
+
+    {"t": unix time, "dev": device id, "p": live label, "c": candidate label,
+     "pc": live confidence, "cc": candidate confidence,
+     "pm": live ms, "cm": candidate ms}
+
+`pm`/`cm` are per batch: `pm` as served (cache hits included), `cm` for the
+candidate on the same readings.
+"""
+from __future__ import annotations
+
+import json
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+try:
+    from ml.instrumentation import LatencyHistogram
+except ModuleNotFoundError:
+    from instrumentation import LatencyHistogram
+
+
+class ShadowEvaluator:
+    def __init__(self, candidate, log_path: Path | None = None, max_queue: int = 256,
+                 name: str = "candidate"):
+        self.candidate = candidate
+        self.name = name
+        self.log_path = Path(log_path) if log_path is not None else None
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.submitted = self.dropped = self.evaluated = self.failed = 0
+        self.agree = 0
+        self.disagreements: Counter = Counter()
+        self.latency = {"primary": LatencyHistogram(), "candidate": LatencyHistogram()}
+        self._log = None
+        self._thread = threading.Thread(target=self._run, name="shadow-eval", daemon=True)
+        self._thread.start()
+
+    def submit(self, readings: list[dict], results: list[dict], primary_ms: float) -> bool:
+        # Never blocks: False if the batch was dropped.
+        self.submitted += 1
+        try:
+            self._queue.put_nowait((time.time(), readings, results, primary_ms))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout: float = 5.0) -> None:
+        # Finish what is queued, then stop the worker.
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                self._evaluate(*job)
+            except Exception as e:
+                self.failed += 1
+                print(f"Shadow evaluation failed: {e}", file=sys.stderr)
+        if self._log is not None:
+            self._log.close()
+
+    def _evaluate(self, stamp: float, readings, results, primary_ms: float) -> None:
+        t0 = time.perf_counter()
+        pred_enc, proba = self.candidate.predict(readings)
+        candidate_ms = (time.perf_counter() - t0) * 1000
+        self.latency["primary"].record(primary_ms)
+        self.latency["candidate"].record(candidate_ms)
+
+        classes = self.candidate.classes
+        lines = []
+        for reading, result, enc, p in zip(readings, results, pred_enc, proba):
+            live, label = result["predicted_scent"], str(classes[int(enc)])
+            self.evaluated += 1
+            if live == label:
+                self.agree += 1
+            else:
+                self.disagreements[f"{live}->{label}"] += 1
+            lines.append(json.dumps({
+                "t": round(stamp, 3),
+                "dev": reading.get("deviceId", reading.get("device_id")),
+                "p": live, "c": label,
+                "pc": round(result["confidence"], 4), "cc": round(float(p[int(enc)]), 4),
+                "pm": round(primary_ms, 4), "cm": round(candidate_ms, 4),
+            }, separators=(",", ":")))
+        if self.log_path is not None and lines:
+            if self._log is None:
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                self._log = open(self.log_path, "a", buffering=1)
+            self._log.write("\n".join(lines) + "\n")
+
+    def stats(self) -> dict:
+        primary, candidate = self.latency["primary"], self.latency["candidate"]
+        p50 = (primary.percentile(0.5), candidate.percentile(0.5))
+        p99 = (primary.percentile(0.99), candidate.percentile(0.99))
+        return {
+            "candidate": self.name,
+            "kind": self.candidate.kind,
+            "submitted": self.submitted, "dropped": self.dropped,
+            "queued": self._queue.qsize(), "failed": self.failed,
+            "evaluated": self.evaluated,
+            "agreement": self.agree / self.evaluated if self.evaluated else None,
+            "disagreements": dict(self.disagreements.most_common()),
+            "latency_ms": {"primary": primary.summary(), "candidate": candidate.summary(),
+                           "p50_delta": p50[1] - p50[0] if None not in p50 else None,
+                           "p99_delta": p99[1] - p99[0] if None not in p99 else None},
+            "log": str(self.log_path) if self.log_path is not None else None,
+        }
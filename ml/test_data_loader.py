@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.model_selection import StratifiedGroupKFold
+
+_HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+
+from ml import data_loader  # noqa: E402
+from ml.data_loader import (DEFAULT_CSV, SessionGroupKFold, SessionIndex,  # noqa: E402
+                            cache_path, holdout_test_sessions, iter_dataset, load_dataset,
+                            load_shards)
+
+
+def _assert_same(a, b):
+    pd.testing.assert_frame_equal(a.X, b.X)
+    for field in ("y", "groups", "phase"):
+        pd.testing.assert_series_equal(getattr(a, field), getattr(b, field))
+
+
+def _copy_csv(tmp_path, n_rows=None) -> Path:
+    lines = DEFAULT_CSV.read_text().splitlines(keepends=True)
+    csv = tmp_path / "sensor_data.csv"
+    csv.write_text("".join(lines[:n_rows]))
+    return csv
+
+
+def test_cached_load_matches_csv(tmp_path):
+    csv = _copy_csv(tmp_path)
+    fresh = load_dataset(csv, cache=False)
+    _assert_same(load_dataset(csv), fresh)  # builds the cache
+    assert cache_path(csv).exists()
+    _assert_same(load_dataset(csv), fresh)  # reads it
+    _assert_same(load_dataset(csv, classes=["peppermint"]),
+                 load_dataset(csv, classes=["peppermint"], cache=False))
+
+
+def test_cache_follows_the_csv(tmp_path, monkeypatch):
+    csv = _copy_csv(tmp_path, 200)
+    load_dataset(csv)
+
+    # A touch without edits re-hashes but doesn't re-parse.
+    parses = []
+    parse = data_loader._parse_csv
+    monkeypatch.setattr(data_loader, "_parse_csv",
+                        lambda p, *span: parses.append(p) or parse(p, *span))
+    stat = csv.stat()
+    os.utime(csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    _assert_same(load_dataset(csv), load_dataset(csv, cache=False))
+    assert parses == []
+
+    with open(csv, "a") as f:
+        f.write("".join(DEFAULT_CSV.read_text().splitlines(keepends=True)[200:400]))
+    _assert_same(load_dataset(csv), load_dataset(csv, cache=False))
+
+
+def test_unreadable_cache_is_rebuilt(tmp_path):
+    csv = _copy_csv(tmp_path)
+    cache_path(csv).write_bytes(b"not an npz")
+    _assert_same(load_dataset(csv), load_dataset(csv, cache=False))
+
+
+@pytest.mark.parametrize("keep", [0.1, 0.5, 0.9, 0.999])
+def test_truncated_cache_is_rebuilt(tmp_path, keep):
+    csv = _copy_csv(tmp_path)
+    load_dataset(csv)
+    data = cache_path(csv).read_bytes()
+    cache_path(csv).write_bytes(data[:int(len(data) * keep)])
+    _assert_same(load_dataset(csv), load_dataset(csv, cache=False))
+    _assert_same(load_shards(tmp_path, workers=1), load_dataset(csv, cache=False))
+    # The rebuilt cache replaced the corrupt one and left no temporary files.
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([csv.name, cache_path(csv).name])
+
+
+def test_appends_are_parsed_incrementally(tmp_path, monkeypatch):
+    lines = DEFAULT_CSV.read_text().splitlines(keepends=True)
+    csv = _copy_csv(tmp_path, 300)
+    load_dataset(csv)
+    spans = []
+    parse = data_loader._parse_csv
+    monkeypatch.setattr(data_loader, "_parse_csv",
+                        lambda p, start=0, end=None: spans.append(start) or parse(p, start, end))
+
+    size = csv.stat().st_size
+    with open(csv, "a") as f:
+        f.write("".join(lines[300:500]) + lines[500][:20])  # the last row half-written
+    _assert_same(load_dataset(csv), load_dataset(csv, cache=False))
+    assert spans == [size]
+
+    # Completing the row can't resume mid-line: parsed again from the top.
+    with open(csv, "a") as f:
+        f.write(lines[500][20:] + "".join(lines[501:]))
+    _assert_same(load_dataset(csv), load_dataset(csv, cache=False))
+    assert spans == [size, 0]
+
+
+def test_numeric_session_ids_read_as_read_csv_does(tmp_path):
+    df = pd.read_csv(DEFAULT_CSV, nrows=300)
+    df["Session ID"] = "0" + pd.Series(pd.factorize(df["Session ID"])[0] + 5).astype(str)
+    csv = tmp_path / "sensor_data.csv"
+    df.iloc[:200].to_csv(csv, index=False)
+    ds = load_dataset(csv)
+    _assert_same(ds, load_dataset(csv, cache=False))
+    assert ds.groups[0] == "5"  # int64: the leading zero goes
+
+    # An appended row without a session turns the whole column float64.
+    gap = df.iloc[200:].copy()
+    gap.iloc[10, gap.columns.get_loc("Session ID")] = None
+    gap.to_csv(csv, mode="a", header=False, index=False)
+    ds = load_dataset(csv)
+    _assert_same(ds, load_dataset(csv, cache=False))
+    assert ds.groups[0] == "5.0" and len(ds) == 299
+
+
+@pytest.mark.parametrize("old,new", [("session_01", "session_1b"),   # same length
+                                     ("session_01", "session_001")])  # shifts the rest
+def test_rewritten_csv_is_parsed_again(tmp_path, old, new):
+    csv = _copy_csv(tmp_path, 300)
+    load_dataset(csv)
+    text = csv.read_text().replace(old, new)
+    csv.write_text(text + "".join(DEFAULT_CSV.read_text().splitlines(keepends=True)[300:320]))
+    _assert_same(load_dataset(csv), load_dataset(csv, cache=False))
+
+
+def test_iter_dataset_chunks_match_load_dataset(tmp_path):
+    csv = _copy_csv(tmp_path)
+    ds = load_dataset(csv, cache=False)
+    chunks = list(iter_dataset(csv, chunksize=97))
+    assert len(chunks) > 1 and all(len(c) <= 97 for c in chunks)
+    assert [c.start for c in chunks] == list(np.cumsum([0] + [len(c) for c in chunks[:-1]]))
+    assert chunks[0].sensor_cols == list(ds.X.columns)  # the empty Sensor 2 is dropped
+    np.testing.assert_array_equal(np.vstack([c.X for c in chunks]), ds.X.to_numpy(np.float64))
+    for field in ("y", "groups", "phase"):
+        assert np.concatenate([getattr(c, field) for c in chunks]).tolist() \
+            == getattr(ds, field).tolist()
+    pd.testing.assert_frame_equal(chunks[1].frame(), ds.X.iloc[chunks[1].start:][:len(chunks[1])],
+                                  check_dtype=False)
+
+
+@pytest.mark.parametrize("gap", [False, True])
+def test_iter_dataset_spells_numeric_sessions_like_load_dataset(tmp_path, gap):
+    df = pd.read_csv(DEFAULT_CSV, nrows=300)
+    df["Session ID"] = "0" + pd.Series(pd.factorize(df["Session ID"])[0] + 7).astype(str)
+    if gap:
+        df.iloc[250, df.columns.get_loc("Session ID")] = None
+    csv = tmp_path / "sensor_data.csv"
+    df.to_csv(csv, index=False)
+
+    groups = np.concatenate([c.groups for c in iter_dataset(csv, chunksize=97)])
+    assert groups.tolist() == load_dataset(csv, cache=False).groups.tolist()
+    assert groups[0] == ("7.0" if gap else "7")
+
+
+def test_session_index_holdout_and_folds():
+    ds = load_dataset()
+    index = SessionIndex.from_dataset(ds)
+    assert index.sizes.sum() == len(ds) and index.grouped
+    assert (index.phase_counts.sum(axis=1) == index.sizes).all()
+    assert (index.label_counts.sum(axis=1) == index.sizes).all()
+
+    train, test = holdout_test_sessions(ds)
+    test_sessions = set(ds.groups.iloc[test])
+    assert len(test_sessions) <= len(index.classes)
+    assert np.array_equal(np.sort(np.concatenate([train, test])), np.arange(len(ds)))
+    assert not test_sessions & set(ds.groups.iloc[train])
+    sessions = np.flatnonzero(np.isin(index.sessions, list(test_sessions)))
+    np.testing.assert_array_equal(np.concatenate([np.arange(len(ds))[sl]
+                                                  for sl in index.slices(sessions)]), test)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_session_kfold_matches_stratified_group_kfold(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(100, 1000))
+    groups = np.array([f"s{g:02d}" for g in rng.integers(0, 30, n)], dtype=object)
+    if seed % 2:
+        groups = np.sort(groups)
+    y = rng.integers(0, 3, n)
+    for shuffle in (True, False):
+        state = seed if shuffle else None
+        expected = StratifiedGroupKFold(5, shuffle=shuffle, random_state=state).split(
+            np.zeros(n), y, groups)
+        actual = SessionGroupKFold(5, shuffle=shuffle, random_state=state).split(
+            np.zeros(n), y, groups)
+        for (a, b), (c, d) in zip(expected, actual, strict=True):
+            np.testing.assert_array_equal(a, c)
+            np.testing.assert_array_equal(b, d)
+
+
+def _write_shards(tmp_path, bounds, extra: dict | None = None) -> Path:
+    header, *rows = DEFAULT_CSV.read_text().splitlines(keepends=True)
+    shards = tmp_path / "shards"
+    shards.mkdir()
+    for day, (lo, hi) in enumerate(zip(bounds, bounds[1:])):
+        shard = shards / f"sensor_data_2026-05-{day + 10:02d}.csv"
+        shard.write_text(header + "".join(rows[lo:hi]))
+    for name, text in (extra or {}).items():
+        (shards / name).write_text(text)
+    return shards
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_shards_load_like_one_file(tmp_path, workers):
+    header, *rows = DEFAULT_CSV.read_text().splitlines(keepends=True)
+    # A backup repeating rows 100..300 is dropped again by ID.
+    shards = _write_shards(tmp_path, [0, 250, 500, len(rows)],
+                           {"z_backup.csv": header + "".join(rows[100:300])})
+    ds = load_shards(shards, workers=workers)
+    _assert_same(ds, load_dataset(DEFAULT_CSV, cache=False))
+    assert [m["rows"] for m in ds.manifest] == [250, 250, len(rows) - 500, 200]
+    assert [m["duplicates"] for m in ds.manifest] == [0, 0, 0, 200]
+    assert all(cache_path(m["path"]).exists() for m in ds.manifest)
+
+    # The same through load_dataset with a glob, and again from the caches.
+    glob_ds = load_dataset(str(shards / "sensor_data_*.csv"))
+    _assert_same(glob_ds, ds)
+    assert len(glob_ds.manifest) == 3
+
+
+def test_file_with_glob_characters_is_one_file(tmp_path):
+    csv = _copy_csv(tmp_path, 300)
+    literal = csv.rename(tmp_path / "run[1].csv")
+    (tmp_path / "run1.csv").write_text("not the file asked for\n")
+    assert not data_loader.is_sharded(literal)
+    assert data_loader.is_sharded(tmp_path / "run[12].csv")
+    _assert_same(load_dataset(literal), load_dataset(literal, cache=False))
+    assert len(load_dataset(literal)) == 299
+
+
+def test_shards_with_missing_columns(tmp_path):
+    df = pd.read_csv(DEFAULT_CSV)
+    old = df.iloc[:100].drop(columns=["Phase", "Ethanol", "ID"])
+    shards = _write_shards(tmp_path, [100, len(df)], {"a_old.csv": old.to_csv(index=False)})
+    ds = load_shards(shards, workers=1)
+    whole = load_dataset(DEFAULT_CSV, cache=False)
+    assert len(ds) == len(whole)
+    assert ds.X["Ethanol"].isna().sum() == whole.X["Ethanol"].isna().sum() + 100
+    assert (ds.phase[:100] == "unknown").all()
+    with pytest.raises(FileNotFoundError):
+        load_shards(tmp_path / "nothing-*.csv")
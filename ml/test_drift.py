@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import math
+import statistics
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+_HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+
+from ml.drift import DriftMonitor, DriftTracker, P2Quantile  # noqa: E402
+
+
+@pytest.mark.parametrize("n", [1, 2, 7, 10, 32])
+def test_p2_median_exact_on_short_streams(n):
+    values = np.random.default_rng(n).normal(50, 5, n).tolist()
+    q = P2Quantile(0.5)
+    for v in values:
+        q.add(v)
+    assert q.value() == statistics.median(values)
+
+
+@pytest.mark.parametrize("p", [0.1, 0.5, 0.9])
+def test_p2_quantile_tracks_long_stream(p):
+    values = np.random.default_rng(0).lognormal(3, 0.5, 50_000)
+    q = P2Quantile(p)
+    for v in values.tolist():
+        q.add(v)
+    expected = np.quantile(values, p)
+    assert abs(q.value() - expected) / expected < 0.01
+
+
+def test_tracker_flags_drift_of_level_not_single_spikes():
+    t = DriftTracker(tolerance=0.15, alpha=0.2)
+    for v in [100, 101, 99, 100, 102]:
+        t.update(v, calibrate=True)
+    assert t.baseline == 100
+
+    state = t.update(150)
+    assert state["deviation"] == pytest.approx(0.5)
+    assert not state["alarm"]  # one spike barely moves the EWMA
+    for _ in range(10):
+        state = t.update(130)
+    assert state["alarm"]
+    assert state["normalised"] == pytest.approx(0.3)
+    assert t.baseline == 100  # only calibration readings move the baseline
+
+
+def test_tracker_treats_infinite_readings_as_missing():
+    t = DriftTracker(auto_calibrate_n=3)
+    for v in [100, math.inf, 100, -math.inf, 100]:
+        state = t.update(v)
+    assert t.baseline == 100 and t.level == 100
+    assert state == t.update(100)
+
+
+def test_tracker_block_check_remembers_worst_reading():
+    t = DriftTracker(tolerance=0.15)
+    t.update(200.0, calibrate=True)
+    t.reset_block()
+    for v in [205.0, 240.0, 198.0, None, float("nan")]:
+        t.update(v)
+    assert not t.block_ok()
+    assert t.block_worst == (240.0, pytest.approx(0.2))
+    t.reset_block()
+    t.update(210.0)
+    assert t.block_ok()
+
+
+def test_monitor_bounds_devices_and_ignores_repeated_stamp():
+    m = DriftMonitor(["gas"], max_devices=2, auto_calibrate_n=3)
+    for v in [10.0, 10.0, 10.0]:
+        first = m.update("a", {"gas": v})
+    assert m.update("a", {"gas": 20.0}, stamp="t1")["channels"]["gas"]["deviation"] == 1.0
+    again = m.update("a", {"gas": 99.0}, stamp="t1")
+    assert again["channels"]["gas"]["deviation"] == 1.0
+    assert first["channels"]["gas"]["baseline"] == 10.0
+
+    m.update("b", {"gas": 1.0})
+    m.update("c", {"gas": 1.0})
+    assert len(m) == 2
+    assert m.trackers("a")["gas"].baseline is None  # "a" was evicted, starts over
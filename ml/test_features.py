@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+_HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+
+from ml.data_loader import iter_dataset, load_dataset  # noqa: E402
+from ml.feature_arrays import TEMPORAL_CHANNELS, RollingFeatures, records_matrix  # noqa: E402
+from ml.features import RollingFeatureBuilder, ScentFeatureBuilder  # noqa: E402
+
+
+def _assert_engines_match(X):
+    expected = ScentFeatureBuilder(engine="pandas").transform(X).to_numpy()
+    actual = ScentFeatureBuilder(engine="numpy").transform(X)
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_numpy_engine_matches_pandas_on_dataset():
+    _assert_engines_match(load_dataset().X)
+
+
+def test_numpy_engine_matches_pandas_on_edge_cases():
+    X = pd.DataFrame({
+        "voc":         [100, -1, np.nan, 0, "bad"],
+        "no2":         [50, -1, np.nan, 0, 3],
+        "ethanol":     [80, -1, 1, 0, None],
+        "co_h2":       [20, -1, np.nan, 0, 4],
+        "voc_raw":     [30000, -1, np.nan, -5, 1],
+        "temperature": [24.5, -1, 20, 0, 21],
+        "gas":         [120.0, 0, np.nan, -3, 1],
+    })
+    _assert_engines_match(X)
+
+
+def _session_frame():
+    ds = load_dataset()
+    return ds.X.assign(**{"Session ID": ds.groups})
+
+
+def test_rolling_features_match_pandas_per_session():
+    X = _session_frame()
+    out = RollingFeatureBuilder(window=10, alpha=0.3).transform(X)
+
+    channels = ScentFeatureBuilder(engine="pandas").transform(X)[TEMPORAL_CHANNELS]
+    g = channels.groupby(X["Session ID"], sort=False)
+    expected = {
+        "roll_mean": g.rolling(10, min_periods=1).mean().reset_index(level=0, drop=True),
+        "roll_std":  g.rolling(10, min_periods=1).std().reset_index(level=0, drop=True),
+        "diff":      g.diff(),
+        "ewma":      g.transform(lambda s: s.ewm(alpha=0.3, adjust=False, ignore_na=True).mean()),
+    }
+    for stat, frame in expected.items():
+        cols = [f"{c}_{stat}" for c in TEMPORAL_CHANNELS]
+        np.testing.assert_allclose(out[cols].to_numpy(), frame.sort_index().to_numpy(),
+                                   rtol=1e-9, atol=1e-9)
+
+
+def test_rolling_features_streamed_per_device_match_batch():
+    # Readings from two sessions interleaved as if two devices were live:
+    # incremental updates must reproduce the batch features of each session.
+    X = _session_frame()
+    sessions = X["Session ID"].unique()[:2]
+    a, b = (X[X["Session ID"] == s] for s in sessions)
+    batch = RollingFeatureBuilder().transform(pd.concat([a, b]))
+
+    live = RollingFeatures()
+    streamed = {}
+    for i in range(max(len(a), len(b))):
+        for part in (a, b):
+            if i < len(part):
+                row = part.iloc[i]
+                record = row.drop("Session ID").to_dict()
+                streamed[row.name] = live.update(row["Session ID"], records_matrix([record])[0])
+
+    np.testing.assert_allclose(np.array([streamed[i] for i in batch.index]),
+                               batch.to_numpy(), rtol=1e-12, equal_nan=True)
+
+
+def test_repeated_stamp_does_not_advance_stream():
+    live = RollingFeatures()
+    first = live.update("dev1", records_matrix([{"voc": 100}])[0], stamp="t1").copy()
+    again = live.update("dev1", records_matrix([{"voc": 500}])[0], stamp="t1")
+    np.testing.assert_array_equal(again, first)
+
+
+def test_chunked_transforms_match_whole_dataset():
+    X = _session_frame()
+    chunks = list(iter_dataset(chunksize=128))
+    for engine in ("pandas", "numpy"):
+        fb = ScentFeatureBuilder(engine=engine)
+        stacked = np.vstack([np.asarray(out) for out in fb.transform_chunks(chunks)])
+        whole = fb.transform(X.drop(columns="Session ID"))
+        np.testing.assert_array_equal(stacked, np.asarray(whole))
+    rolling = RollingFeatureBuilder()
+    np.testing.assert_array_equal(np.vstack(list(rolling.transform_chunks(chunks))),
+                                  rolling.transform(X).to_numpy())
+
+
+def test_features_import_without_data_loader():
+    # The serving image ships features.py (for pipeline.joblib) but not
+    # data_loader.py.
+    code = ("import sys; sys.modules['ml.data_loader'] = sys.modules['data_loader'] = None; "
+            f"sys.path.insert(0, {str(_HERE.parent)!r}); import ml.features; "
+            "assert 'sklearn.model_selection' not in sys.modules")
+    subprocess.run([sys.executable, "-c", code], check=True)
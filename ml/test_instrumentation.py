@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+_HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+
+from ml.instrumentation import Instruments, LatencyHistogram  # noqa: E402
+
+
+def test_histogram_percentiles_within_bucket_precision():
+    values = np.random.default_rng(0).lognormal(-1, 1.5, 50_000)
+    h = LatencyHistogram()
+    for v in values.tolist():
+        h.record(v)
+    for q in (0.5, 0.9, 0.99, 0.999):
+        assert h.percentile(q) == pytest.approx(np.quantile(values, q), rel=0.04, abs=0.001)
+    assert h.count == len(values)
+    assert h.max_ms == values.max()
+
+
+def test_histogram_handles_extremes():
+    h = LatencyHistogram()
+    assert h.percentile(0.5) is None
+    h.record(0.0)
+    h.record(1e9)  # beyond the last bucket: clamped, not an IndexError
+    assert h.percentile(0.0) == 0.0
+    assert h.percentile(1.0) == 1e9
+
+
+def test_prometheus_exposition():
+    inst = Instruments()
+    inst.observe("clf", 2.0)
+    inst.count("requests", 3)
+    text = inst.prometheus(gauges={"model_load_seconds": 0.25}, counters={"cache_hits": 7},
+                           info={"backend": 'a"b'})
+    lines = text.splitlines()
+    assert 'telescent_info{backend="a\\"b"} 1' in lines
+    assert "# TYPE telescent_stage_latency_seconds summary" in lines
+    assert 'telescent_stage_latency_seconds_count{stage="clf"} 1' in lines
+    assert "telescent_requests_total 3" in lines
+    assert "telescent_cache_hits_total 7" in lines
+    assert "telescent_model_load_seconds 0.25" in lines
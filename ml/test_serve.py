@@ -0,0 +1,531 @@
+from __future__ import annotations
+
+import io
+import itertools
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+_HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+
+from ml import serve  # noqa: E402
+from ml.data_loader import load_dataset  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    # Module-level daemon state, so no test sees predictions or per-device
+    # history left behind by another.
+    monkeypatch.setattr(serve, "CACHE", serve.PredictionCache())
+    monkeypatch.setattr(serve, "ROLLING", serve.feature_arrays.RollingFeatures())
+    monkeypatch.setattr(serve, "DRIFT", serve.DriftMonitor(
+        serve.feature_arrays.TEMPORAL_CHANNELS, tolerance=0.15,
+        auto_calibrate_n=serve.DRIFT_CALIBRATION))
+
+
+@pytest.fixture(scope="module")
+def sklearn_backend():
+    if not serve.PIPELINE_PATH.exists():
+        pytest.skip("pipeline.joblib not trained")
+    return serve._load_sklearn_backend()
+
+
+@pytest.fixture(scope="module")
+def rows():
+    return load_dataset().X
+
+
+def test_single_pass_matches_two_pass_pipeline(sklearn_backend, rows):
+    pred_enc, proba = sklearn_backend.predict(rows.to_dict("records"))
+
+    np.testing.assert_array_equal(pred_enc, sklearn_backend.pipeline.predict(rows))
+    np.testing.assert_allclose(proba, sklearn_backend.pipeline.predict_proba(rows))
+
+
+def test_timings_cover_every_pipeline_stage(sklearn_backend, rows):
+    timings: dict = {}
+    sklearn_backend.predict(rows.iloc[:5].to_dict("records"), timings)
+
+    assert list(timings) == [name for name, _ in sklearn_backend.pipeline.steps]
+    assert all(ms >= 0 for ms in timings.values())
+
+
+def test_record_path_matches_dataframe_pipeline(sklearn_backend):
+    readings = [
+        {"voc": 633, "no2": 304, "ethanol": 585, "co_h2": 449, "voc_raw": 29117,
+         "nox_raw": 14340, "temperature": 21.08, "humidity": 54.07, "gas": 21.64},
+        {"voc": "612", "no2": None, "gas": 20.5, "deviceId": "dev1"},
+        {},
+    ]
+    _, proba = sklearn_backend.predict(readings)
+
+    expected = sklearn_backend.pipeline.predict_proba(pd.DataFrame(readings))
+    np.testing.assert_allclose(proba, expected)
+
+
+def test_compiled_forest_matches_pipeline(sklearn_backend, rows):
+    from ml.compile_model import compile_pipeline
+
+    arrays = compile_pipeline(sklearn_backend.pipeline, sklearn_backend.classes)
+    compiled = serve._CompiledBackend(arrays)
+    records = rows.to_dict("records")
+
+    pred_enc, proba = compiled.predict(records)
+    expected = sklearn_backend.pipeline.predict_proba(rows)
+
+    np.testing.assert_allclose(proba, expected, rtol=0, atol=1e-12)
+    assert [compiled.classes[i] for i in pred_enc] == \
+        [sklearn_backend.classes[i] for i in sklearn_backend.pipeline.predict(rows)]
+
+
+class _FakeBackend:
+    kind = "fake"
+    classes = ["a", "b"]
+    _versions = itertools.count()
+
+    def __init__(self, proba=((0.25, 0.75),)):
+        self.proba = np.array(proba)
+        # As _stamp_versions would: cache keys must not fall back to id().
+        self.version = f"fake-{next(self._versions)}"
+
+    def predict(self, records, timings=None):
+        return self.proba.argmax(axis=1), self.proba
+
+
+@pytest.fixture
+def reloadable(monkeypatch):
+    old = _FakeBackend()
+    monkeypatch.setattr(serve, "BACKEND", old)
+    monkeypatch.setattr(serve, "MODEL_FINGERPRINT", ("v1",))
+    monkeypatch.setattr(serve, "_artifact_fingerprint", lambda: ("v2",))
+    return old
+
+
+def test_reload_swaps_in_new_backend_after_warm_up(monkeypatch, reloadable):
+    new = _FakeBackend()
+    monkeypatch.setattr(serve, "_load_backend", lambda: new)
+
+    assert serve.reload_backend()
+    assert serve.BACKEND is new
+    assert serve.predict_scent({})["predicted_scent"] == "b"
+
+
+def test_reload_keeps_old_backend_when_load_fails(monkeypatch, reloadable):
+    def broken():
+        raise EOFError("truncated pipeline.joblib")
+    monkeypatch.setattr(serve, "_load_backend", broken)
+
+    assert not serve.reload_backend()
+    assert serve.BACKEND is reloadable
+
+
+def test_reload_keeps_old_backend_when_warm_up_fails(monkeypatch, reloadable):
+    monkeypatch.setattr(serve, "_load_backend", lambda: _FakeBackend([[np.nan, 1.0]]))
+
+    assert not serve.reload_backend()
+    assert serve.BACKEND is reloadable
+
+
+def test_reload_skips_unchanged_artifacts(monkeypatch, reloadable):
+    monkeypatch.setattr(serve, "MODEL_FINGERPRINT", ("v2",))
+    monkeypatch.setattr(serve, "_load_backend", lambda: pytest.fail("reloaded"))
+
+    assert not serve.reload_backend()
+
+
+class _CountingBackend(_FakeBackend):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def predict(self, records, timings=None):
+        self.calls.append(len(records))
+        proba = np.tile([0.25, 0.75], (len(records), 1))
+        return proba.argmax(axis=1), proba
+
+
+def _run_daemon(requests, **kw) -> dict:
+    # One serve_forever run over `requests` (dicts, or raw lines as str):
+    # the responses by "id", in the order they were written.
+    stdin = io.StringIO("".join((r if isinstance(r, str) else json.dumps(r)) + "\n"
+                                for r in requests))
+    stdout = io.StringIO()
+    serve.serve_forever(stdin, stdout, **kw)
+    return {r.get("id"): r for r in map(json.loads, stdout.getvalue().splitlines())}
+
+
+def test_daemon_coalesces_queued_requests_into_one_backend_call(monkeypatch):
+    backend = _CountingBackend()
+    monkeypatch.setattr(serve, "BACKEND", backend)
+    monkeypatch.setattr(serve, "BATCH_SIZES", serve.Counter())
+    monkeypatch.setattr(serve, "CACHE", None)  # identical readings would all hit
+    requests = [{"id": 1, "reading": {}},
+                {"id": 2, "readings": [{}, {}], "timings": True},
+                {"id": 3, "reading": {}}]
+    responses = _run_daemon(requests, max_batch=32, max_wait_ms=200)
+
+    assert backend.calls == [4]
+    assert responses[1]["result"]["predicted_scent"] == "b"
+    assert "timings_ms" not in responses[1]["result"]
+    assert len(responses[2]["results"]) == 2
+    assert "timings_ms" in responses[2]["results"][0]
+    assert serve.batch_stats()["histogram"] == {"4": 1}
+
+
+def test_daemon_max_batch_caps_each_backend_call(monkeypatch):
+    backend = _CountingBackend()
+    monkeypatch.setattr(serve, "BACKEND", backend)
+    monkeypatch.setattr(serve, "BATCH_SIZES", serve.Counter())
+    monkeypatch.setattr(serve, "CACHE", None)  # identical readings would all hit
+    responses = _run_daemon([{"id": i, "reading": {}} for i in range(5)],
+                            max_batch=2, max_wait_ms=200)
+
+    assert backend.calls == [2, 2, 1]
+    assert len(responses) == 5
+
+
+def test_frozen_scentnet_matches_eager_model():
+    torch = pytest.importorskip("torch")
+    from ml.compile_scentnet import build_folded, fold_batchnorm
+
+    if not serve.SCENTNET_WEIGHTS_PATH.exists():
+        pytest.skip("scentnet.pt not trained")
+    blob = torch.load(serve.SCENTNET_WEIGHTS_PATH, map_location="cpu", weights_only=False)
+    eager = serve._build_scentnet(blob["arch"])
+    eager.load_state_dict(blob["state_dict"])
+    X = torch.randn(64, blob["arch"]["in_dim"])
+
+    with torch.no_grad():
+        expected = torch.softmax(eager.eval()(X), dim=1)
+        folded = build_folded(fold_batchnorm(blob["state_dict"]))(X)
+    torch.testing.assert_close(folded, expected, rtol=0, atol=1e-6)
+
+
+def test_numpy_scentnet_matches_torch_backend(rows):
+    torch = pytest.importorskip("torch")
+    import joblib
+    from ml.compile_scentnet import compile_mlp, fold_batchnorm
+
+    if not serve.SCENTNET_WEIGHTS_PATH.exists():
+        pytest.skip("scentnet.pt not trained")
+    blob = torch.load(serve.SCENTNET_WEIGHTS_PATH, map_location="cpu", weights_only=False)
+    arrays = compile_mlp(fold_batchnorm(blob["state_dict"]),
+                         joblib.load(serve.SCENTNET_PRE_PATH), blob["class_names"])
+    numpy_mlp = serve._NumpyMLPBackend(arrays)
+    eager = serve._load_torch_backend({"torchscript": False})
+    records = rows.to_dict("records")
+
+    pred_enc, proba = numpy_mlp.predict(records)
+    expected_enc, expected = eager.predict(records)
+
+    # Torch runs in float32, the exported weights in float64.
+    np.testing.assert_allclose(proba, expected, rtol=0, atol=1e-5)
+    np.testing.assert_array_equal(pred_enc, expected_enc)
+    assert numpy_mlp.classes == eager.classes
+
+
+def test_float32_forest_variant_splits_like_full_precision(sklearn_backend, rows):
+    from ml.compile_model import compile_pipeline, forest_variant
+
+    arrays = compile_pipeline(sklearn_backend.pipeline, sklearn_backend.classes)
+    records = rows.to_dict("records")
+    full_enc, full = serve._CompiledBackend(arrays).predict(records)
+    f32_enc, f32 = serve._CompiledBackend(forest_variant(arrays, np.float32)).predict(records)
+
+    np.testing.assert_array_equal(f32_enc, full_enc)
+    np.testing.assert_allclose(f32, full, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("variant_f1, expected", [(0.865, "pipeline_compiled_float16"),
+                                                  (0.80, "pipeline_compiled")])
+def test_variant_served_only_within_f1_tolerance(monkeypatch, tmp_path, variant_f1, expected):
+    metrics = tmp_path / "metrics.json"
+    metrics.write_text(json.dumps({"variants": {"pipeline_compiled": {
+        "full": {"holdout_macro_f1": 0.87}, "float16": {"holdout_macro_f1": variant_f1}}}}))
+    (tmp_path / "pipeline_compiled_float16").mkdir()
+    monkeypatch.setattr(serve, "METRICS_PATH", metrics)
+
+    chosen = serve._select_variant(tmp_path / "pipeline_compiled",
+                                   {"variant": "float16", "variant_tolerance": 0.01})
+    assert chosen.name == expected
+
+
+def test_stale_variant_falls_back_to_full_precision_export(monkeypatch, tmp_path, capsys):
+    variant = tmp_path / "pipeline_compiled_float16"
+    full = _FakeBackend()
+    monkeypatch.setattr(serve, "_select_variant", lambda base_dir, cfg: variant)
+    monkeypatch.setattr(serve, "_load_compiled_backend",
+                        lambda path: full if path == serve.COMPILED_DIR else None)
+    monkeypatch.setattr(serve, "_load_sklearn_backend", lambda *a: pytest.fail("slow path"))
+
+    assert serve._load_backend({"kind": "sklearn", "variant": "float16"}) is full
+    assert "serving pipeline_compiled/" in capsys.readouterr().err
+
+
+def test_daemon_tracks_temporal_features_per_device(monkeypatch):
+    monkeypatch.setattr(serve, "BACKEND", _CountingBackend())
+    requests = [{"id": 1, "reading": {"deviceId": "a", "voc": 100, "receivedAt": "t1"}},
+                {"id": 2, "reading": {"deviceId": "b", "voc": 900, "receivedAt": "t1"}},
+                {"id": 3, "reading": {"deviceId": "a", "voc": 110, "receivedAt": "t2"},
+                 "temporal": True},
+                {"id": 4, "reading": {"deviceId": "a", "voc": 110, "receivedAt": "t2"},
+                 "temporal": True}]
+    responses = {i: r["result"] for i, r in _run_daemon(requests, max_wait_ms=200).items()}
+
+    assert "temporal" not in responses[1]
+    temporal = responses[3]["temporal"]
+    assert temporal["VOC_multichannel_diff"] == 10
+    assert temporal["VOC_multichannel_roll_mean"] == 105
+    assert temporal["NO2_diff"] is None
+    # The same reading resent (same receivedAt) leaves the stream where it was.
+    assert responses[4]["temporal"] == temporal
+
+
+def test_daemon_temporal_features_of_an_infinite_reading_are_null(monkeypatch):
+    monkeypatch.setattr(serve, "BACKEND", _CountingBackend())
+    requests = ['{"id": %d, "reading": {"deviceId": "a", "gas": %s, "receivedAt": "t%d"}, '
+                '"temporal": true}' % (i, gas, i) for i, gas in enumerate([100, "1e400", 101])]
+    responses = _run_daemon(requests, max_batch=1)
+
+    for i in range(3):
+        temporal = responses[i]["result"]["temporal"]
+        assert all(v is None or np.isfinite(v) for v in temporal.values())
+    assert responses[1]["result"]["temporal"]["GasResist_diff"] is None
+    with pytest.raises(ValueError):
+        serve.encode_json({"x": float("inf")})  # never written as Infinity
+
+
+def test_daemon_bad_device_id_fails_only_its_reading(monkeypatch):
+    backend = _CountingBackend()
+    monkeypatch.setattr(serve, "BACKEND", backend)
+    monkeypatch.setattr(serve, "CACHE", None)
+    requests = [{"id": 1, "reading": {"deviceId": ["x"], "voc": 1}},
+                {"id": 2, "readings": [{"deviceId": "a", "voc": 2}, {"deviceId": {}, "voc": 3}]}]
+    responses = _run_daemon(requests, max_batch=32, max_wait_ms=200)
+
+    assert "Invalid deviceId" in responses[1]["result"]["error"]
+    assert responses[2]["results"][0]["predicted_scent"] == "b"
+    assert "Invalid deviceId" in responses[2]["results"][1]["error"]
+    assert backend.calls == [1]
+
+
+def test_daemon_answers_pending_predictions_before_a_command(monkeypatch):
+    monkeypatch.setattr(serve, "BACKEND", _CountingBackend())
+    monkeypatch.setattr(serve, "DRIFT", serve.DriftMonitor(
+        serve.feature_arrays.TEMPORAL_CHANNELS, tolerance=0.15, alpha=1.0, auto_calibrate_n=1))
+    requests = [{"id": 1, "reading": {"deviceId": "a", "gas": 100, "receivedAt": "t1"},
+                 "drift": True},
+                {"id": 2, "cmd": "recalibrate", "device": "a"},
+                {"id": 3, "reading": {"deviceId": "a", "gas": 130, "receivedAt": "t2"},
+                 "drift": True}]
+    responses = _run_daemon(requests, max_batch=32, max_wait_ms=200)
+
+    assert list(responses) == [1, 2, 3]
+    assert responses[2]["recalibrated"] == "a"
+    # Reading 1 calibrated the baseline before the recalibrate cleared it,
+    # so reading 3 starts a new one instead of raising an alarm against 100.
+    assert not responses[3]["result"]["drift"]["alarm"]
+
+
+def test_daemon_rejects_a_non_scalar_recalibrate_device(monkeypatch):
+    monkeypatch.setattr(serve, "BACKEND", _CountingBackend())
+    responses = _run_daemon([{"id": 1, "cmd": "recalibrate", "device": ["x"]},
+                             {"id": 2, "cmd": "recalibrate"}], max_batch=1)
+
+    assert "Invalid device" in responses[1]["error"]
+    assert responses[2]["recalibrated"] == "all"
+
+
+def test_daemon_reports_drift_against_device_baseline(monkeypatch):
+    monkeypatch.setattr(serve, "BACKEND", _CountingBackend())
+    monkeypatch.setattr(serve, "DRIFT", serve.DriftMonitor(
+        serve.feature_arrays.TEMPORAL_CHANNELS, tolerance=0.15, alpha=1.0, auto_calibrate_n=2))
+    requests = [{"id": i, "reading": {"deviceId": "a", "gas": gas, "receivedAt": f"t{i}"},
+                 "drift": True}
+                for i, gas in enumerate([100, 100, 130])]
+    requests.append({"id": "s", "cmd": "stats"})
+    responses = _run_daemon(requests, max_batch=1)
+
+    assert not responses[1]["result"]["drift"]["alarm"]
+    drift = responses[2]["result"]["drift"]
+    assert drift["alarm"]
+    assert drift["channels"]["GasResist"]["normalised"] == pytest.approx(0.3)
+    assert drift["channels"]["NO2"]["baseline"] is None
+    assert responses["s"]["stats"]["drift"]["alarms"] == {"a": ["GasResist"]}
+
+
+def test_daemon_drift_of_an_infinite_reading_is_finite_or_null(monkeypatch):
+    monkeypatch.setattr(serve, "BACKEND", _CountingBackend())
+    monkeypatch.setattr(serve, "DRIFT", serve.DriftMonitor(
+        serve.feature_arrays.TEMPORAL_CHANNELS, tolerance=0.15, alpha=1.0, auto_calibrate_n=1))
+    # A tiny baseline overflows the next reading's relative offset to inf.
+    gases = ["1e-310", "1e400", "1e308"]
+    requests = ['{"id": %d, "reading": {"deviceId": "a", "gas": %s, "receivedAt": "t%d"}, '
+                '"drift": true}' % (i, gas, i) for i, gas in enumerate(gases)]
+    responses = _run_daemon(requests, max_batch=1)
+
+    for i in range(3):
+        gas = responses[i]["result"]["drift"]["channels"]["GasResist"]
+        assert all(v is None or np.isfinite(v) for v in gas.values())
+    assert responses[1]["result"]["drift"]["channels"]["GasResist"]["normalised"] is None
+    assert responses[2]["result"]["drift"]["channels"]["GasResist"]["normalised"] is None
+    assert responses[2]["result"]["drift"]["channels"]["GasResist"]["baseline"] == 1e-310
+
+
+def test_cache_answers_repeated_readings_until_model_or_ttl_changes(monkeypatch):
+    backend = _CountingBackend()
+    backend.version = "v1"
+    cache = serve.PredictionCache(size=8, ttl_s=60)
+    monkeypatch.setattr(serve, "BACKEND", backend)
+    monkeypatch.setattr(serve, "CACHE", cache)
+    idle = {"voc": 3, "no2": 1, "gas": 101.5}
+
+    first = serve.predict_scent_batch([idle, {"VOC": 3, "NO2": 1, "gas_resistance": 101.5}])
+    assert backend.calls == [1]  # same canonical row: one backend row for both
+    assert first[0] == first[1]
+
+    again = serve.predict_scent_batch([dict(idle, deviceId="x")], include_timings=True)
+    assert backend.calls == [1]
+    assert again[0]["predicted_scent"] == first[0]["predicted_scent"]
+    assert "timings_ms" not in serve.predict_scent(idle)  # cached entry left untouched
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    backend.version = "v2"
+    serve.predict_scent(idle)
+    assert backend.calls == [1, 1]
+
+    monkeypatch.setattr(serve.time, "monotonic", lambda: 1e12)
+    serve.predict_scent(idle)
+    assert backend.calls == [1, 1, 1]
+    assert cache.expired == 1
+
+
+def test_cache_decimals_share_entries_between_near_identical_readings():
+    cache = serve.PredictionCache(decimals=1)
+    row = serve.feature_arrays.records_matrix([{"gas": 101.52}, {"gas": 101.54}])
+    assert cache.key("v", row[0]) == cache.key("v", row[1])
+    assert serve.PredictionCache().key("v", row[0]) != serve.PredictionCache().key("v", row[1])
+
+
+def test_daemon_stats_and_metrics_report_stage_latencies(monkeypatch):
+    monkeypatch.setattr(serve, "BACKEND", _CountingBackend())
+    monkeypatch.setattr(serve, "INSTRUMENTS", serve.Instruments())
+    requests = [{"id": 1, "reading": {"voc": 1}}, "not json",
+                {"id": 2, "readings": [{"voc": 2}, 5]},
+                {"id": "s", "cmd": "stats"}, {"id": "m", "cmd": "metrics"}]
+    responses = _run_daemon(requests, max_batch=1)
+
+    stats = responses["s"]["stats"]
+    assert stats["counters"]["readings"] == 3
+    assert stats["counters"]["errors"] == 1
+    assert stats["counters"]["requests"] == 3  # the bad line, 1 and 2
+    assert stats["counters"]["request_errors"] == 1
+    assert stats["latency_ms"]["predict"]["count"] == 2
+    assert stats["latency_ms"]["parse"]["count"] == 4
+    assert stats["model"]["kind"] == "fake"
+    metrics = responses["m"]["metrics"]
+    assert 'telescent_stage_latency_seconds_count{stage="request"} 4' in metrics.splitlines()
+
+
+def test_daemon_survives_bad_lines_and_failing_handlers(monkeypatch):
+    backend = _CountingBackend()
+    monkeypatch.setattr(serve, "BACKEND", backend)
+    monkeypatch.setattr(serve, "CACHE", None)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(serve, "metrics_text", broken)
+    requests = ["[" * 200_000, {"id": "m", "cmd": "metrics"}, {"id": 1, "reading": {}}]
+    responses = _run_daemon(requests, max_batch=1)
+
+    assert "Invalid JSON input" in responses[None]["error"]
+    assert responses["m"]["error"] == "Internal error: RuntimeError"
+    assert responses[1]["result"]["predicted_scent"] == "b"
+
+    # A failing batch answers each of its requests, and the next batch is served.
+    monkeypatch.setattr(serve, "predict_scent_batch", broken)
+    responses = _run_daemon([{"id": 1, "reading": {}}, {"id": 2, "readings": [{}]},
+                             {"id": "s", "cmd": "stats"}], max_batch=32, max_wait_ms=200)
+    assert responses[1]["error"] == responses[2]["error"] == "Internal error: RuntimeError"
+    assert "stats" in responses["s"]
+
+
+def test_daemon_trims_fields_and_frames_responses(monkeypatch):
+    monkeypatch.setattr(serve, "BACKEND", _FakeBackend())
+    requests = [{"id": 1, "reading": {}, "fields": "label"},
+                {"id": 2, "readings": [{}, 7], "fields": "topk", "k": 1},
+                {"id": 3, "reading": {}, "fields": "nope"},
+                {"id": 4, "reading": {}},
+                {"id": 5, "reading": {}, "fields": ["label"]}]
+    stdin = io.StringIO("".join(json.dumps(r) + "\n" for r in requests))
+    stdout = io.BytesIO()
+
+    serve.serve_forever(stdin, stdout, max_batch=1, framing="length")
+
+    data, responses = stdout.getvalue(), {}
+    while data:
+        n = int.from_bytes(data[:4], "big")
+        response = json.loads(data[4:4 + n])
+        responses[response["id"]] = response
+        data = data[4 + n:]
+    assert responses[1]["result"] == {"predicted_scent": "b", "confidence": 0.75}
+    assert responses[2]["results"][0]["top_predictions"] == [{"scent": "b", "confidence": 0.75}]
+    assert set(responses[2]["results"][0]) == {"predicted_scent", "confidence",
+                                                "top_predictions"}
+    assert "error" in responses[2]["results"][1]
+    assert "Unknown fields" in responses[3]["error"]
+    assert "all_probabilities" in responses[4]["result"]
+    assert "Unknown fields" in responses[5]["error"]
+
+
+def test_registry_routes_by_device_and_model_field(monkeypatch):
+    monkeypatch.setattr(serve, "CACHE", None)
+    models, routes = serve._load_registry({
+        "models": {"rf": {"kind": "sklearn", "compiled": False}, "mlp": {"kind": "torch"}},
+        "routes": {"board-b": "mlp", "board-x": "missing"},
+    })
+    assert set(models) == {"rf", "mlp"}
+    assert routes == {"board-b": "mlp"}
+    assert models["mlp"].kind == "numpy_mlp"
+    default = serve._load_compiled_backend()
+    default.name = "default"
+    monkeypatch.setattr(serve, "BACKEND", default)
+    monkeypatch.setattr(serve, "MODELS", models)
+    monkeypatch.setattr(serve, "ROUTES", routes)
+
+    records = load_dataset().X.iloc[:6].to_dict("records")
+    readings = [dict(r, deviceId=d) for r, d in zip(records, ["a", "board-b"] * 3)]
+    results = serve.predict_scent_batch(readings, models=[None, None, "rf", "rf", None, "nope"])
+
+    assert [r.get("model") for r in results] == ["default", "mlp", "rf", "rf", "default", None]
+    assert "Unknown model" in results[5]["error"]
+    assert "Unknown model" in serve.predict_scent_batch(records[:1], models=[["rf"]])[0]["error"]
+    # Features built once for all three models give each its own answer.
+    for r, reading in zip(results[:5], readings):
+        backend = {"default": default, **models}[r["model"]]
+        _, proba = backend.predict([reading])
+        assert r["confidence"] == pytest.approx(proba[0].max())
+
+
+def test_shadow_sees_served_readings(monkeypatch, tmp_path):
+    monkeypatch.setattr(serve, "CACHE", None)
+    models, _ = serve._load_registry({"models": {"mlp": {"kind": "torch"}}})
+    shadow = serve._load_shadow({"shadow": "mlp", "shadow_log": str(tmp_path / "s.ndjson")},
+                                models)
+    assert serve._load_shadow({"shadow": "nope"}, models) is None
+    monkeypatch.setattr(serve, "SHADOW", shadow)
+
+    readings = load_dataset().X.iloc[:8].to_dict("records")
+    results = serve.predict_scent_batch(readings + ["not a reading"])
+    shadow.close()
+    stats = serve._handle_message({"cmd": "stats"})["stats"]["shadow"]
+    assert stats["candidate"] == "mlp" and stats["evaluated"] == 8
+    assert stats["agreement"] == sum(
+        r["predicted_scent"] == json.loads(line)["c"]
+        for r, line in zip(results, (tmp_path / "s.ndjson").read_text().splitlines())) / 8
+    assert "telescent_shadow_evaluated_total 8" in serve.metrics_text()
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+_HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(_HERE.parent))
+
+from ml.shadow import ShadowEvaluator  # noqa: E402
+
+
+class _Candidate:
+    # Predicts "b" when VOC is high, else "a"; `gate` holds predict() open.
+    kind = "stub"
+    classes = np.array(["a", "b"])
+
+    def __init__(self, gate: threading.Event | None = None):
+        self.gate = gate
+
+    def predict(self, readings):
+        if self.gate is not None:
+            self.gate.wait()
+        enc = np.array([int(r["voc"] > 1) for r in readings])
+        proba = np.array([[0.2, 0.8] if e else [0.9, 0.1] for e in enc])
+        return enc, proba
+
+
+def _served(labels):
+    return [{"predicted_scent": label, "confidence": 0.7} for label in labels]
+
+
+def test_agreement_and_log(tmp_path):
+    log = tmp_path / "logs" / "shadow.ndjson"
+    shadow = ShadowEvaluator(_Candidate(), log)
+    readings = [{"deviceId": "d1", "voc": 0}, {"deviceId": "d2", "voc": 5},
+                {"deviceId": "d1", "voc": 5}]
+    assert shadow.submit(readings, _served(["a", "b", "a"]), 0.5)
+    shadow.close()
+
+    stats = shadow.stats()
+    assert stats["evaluated"] == 3
+    assert stats["agreement"] == 2 / 3
+    assert stats["disagreements"] == {"a->b": 1}
+    assert stats["latency_ms"]["primary"]["count"] == 1
+    assert stats["latency_ms"]["p50_delta"] is not None
+
+    lines = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(r["dev"], r["p"], r["c"]) for r in lines] == [
+        ("d1", "a", "a"), ("d2", "b", "b"), ("d1", "a", "b")]
+    assert lines[1]["cc"] == 0.8 and lines[1]["pm"] == 0.5
+
+
+def test_submit_never_blocks_on_a_slow_candidate():
+    gate = threading.Event()
+    shadow = ShadowEvaluator(_Candidate(gate), max_queue=1)
+    reading = [{"voc": 0}]
+    t0 = time.perf_counter()
+    accepted = [shadow.submit(reading, _served(["a"]), 0.1) for _ in range(50)]
+    assert time.perf_counter() - t0 < 0.5
+    # One batch is stuck in predict(), one waits in the queue; the rest drop.
+    assert sum(accepted) <= 2 and shadow.dropped == 50 - sum(accepted)
+    gate.set()
+    shadow.close()
+    assert shadow.stats()["evaluated"] == sum(accepted)
+
+
+def test_candidate_errors_are_counted():
+    class Broken(_Candidate):
+        def predict(self, readings):
+            raise RuntimeError("boom")
+
+    shadow = ShadowEvaluator(Broken())
+    shadow.submit([{"voc": 0}], _served(["a"]), 0.1)
+    shadow.close()
+    assert shadow.failed == 1 and shadow.evaluated == 0